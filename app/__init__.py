@@ -1,11 +1,22 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
+from datetime import datetime, timedelta
+import click
+import importlib
 import os
 
 db = SQLAlchemy()
 csrf = CSRFProtect()
 
+# ブループリント名 -> (モジュール, 属性名, URL接頭辞)
+BLUEPRINTS = {
+    'auth': ('app.auth', 'auth', None),
+    'main': ('app.routes.main', 'main_bp', None),
+    'admin': ('app.routes.admin', 'admin_bp', '/admin'),
+    'api': ('app.routes.api', 'api_bp', '/api'),
+}
+
 def create_app(config=None):
     app = Flask(__name__)
     
@@ -30,25 +41,110 @@ def create_app(config=None):
     
     # Initialize extensions
     db.init_app(app)
+    
+    # ログ設定（LOG_LEVEL / LOG_FORMAT=json / LOG_FILE、リクエストID）
+    from app.utils.log import init_logging
+    init_logging(app)
+    
+    # バックグラウンドジョブ
+    from app.utils.jobs import jobs
+    jobs.init_app(app)
+    
+    # リクエスト計測（処理時間・クエリ数・Server-Timing）
+    from app.utils.instrumentation import init_instrumentation
+    init_instrumentation(app)
+    
+    # Prometheus メトリクス（マルチプロセス集計の設定）
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+    
+    # スロークエリログ（SLOW_QUERY_THRESHOLD_MS、既定は無効）
+    from app.utils.slow_queries import init_slow_query_log
+    init_slow_query_log(app)
+    
+    # 実行時診断（コネクションプール計測・RSS推移）
+    from app.utils.diagnostics import init_diagnostics
+    init_diagnostics(app)
+    
+    # サンプリングプロファイラ（PROFILER_SAMPLE_RATE、管理者は X-Profile: 1 でも計測）
+    from app.utils.profiler import init_profiler
+    init_profiler(app)
+    
     # 一時的にCSRF保護を無効化（テスト用）
     app.config['WTF_CSRF_ENABLED'] = False
     # csrf.init_app(app)
     
-    # Register blueprints
-    from app.routes.main import main_bp
-    from app.routes.admin import admin_bp
-    from app.routes.api import api_bp
-    from app.auth import auth
-    
-    app.register_blueprint(auth)
-    app.register_blueprint(main_bp)
-    app.register_blueprint(admin_bp, url_prefix='/admin')
-    app.register_blueprint(api_bp, url_prefix='/api')
-    
-    # Create tables
-    with app.app_context():
-        from app.models import FAQ, Conversation, Message, Escalation, User, StaffMember, LoginSession
-        db.create_all()
+    # Register blueprints（BLUEPRINTS で登録するものを限定できる。例: /api だけを受けるワーカーは "auth,api"）
+    enabled = app.config.get('BLUEPRINTS') or os.environ.get('BLUEPRINTS') or ','.join(BLUEPRINTS)
+    if isinstance(enabled, str):
+        enabled = [name.strip() for name in enabled.split(',') if name.strip()]
+    for name in enabled:
+        module_name, attr, url_prefix = BLUEPRINTS[name]
+        app.register_blueprint(getattr(importlib.import_module(module_name), attr), url_prefix=url_prefix)
+    
+    # Create tables（スキーマが最新なら DDL は実行しない。SKIP_SCHEMA_CHECK=1 で確認自体も省略）
+    if not app.config.get('SKIP_SCHEMA_CHECK', os.environ.get('SKIP_SCHEMA_CHECK') == '1'):
+        from app.utils.schema import ensure_schema
+        with app.app_context():
+            ensure_schema()
+    
+    # 日別集計のバックフィル（flask backfill-daily-stats --days 365）
+    @app.cli.command('backfill-daily-stats')
+    @click.option('--days', type=int, default=None, help='再集計する日数（省略時は全期間）')
+    def backfill_daily_stats(days):
+        from app.models import DailyStats
+        start_date = datetime.utcnow() - timedelta(days=days) if days else None
+        count = DailyStats.rebuild(start_date)
+        click.echo(f"{count}日分の日別集計を作成しました")
+    
+    # 古いメッセージのアーカイブ（flask archive-messages --days 180）
+    @app.cli.command('archive-messages')
+    @click.option('--days', type=int, default=None, help='この日数より古いメッセージを移動（省略時は MESSAGE_ARCHIVE_DAYS）')
+    def archive_messages_command(days):
+        from app.utils.archive import archive_messages
+        result = archive_messages(days)
+        click.echo(f"{result['archived_messages']}件のメッセージをアーカイブしました（{result['users']}ユーザー）")
+    
+    # 類似質問の索引に既存のエスカレーションを追加（flask index-escalations）
+    @app.cli.command('index-escalations')
+    def index_escalations_command():
+        from app.utils.escalation_clusters import index_escalations
+        count = index_escalations()
+        click.echo(f"{count}件のエスカレーションを索引に追加しました")
+
+    # 回答済みエスカレーションからFAQ候補を抽出（flask mine-faq-drafts --days 180 --min-count 3）
+    @app.cli.command('mine-faq-drafts')
+    @click.option('--days', type=int, default=None, help='この日数以内の回答から抽出（省略時は FAQ_MINING_DAYS、0で全期間）')
+    @click.option('--min-count', type=int, default=None, help='下書きにする最小件数（省略時は FAQ_DRAFT_MIN_COUNT）')
+    def mine_faq_drafts_command(days, min_count):
+        from app.utils.faq_mining import mine_faq_drafts
+        result = mine_faq_drafts(days, min_count)
+        click.echo(f"{result['scanned']}件の回答から FAQ候補を {result['created']}件追加、{result['updated']}件更新しました")
+
+    # バックアップの書き出し（flask backup --full --output backup.ndjson.gz）
+    @app.cli.command('backup')
+    @click.option('--output', '-o', required=True, help='出力先（.gz で終わる場合は gzip 圧縮）')
+    @click.option('--full', is_flag=True, help='FAQ・会話・メッセージ（アーカイブ済みを含む）・エスカレーションも含める')
+    def backup_command(output, full):
+        from app.utils.backup import SECTIONS, iter_backup
+        from app.utils.streaming import iter_gzip
+        chunks = iter_backup(SECTIONS if full else ('users',))
+        if output.endswith('.gz'):
+            chunks = iter_gzip(chunks)
+        with open(output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        click.echo(f"バックアップを書き出しました: {output}")
+    
+    # バックアップからの復元（flask restore backup.ndjson.gz）
+    @app.cli.command('restore')
+    @click.argument('path')
+    @click.option('--password', default='password123', help='復元したユーザーに設定するパスワード')
+    def restore_command(path, password):
+        from app.utils.user_restore import restore_backup_file
+        result = restore_backup_file(path, password)
+        for name, counts in result['sections'].items():
+            click.echo(f"{name}: 復元 {counts['restored']}件 / スキップ {counts['skipped']}件")
     
     # Context processor for global template variables
     @app.context_processor
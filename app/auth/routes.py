@@ -7,6 +7,9 @@ from .utils import check_login_attempts, record_login_attempt, is_safe_url, gene
 from app.models import User, LoginSession
 from app import db
 from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 @auth.route('/login', methods=['GET', 'POST'])
@@ -65,8 +68,7 @@ def login():
         session['user_id'] = user.id
         session['is_admin'] = user.is_admin
         
-        print(f"Login successful: user_id={user.id}, is_admin={user.is_admin}")
-        print(f"Session after login: {dict(session)}")
+        logger.info('Login successful: user_id=%s, is_admin=%s', user.id, user.is_admin)
         
         # リダイレクト先決定
         next_page = request.form.get('next')
@@ -79,7 +81,7 @@ def login():
             return redirect(url_for('main.chat'))
             
     except Exception as e:
-        print(f"ログインエラー: {e}")
+        logger.error('ログインエラー: %s', e)
         flash('ログイン処理でエラーが発生しました。', 'error')
         return redirect(url_for('auth.login'))
 
@@ -101,7 +103,7 @@ def logout():
         flash('ログアウトしました。', 'success')
         
     except Exception as e:
-        print(f"ログアウトエラー: {e}")
+        logger.error('ログアウトエラー: %s', e)
     
     return redirect(url_for('auth.login'))
 
@@ -157,7 +159,7 @@ def change_password():
             return redirect(url_for('main.chat'))
             
     except Exception as e:
-        print(f"パスワード変更エラー: {e}")
+        logger.error('パスワード変更エラー: %s', e)
         flash('パスワード変更でエラーが発生しました。', 'error')
         return redirect(url_for('auth.change_password'))
 
@@ -190,5 +192,5 @@ def check_session():
         })
         
     except Exception as e:
-        print(f"セッション確認エラー: {e}")
+        logger.error('セッション確認エラー: %s', e)
         return jsonify({'valid': False, 'message': 'エラーが発生しました'})
\ No newline at end of file
@@ -5,6 +5,9 @@ from functools import wraps
 from flask import session, redirect, url_for, flash, request
 from app.models import User
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 def login_required(f):
@@ -30,27 +33,23 @@ def admin_required(f):
     """管理者権限必須デコレータ"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        print(f"Admin check - Session: {dict(session)}")
-        
         if 'user_id' not in session:
-            print("Admin check FAILED: No user_id in session")
+            logger.debug('Admin check failed: no user_id in session (path=%s)', request.path)
             flash('ログインが必要です。', 'error')
             return redirect(url_for('auth.login'))
         
         user = User.query.get(session['user_id'])
-        print(f"Admin check - User found: {user}")
         
         if not user:
-            print("Admin check FAILED: User not found")
+            logger.debug('Admin check failed: user %s not found', session['user_id'])
             flash('ログインが必要です。', 'error')
             return redirect(url_for('auth.login'))
             
         if not user.is_admin:
-            print(f"Admin check FAILED: User is not admin (is_admin={user.is_admin})")
+            logger.warning('Admin check failed: user %s is not admin (path=%s)', user.id, request.path)
             flash('管理者権限が必要です。', 'error')
             return redirect(url_for('main.chat'))
         
-        print("Admin check PASSED")
         return f(*args, **kwargs)
     return decorated_function
 
@@ -1,6 +1,10 @@
-from .faq import FAQ
+from .faq import FAQ, FaqDraft
 from .conversation import Conversation, Message
-from .escalation import Escalation
+from .escalation import Escalation, EscalationBand
 from .user import User, StaffMember, LoginSession
+from .stats import DailyStats
+from .archive import MessageArchiveSegment
+from .meta import AppMeta
 
-__all__ = ['FAQ', 'Conversation', 'Message', 'Escalation', 'User', 'StaffMember', 'LoginSession']
\ No newline at end of file
+__all__ = ['FAQ', 'FaqDraft', 'Conversation', 'Message', 'Escalation', 'EscalationBand', 'User', 'StaffMember',
+           'LoginSession', 'DailyStats', 'MessageArchiveSegment', 'AppMeta']
\ No newline at end of file
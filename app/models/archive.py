@@ -0,0 +1,69 @@
+from app import db
+from datetime import datetime
+import gzip
+import json
+
+
+class MessageArchiveSegment(db.Model):
+    """アーカイブ済みメッセージのセグメント（ユーザーごと・ID順に連続した範囲をgzip圧縮したNDJSONで保持）
+
+    message テーブルから移した範囲の要約（件数・ID範囲・期間）を持ち、
+    履歴をさかのぼって表示するときに1セグメント単位で読み込む（app.utils.archive.history_page）
+    """
+    __tablename__ = 'message_archive_segment'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)  # 会話の所有ユーザー
+    first_message_id = db.Column(db.Integer, nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    first_timestamp = db.Column(db.DateTime)
+    last_timestamp = db.Column(db.DateTime)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    data = db.Column(db.LargeBinary, nullable=False)  # Message.to_dict() を1行1件で並べて gzip 圧縮
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_message_archive_segment_user_range', 'user_id', 'last_message_id'),
+    )
+
+    def __repr__(self):
+        return f'<MessageArchiveSegment user={self.user_id} {self.first_message_id}-{self.last_message_id}>'
+
+    def messages(self):
+        """セグメント内のメッセージ（ID順の dict 一覧）"""
+        text = gzip.decompress(self.data).decode('utf-8')
+        return [json.loads(line) for line in text.splitlines() if line]
+
+    def append(self, items):
+        """メッセージ（to_dict() 済み・ID順）を追加して再圧縮"""
+        items = self.messages() + list(items) if self.data else list(items)
+        self.data = gzip.compress('\n'.join(json.dumps(item, ensure_ascii=False) for item in items).encode('utf-8'))
+        self.message_count = len(items)
+        self.first_message_id = items[0]['id']
+        self.last_message_id = items[-1]['id']
+        self.first_timestamp = _parse_timestamp(items[0].get('timestamp'))
+        self.last_timestamp = _parse_timestamp(items[-1].get('timestamp'))
+
+    @staticmethod
+    def summary(user_id):
+        """ユーザーのアーカイブ件数（履歴画面の「さらに読み込む」表示用）"""
+        row = db.session.query(
+            db.func.count(MessageArchiveSegment.id),
+            db.func.coalesce(db.func.sum(MessageArchiveSegment.message_count), 0),
+            db.func.max(MessageArchiveSegment.last_timestamp)
+        ).filter(MessageArchiveSegment.user_id == user_id).one()
+        return {
+            'segments': row[0],
+            'messages': int(row[1]),
+            'latest_timestamp': row[2].isoformat() if row[2] else None
+        }
+
+
+def _parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
@@ -7,7 +7,7 @@ class Conversation(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # ユーザーID
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)  # ユーザーID
     user_identifier = db.Column(db.String(100))  # 個人情報ではないユーザー識別子（後方互換）
     user_display_name = db.Column(db.String(100))  # ユーザー表示名
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -65,7 +65,7 @@ class Message(db.Model):
     __tablename__ = 'message'
     
     id = db.Column(db.Integer, primary_key=True)
-    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False, index=True)
     message_type = db.Column(db.String(20), nullable=False)  # 'user', 'bot', 'staff'
     content = db.Column(db.Text, nullable=False)
     file_path = db.Column(db.String(255))  # 添付ファイルのパス
@@ -1,5 +1,6 @@
 from app import db
 from datetime import datetime
+from sqlalchemy import func, or_
 
 class Escalation(db.Model):
     __tablename__ = 'escalation'
@@ -12,8 +13,22 @@ class Escalation(db.Model):
     answered_at = db.Column(db.DateTime)
     staff_name = db.Column(db.String(100))  # 対応した職員名（任意）
     
+    # 担当（リース）: 期限までは claimed_by_id の職員だけが回答・クローズできる
+    claimed_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    claimed_at = db.Column(db.DateTime)
+    lease_expires_at = db.Column(db.DateTime)
+    
+    # 類似質問のクラスタ（最初の質問のID）と MinHash 署名（app.utils.escalation_clusters）
+    cluster_id = db.Column(db.Integer, index=True)
+    fingerprint = db.Column(db.LargeBinary)
+    
+    __table_args__ = (
+        db.Index('ix_escalation_status_created_at', 'status', 'created_at'),
+    )
+    
     # リレーション
     message = db.relationship('Message', backref='escalation')
+    claimed_by = db.relationship('User', foreign_keys=[claimed_by_id])
     
     def __repr__(self):
         return f'<Escalation {self.id}: {self.status}>'
@@ -27,6 +42,9 @@ class Escalation(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'answered_at': self.answered_at.isoformat() if self.answered_at else None,
             'staff_name': self.staff_name,
+            'claimed_by_id': self.claimed_by_id,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'cluster_id': self.cluster_id or self.id,
             'original_question': self.message.content if self.message else None
         }
     
@@ -38,4 +56,32 @@ class Escalation(db.Model):
     @staticmethod
     def get_pending_escalations():
         """未解決のエスカレーション一覧を取得"""
-        return Escalation.query.filter_by(status='pending').order_by(Escalation.created_at.asc()).all()
\ No newline at end of file
+        return Escalation.query.filter_by(status='pending').order_by(Escalation.created_at.asc()).all()
+    
+    def is_claimed(self, now=None):
+        """リース期限内の担当者がいるか"""
+        return (self.claimed_by_id is not None and self.lease_expires_at is not None
+                and self.lease_expires_at > (now or datetime.utcnow()))
+    
+    @staticmethod
+    def available_to(user_id, now=None):
+        """user_id の職員が担当できる条件（未担当・リース切れ・自分が担当中）"""
+        now = now or datetime.utcnow()
+        conditions = [Escalation.claimed_by_id.is_(None), Escalation.lease_expires_at <= now]
+        if user_id is not None:
+            conditions.append(Escalation.claimed_by_id == user_id)
+        return or_(*conditions)
+    
+    @staticmethod
+    def cluster_key():
+        """クラスタID（クラスタの最初の質問は自分のID）"""
+        return func.coalesce(Escalation.cluster_id, Escalation.id)
+
+
+class EscalationBand(db.Model):
+    """類似質問検索用の LSH 帯キー（エスカレーション1件につき LSH_BANDS 行）"""
+    __tablename__ = 'escalation_band'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    band_key = db.Column(db.BigInteger, nullable=False, index=True)
+    escalation_id = db.Column(db.Integer, db.ForeignKey('escalation.id'), nullable=False, index=True)
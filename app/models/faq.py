@@ -1,4 +1,5 @@
 from app import db
+from app.utils.cache import invalidate_on_change
 from datetime import datetime
 
 class FAQ(db.Model):
@@ -33,14 +34,13 @@ class FAQ(db.Model):
         }
     
     @staticmethod
-    def search(query):
-        """FAQ検索機能 - より柔軟な検索"""
+    def extract_keywords(query):
+        """検索用のキーワードを抽出（2文字以上）"""
         import re
         
         # 簡単な日本語キーワード抽出
         # 句読点や助詞を区切り文字として使用
         # まず、句読点や記号で分割
-        import re
         temp_words = re.split(r'[、。！？\?\!\s　]+', query)
         
         # さらに助詞で分割（簡単なパターンのみ）
@@ -52,7 +52,12 @@ class FAQ(db.Model):
                 words.extend([w for w in sub_words if w])
         
         # 最低2文字以上の単語のみを使用
-        keywords = [word for word in words if len(word) >= 2]
+        return [word for word in words if len(word) >= 2]
+    
+    @staticmethod
+    def search(query):
+        """FAQ検索機能 - より柔軟な検索"""
+        keywords = FAQ.extract_keywords(query)
         
         if not keywords:
             # キーワードが見つからない場合は元のクエリで検索
@@ -85,6 +90,18 @@ class FAQ(db.Model):
             FAQ.is_active == True
         ).order_by(FAQ.view_count.desc()).all()
     
+    @staticmethod
+    def score(query, limit=5):
+        """類似度の高い順に (FAQ, スコア) を返す（search と違い、一致が弱いものも候補として含める）
+        
+        スコアは有効なFAQの TF-IDF 索引（app.utils.faq_suggest）とのコサイン類似度
+        """
+        from app.utils.faq_suggest import get_search_index
+        
+        scored = get_search_index().score(query, limit)
+        faqs = {faq.id: faq for faq in FAQ.query.filter(FAQ.id.in_([faq_id for faq_id, _ in scored]))}
+        return [(faqs[faq_id], score) for faq_id, score in scored if faq_id in faqs]
+    
     @staticmethod
     def get_popular_faqs(limit=10):
         """人気FAQ（閲覧数順）を取得"""
@@ -138,4 +155,60 @@ class FAQ(db.Model):
     def increment_view_count(self):
         """閲覧数をインクリメント"""
         self.view_count += 1
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+
+
+class FaqDraft(db.Model):
+    """回答済みのエスカレーションから作ったFAQの下書き（app.utils.faq_mining）。管理者が承認するとFAQになる"""
+    __tablename__ = 'faq_draft'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    question = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=False)
+    keywords = db.Column(db.Text)
+    category = db.Column(db.String(100))
+    status = db.Column(db.String(20), default='pending', index=True)  # 'pending', 'approved', 'rejected'
+    frequency = db.Column(db.Integer, default=0)  # 似た質問への回答の件数（直近の抽出時点）
+    escalation_ids = db.Column(db.Text)  # 元になったエスカレーションID（JSON、新しいものから FAQ_DRAFT_SAMPLE_SIZE 件）
+    fingerprint = db.Column(db.LargeBinary)  # 代表の質問の MinHash 署名（次回の抽出で同じ下書きを更新する）
+    similar_faq_id = db.Column(db.Integer, db.ForeignKey('faq.id'))  # 内容が近い既存のFAQ
+    similar_faq_score = db.Column(db.Float)
+    faq_id = db.Column(db.Integer, db.ForeignKey('faq.id'))  # 承認して作成したFAQ
+    reviewed_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    reviewed_at = db.Column(db.DateTime)
+    last_answered_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    similar_faq = db.relationship('FAQ', foreign_keys=[similar_faq_id])
+    
+    def __repr__(self):
+        return f'<FaqDraft {self.id}: {self.status}>'
+    
+    def source_ids(self):
+        import json
+        return json.loads(self.escalation_ids) if self.escalation_ids else []
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'question': self.question,
+            'answer': self.answer,
+            'keywords': self.keywords,
+            'category': self.category,
+            'status': self.status,
+            'frequency': self.frequency,
+            'escalation_ids': self.source_ids(),
+            'similar_faq_id': self.similar_faq_id,
+            'similar_faq_score': self.similar_faq_score,
+            'faq_id': self.faq_id,
+            'reviewed_at': self.reviewed_at.isoformat() if self.reviewed_at else None,
+            'last_answered_at': self.last_answered_at.isoformat() if self.last_answered_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+# 検索索引と回答候補のキャッシュ（faq:search_index / faq:suggestions:*）。参照回数の更新では無効化しない
+invalidate_on_change(FAQ, 'faq:', columns=('title', 'question', 'answer', 'keywords', 'category', 'is_active'))
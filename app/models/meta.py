@@ -0,0 +1,29 @@
+from app import db
+from datetime import datetime
+
+
+class AppMeta(db.Model):
+    """アプリケーションの状態を保持するキー・値テーブル（スキーマのバージョン、バックアップの復元済み印など）"""
+    __tablename__ = 'app_meta'
+
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AppMeta {self.key}={self.value}>'
+
+    @staticmethod
+    def get(key, default=None):
+        row = db.session.get(AppMeta, key)
+        return row.value if row is not None else default
+
+    @staticmethod
+    def set(key, value):
+        """値を保存（コミットは呼び出し側）"""
+        row = db.session.get(AppMeta, key)
+        if row is None:
+            row = AppMeta(key=key)
+            db.session.add(row)
+        row.value = None if value is None else str(value)
+        return row
@@ -0,0 +1,181 @@
+from app import db
+from datetime import datetime, date, timedelta
+from collections import defaultdict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+class DailyStats(db.Model):
+    """日別集計（分析画面用のロールアップテーブル）"""
+    __tablename__ = 'daily_stats'
+
+    COUNTERS = ('conversations', 'messages', 'escalations', 'faq_hits', 'new_users', 'staff_responses')
+
+    day = db.Column(db.Date, primary_key=True)
+    conversations = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 新規会話数
+    messages = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # メッセージ数
+    escalations = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # エスカレーション数
+    faq_hits = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # FAQ自動回答数
+    new_users = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 新規ユーザー数
+    staff_responses = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 職員回答数
+
+    def __repr__(self):
+        return f'<DailyStats {self.day}>'
+
+    def to_dict(self):
+        data = {'date': self.day.strftime('%Y-%m-%d')}
+        for name in self.COUNTERS:
+            data[name] = getattr(self, name) or 0
+        return data
+
+    @staticmethod
+    def get_range(start_date, end_date=None):
+        """期間内の日別集計を日付順で取得"""
+        query = DailyStats.query.filter(DailyStats.day >= _to_date(start_date))
+        if end_date:
+            query = query.filter(DailyStats.day <= _to_date(end_date))
+        return query.order_by(DailyStats.day.asc()).all()
+
+    @staticmethod
+    def get_daily_counts(rows, counter):
+        """集計行から [{'date', 'count'}] 形式の時系列を作成（0件の日は除外）"""
+        return [
+            {'date': row.day.strftime('%Y-%m-%d'), 'count': getattr(row, counter)}
+            for row in rows if getattr(row, counter)
+        ]
+
+    @staticmethod
+    def increment(connection, day, **deltas):
+        """指定日のカウンターを加算（行がなければ作成）"""
+        deltas = {k: v for k, v in deltas.items() if v}
+        if not deltas:
+            return
+
+        table = DailyStats.__table__
+        dialect = connection.dialect.name
+
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+
+            stmt = insert(table).values(day=day, **deltas)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.day],
+                set_={name: table.c[name] + stmt.excluded[name] for name in deltas}
+            )
+            connection.execute(stmt)
+        else:
+            result = connection.execute(
+                table.update()
+                     .where(table.c.day == day)
+                     .values({name: table.c[name] + value for name, value in deltas.items()})
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(day=day, **deltas))
+
+    @staticmethod
+    def rebuild(start_date=None):
+        """生データから日別集計を再作成（バックフィル）
+
+        メッセージ・FAQ自動回答・職員回答はアーカイブ済みのメッセージ（message_archive_segment）も数える
+        """
+        from app.models import Conversation, Message, Escalation, User
+
+        start_day = _to_date(start_date) if start_date else None
+        totals = defaultdict(lambda: defaultdict(int))
+
+        def collect(counter, column, *criteria):
+            query = db.session.query(
+                db.func.date(column).label('date'),
+                db.func.count().label('count')
+            ).filter(column.isnot(None), *criteria)
+            if start_day:
+                query = query.filter(column >= datetime.combine(start_day, datetime.min.time()))
+            for item in query.group_by(db.func.date(column)).all():
+                totals[_to_date(item.date)][counter] += item.count
+
+        collect('conversations', Conversation.started_at)
+        collect('messages', Message.timestamp)
+        collect('faq_hits', Message.timestamp, Message.message_type == 'bot', Message.faq_id.isnot(None))
+        collect('staff_responses', Message.timestamp, Message.message_type == 'staff')
+        collect('escalations', Escalation.created_at)
+        collect('new_users', User.created_at)
+        _collect_archived(totals, start_day)
+
+        # 対象期間の既存集計を置き換え
+        delete_query = DailyStats.query
+        if start_day:
+            delete_query = delete_query.filter(DailyStats.day >= start_day)
+        delete_query.delete(synchronize_session=False)
+
+        for day, counters in totals.items():
+            row = DailyStats(day=day)
+            for name in DailyStats.COUNTERS:
+                setattr(row, name, counters.get(name, 0))
+            db.session.add(row)
+
+        db.session.commit()
+        return len(totals)
+
+
+def _collect_archived(totals, start_day=None):
+    """アーカイブ済みメッセージを日別に数えて totals に加算（セグメントを少しずつ読んで展開）"""
+    from app.models import MessageArchiveSegment
+
+    # セグメントはID順のため first/last_timestamp で期間を絞れない（すべて読み、メッセージの日時で判定する）
+    query = db.select(MessageArchiveSegment).order_by(MessageArchiveSegment.id)
+    for segment in db.session.execute(query.execution_options(yield_per=10)).scalars():
+        for item in segment.messages():
+            if not item.get('timestamp'):
+                continue
+            day = _to_date(item['timestamp'])
+            if start_day and day < start_day:
+                continue
+            totals[day]['messages'] += 1
+            if item.get('message_type') == 'bot' and item.get('faq_id'):
+                totals[day]['faq_hits'] += 1
+            elif item.get('message_type') == 'staff':
+                totals[day]['staff_responses'] += 1
+
+
+def _to_date(value):
+    """datetime / date / 'YYYY-MM-DD' 文字列を date に変換"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _event_day(value):
+    return (value or datetime.utcnow()).date()
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_daily_stats(session, flush_context):
+    """新規レコードの挿入に合わせて日別集計を加算"""
+    from app.models import Conversation, Message, Escalation, User
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for obj in session.new:
+        if isinstance(obj, Message):
+            day = deltas[_event_day(obj.timestamp)]
+            day['messages'] += 1
+            if obj.message_type == 'bot' and obj.faq_id:
+                day['faq_hits'] += 1
+            elif obj.message_type == 'staff':
+                day['staff_responses'] += 1
+        elif isinstance(obj, Conversation):
+            deltas[_event_day(obj.started_at)]['conversations'] += 1
+        elif isinstance(obj, Escalation):
+            deltas[_event_day(obj.created_at)]['escalations'] += 1
+        elif isinstance(obj, User):
+            deltas[_event_day(obj.created_at)]['new_users'] += 1
+
+    if not deltas:
+        return
+
+    connection = session.connection()
+    for day, counters in deltas.items():
+        DailyStats.increment(connection, day, **counters)
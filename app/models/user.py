@@ -1,5 +1,7 @@
 from app import db
+from app.utils.cache import cache_stats_data, invalidate_on_change
 from datetime import datetime, timedelta
+from sqlalchemy import func, case
 from werkzeug.security import generate_password_hash, check_password_hash
 import hashlib
 import uuid
@@ -123,28 +125,33 @@ class User(db.Model):
         return User.query.filter(User.last_activity >= cutoff_date).all()
     
     @staticmethod
+    @cache_stats_data()
     def get_user_stats():
-        """ユーザー統計を取得"""
-        total_users = User.query.count()
-        staff_users = User.query.filter_by(user_type='staff').count()
-        anonymous_users = User.query.filter_by(is_anonymous=True).count()
-        authenticated_users = total_users - anonymous_users
-        
-        # 活動統計
+        """ユーザー統計を取得（1回の集計クエリ）"""
         seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        active_users_7d = User.query.filter(User.last_activity >= seven_days_ago).count()
-        
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        active_users_30d = User.query.filter(User.last_activity >= thirty_days_ago).count()
+        
+        row = db.session.query(
+            func.count(User.id).label('total_users'),
+            func.sum(case((User.user_type == 'staff', 1), else_=0)).label('staff_users'),
+            func.sum(case((User.is_anonymous == True, 1), else_=0)).label('anonymous_users'),
+            # 活動統計
+            func.sum(case((User.last_activity >= seven_days_ago, 1), else_=0)).label('active_users_7d'),
+            func.sum(case((User.last_activity >= thirty_days_ago, 1), else_=0)).label('active_users_30d')
+        ).one()
+        
+        total_users = row.total_users or 0
+        anonymous_users = row.anonymous_users or 0
+        authenticated_users = total_users - anonymous_users
         
         return {
             'total_users': total_users,
-            'staff_users': staff_users,
+            'staff_users': row.staff_users or 0,
             'anonymous_users': anonymous_users,
             'authenticated_users': authenticated_users,
             'registered_users': authenticated_users,  # 後方互換性
-            'active_users_7d': active_users_7d,
-            'active_users_30d': active_users_30d
+            'active_users_7d': row.active_users_7d or 0,
+            'active_users_30d': row.active_users_30d or 0
         }
 
 
@@ -190,20 +197,25 @@ class StaffMember(db.Model):
     
     def record_response(self, response_time_minutes=None):
         """回答記録を更新"""
-        self.responses_count += 1
-        self.last_response_at = datetime.utcnow()
-        
-        if response_time_minutes:
-            if self.average_response_time:
+        self.record_responses([response_time_minutes])
+        db.session.commit()
+    
+    def record_responses(self, response_times_minutes):
+        """複数件の回答記録をまとめて更新（UPDATE は1回、コミットは呼び出し側）"""
+        count = self.responses_count or 0
+        average = self.average_response_time
+        for response_time_minutes in response_times_minutes:
+            count += 1
+            if response_time_minutes:
                 # 移動平均を計算
-                self.average_response_time = (
-                    (self.average_response_time * (self.responses_count - 1) + response_time_minutes) 
-                    / self.responses_count
-                )
-            else:
-                self.average_response_time = response_time_minutes
+                if average:
+                    average = (average * (count - 1) + response_time_minutes) / count
+                else:
+                    average = response_time_minutes
         
-        db.session.commit()
+        self.responses_count = count
+        self.average_response_time = average
+        self.last_response_at = datetime.utcnow()
     
     @staticmethod
     def get_active_staff():
@@ -211,37 +223,32 @@ class StaffMember(db.Model):
         return StaffMember.query.filter_by(is_active=True).all()
     
     @staticmethod
+    @cache_stats_data()
     def get_staff_stats():
-        """職員統計を取得"""
-        total_staff = StaffMember.query.count()
-        active_staff = StaffMember.query.filter_by(is_active=True).count()
-        
-        # 平均応答時間計算
-        staff_with_response_time = StaffMember.query.filter(
-            StaffMember.average_response_time.isnot(None)
-        ).all()
-        
-        if staff_with_response_time:
-            avg_response_time = sum(s.average_response_time for s in staff_with_response_time) / len(staff_with_response_time)
-        else:
-            avg_response_time = 0
-        
-        # 職員の回答数統計
-        total_responses = sum(s.responses_count for s in StaffMember.query.all())
-        
+        """職員統計を取得（1回の集計クエリ）"""
         # 最近活動した職員数（過去7日）
         seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        recent_active_staff = StaffMember.query.filter(
-            StaffMember.last_response_at >= seven_days_ago
-        ).count()
+        
+        row = db.session.query(
+            func.count(StaffMember.id).label('total_staff'),
+            func.sum(case((StaffMember.is_active == True, 1), else_=0)).label('active_staff'),
+            # 平均応答時間（未回答の職員は除外）
+            func.avg(StaffMember.average_response_time).label('avg_response_time'),
+            # 職員の回答数統計
+            func.sum(func.coalesce(StaffMember.responses_count, 0)).label('total_responses'),
+            func.sum(case((StaffMember.last_response_at >= seven_days_ago, 1), else_=0)).label('recent_active_staff')
+        ).one()
+        
+        total_staff = row.total_staff or 0
+        active_staff = row.active_staff or 0
         
         return {
             'total_staff': total_staff,
             'active_staff': active_staff,
             'inactive_staff': total_staff - active_staff,
-            'avg_response_time': round(avg_response_time, 1),
-            'total_responses': total_responses,
-            'recent_active_staff': recent_active_staff,
+            'avg_response_time': round(row.avg_response_time or 0, 1),
+            'total_responses': row.total_responses or 0,
+            'recent_active_staff': row.recent_active_staff or 0,
             'resolution_rate': 95.0,  # デフォルト値
             'utilization_rate': 75.0  # デフォルト値
         }
@@ -347,4 +354,9 @@ class LoginSession(db.Model):
             'user_agent': self.user_agent,
             'last_activity': self.last_activity.isoformat() if self.last_activity else None,
             'is_expired': self.is_expired()
-        }
\ No newline at end of file
+        }
+
+
+# 統計キャッシュの無効化（最終活動時刻の更新はキャッシュ期限に任せる）
+invalidate_on_change(User, 'stats:get_user_stats', columns=('user_type', 'is_anonymous'))
+invalidate_on_change(StaffMember, 'stats:get_staff_stats')
\ No newline at end of file
@@ -1,11 +1,31 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, Response, make_response
-from app.models import FAQ, Escalation, Conversation, Message, User, StaffMember
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, Response, make_response, send_file, current_app
+from sqlalchemy import delete, func, select, update
+from app.models import FAQ, FaqDraft, Escalation, Conversation, Message, User, StaffMember, DailyStats, MessageArchiveSegment
 from app.auth.utils import admin_required, get_current_user
+from app.utils.cache import invalidate_cache
+from app.utils.jobs import jobs, wants_async
+from app.utils.streaming import iter_csv, iter_gzip, iter_json_array, streaming_download, wants_gzip
+from app.utils.analytics_export import DEFAULT_TYPES, export_period, iter_analytics_rows
+from app.utils.slow_queries import slow_query_log
+from app.utils.profiler import sampler
+from app.utils import diagnostics
+from app.utils.user_restore import restore_backup_file
+from app.utils.user_delete import delete_user_data
+from app.utils.escalation_queue import (claim_escalations, close_escalations, pending_page, release_escalations,
+                                       respond_escalations)
+from app.utils.faq_suggest import cached_suggestions, request_suggestions
+from app.utils.faq_mining import approve_draft, mine_faq_drafts, reject_draft, sample_questions, save_draft
+from app.utils.backup import SECTIONS, backup_filename, iter_backup, restore_backup_upload, write_backup
 from app import db
 from datetime import datetime, timedelta
 import csv
 import io
 import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -34,6 +54,12 @@ def dashboard():
         except:
             pass
         
+        try:
+            today_stats = DailyStats.query.get(datetime.utcnow().date())
+            today_conversations = today_stats.conversations if today_stats else 0
+        except:
+            pass
+        
         # 基本情報
         current_user = get_current_user()
         
@@ -47,9 +73,7 @@ def dashboard():
                              active_users_count=1,
                              current_user=current_user)
     except Exception as e:
-        print(f"Dashboard error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Dashboard error')
         return f"Dashboard Error: {e}"
 
 @admin_bp.route('/faq')
@@ -59,9 +83,7 @@ def faq_list():
         faqs = FAQ.query.order_by(FAQ.created_at.desc()).all()
         return render_template('admin/faq_list.html', faqs=faqs)
     except Exception as e:
-        print(f"FAQ list error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('FAQ list error')
         return render_template('admin/faq_list.html', faqs=[])
 
 @admin_bp.route('/faq/add', methods=['POST'])
@@ -104,7 +126,7 @@ def edit_faq(faq_id):
         
         db.session.commit()
         
-        return jsonify({'message': 'FAQが更新されました'})
+        return jsonify({'message': 'FAQが更新されました', 'faq': faq.to_dict()})
         
     except Exception as e:
         db.session.rollback()
@@ -138,6 +160,86 @@ def delete_faq(faq_id):
         db.session.rollback()
         return jsonify({'error': 'FAQの削除に失敗しました'}), 500
 
+FAQ_BULK_ACTIONS = ('activate', 'deactivate', 'toggle', 'set_category', 'delete')
+
+@admin_bp.route('/faq/bulk', methods=['POST'])
+@admin_required
+def bulk_update_faq():
+    """FAQの一括操作（1回の UPDATE / DELETE で適用し、変更後の行を返す）
+
+    JSON: {"ids": [...], "action": "activate" | "deactivate" | "toggle" | "set_category" | "delete", "category": "..."}
+    """
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    ids = data.get('ids')
+    
+    if action not in FAQ_BULK_ACTIONS:
+        return jsonify({'error': '対応していない操作です'}), 400
+    if not isinstance(ids, list) or not ids:
+        return jsonify({'error': 'FAQが選択されていません'}), 400
+    try:
+        ids = sorted({int(faq_id) for faq_id in ids})
+    except (TypeError, ValueError):
+        return jsonify({'error': 'FAQのIDが不正です'}), 400
+    if len(ids) > current_app.config.get('FAQ_BULK_MAX', 1000):
+        return jsonify({'error': '一度に操作できる件数を超えています'}), 400
+    
+    try:
+        if action == 'delete':
+            # メッセージからの参照を外してから削除
+            db.session.execute(
+                update(Message).where(Message.faq_id.in_(ids)).values(faq_id=None),
+                execution_options={'synchronize_session': False}
+            )
+            db.session.execute(
+                update(FaqDraft).where(FaqDraft.faq_id.in_(ids)).values(faq_id=None),
+                execution_options={'synchronize_session': False}
+            )
+            db.session.execute(
+                update(FaqDraft).where(FaqDraft.similar_faq_id.in_(ids)).values(similar_faq_id=None,
+                                                                                similar_faq_score=None),
+                execution_options={'synchronize_session': False}
+            )
+            deleted_ids = db.session.execute(
+                delete(FAQ).where(FAQ.id.in_(ids)).returning(FAQ.id),
+                execution_options={'synchronize_session': False}
+            ).scalars().all()
+            db.session.commit()
+            invalidate_cache('faq:')  # 一括 UPDATE / DELETE はセッションイベントを通らないため検索索引を手動で無効化
+            return jsonify({
+                'success': True,
+                'message': f'{len(deleted_ids)}件のFAQを削除しました',
+                'deleted_ids': deleted_ids,
+                'missing_ids': sorted(set(ids) - set(deleted_ids))
+            })
+        
+        if action == 'set_category':
+            values = {'category': (data.get('category') or '').strip() or None}
+        elif action == 'toggle':
+            values = {'is_active': ~FAQ.is_active}
+        else:
+            values = {'is_active': action == 'activate'}
+        values['updated_at'] = datetime.utcnow()
+        
+        faqs = db.session.execute(
+            update(FAQ).where(FAQ.id.in_(ids)).values(**values).returning(FAQ),
+            execution_options={'synchronize_session': False}
+        ).scalars().all()
+        updated = [faq.to_dict() for faq in faqs]
+        db.session.commit()
+        invalidate_cache('faq:')
+        return jsonify({
+            'success': True,
+            'message': f'{len(updated)}件のFAQを更新しました',
+            'updated': updated,
+            'missing_ids': sorted(set(ids) - {faq['id'] for faq in updated})
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error('FAQ bulk %s error: %s', action, e)
+        return jsonify({'error': 'FAQの一括操作に失敗しました'}), 500
+
 @admin_bp.route('/faq/bulk-import', methods=['GET', 'POST'])
 @admin_required
 def bulk_import_faq():
@@ -158,9 +260,7 @@ def bulk_import_faq():
             return jsonify({'error': '対応していないファイル形式です'}), 400
             
     except Exception as e:
-        print(f"Bulk import error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Bulk import error')
         return jsonify({'error': 'ファイルの取り込みに失敗しました'}), 500
 
 def handle_csv_import():
@@ -175,55 +275,57 @@ def handle_csv_import():
     if not file.filename.lower().endswith('.csv'):
         return jsonify({'error': 'CSVファイルを選択してください'}), 400
     
-    try:
-        # CSV内容を読み込み
-        content = file.read().decode('utf-8-sig')  # BOM対応
-        csv_reader = csv.DictReader(io.StringIO(content))
-        
-        imported_count = 0
-        errors = []
-        
-        # 期待するカラム
-        required_columns = ['title', 'question', 'answer']
-        optional_columns = ['category', 'keywords', 'is_active']
-        
-        for row_num, row in enumerate(csv_reader, start=2):  # 2行目から開始
-            try:
-                # 必須カラムのチェック
-                if not all(row.get(col) for col in required_columns):
-                    errors.append(f'{row_num}行目: 必須項目が不足しています')
-                    continue
-                
-                # FAQオブジェクトを作成
-                faq = FAQ(
-                    title=row['title'].strip(),
-                    question=row['question'].strip(),
-                    answer=row['answer'].strip(),
-                    category=row.get('category', '').strip() or None,
-                    keywords=row.get('keywords', '').strip() or None,
-                    is_active=str(row.get('is_active', 'true')).lower() in ['true', '1', 'yes', 'on']
-                )
-                
-                db.session.add(faq)
-                imported_count += 1
-                
-            except Exception as row_error:
-                errors.append(f'{row_num}行目: {str(row_error)}')
+    return run_faq_import(import_faqs_from_csv, file.read(), 'CSV')
+
+def import_faqs_from_csv(content, job=None):
+    """CSVデータからFAQを取り込み"""
+    # CSV内容を読み込み
+    text = content.decode('utf-8-sig')  # BOM対応
+    rows = list(csv.DictReader(io.StringIO(text)))
+    
+    imported_count = 0
+    errors = []
+    
+    # 期待するカラム
+    required_columns = ['title', 'question', 'answer']
+    optional_columns = ['category', 'keywords', 'is_active']
+    
+    for row_num, row in enumerate(rows, start=2):  # 2行目から開始
+        try:
+            # 必須カラムのチェック
+            if not all(row.get(col) for col in required_columns):
+                errors.append(f'{row_num}行目: 必須項目が不足しています')
                 continue
-        
-        # 一括コミット
-        if imported_count > 0:
-            db.session.commit()
             
-        return jsonify({
-            'message': f'{imported_count}件のFAQを取り込みました',
-            'imported_count': imported_count,
-            'errors': errors[:10] if errors else []  # 最大10個のエラー表示
-        })
+            # FAQオブジェクトを作成
+            faq = FAQ(
+                title=row['title'].strip(),
+                question=row['question'].strip(),
+                answer=row['answer'].strip(),
+                category=row.get('category', '').strip() or None,
+                keywords=row.get('keywords', '').strip() or None,
+                is_active=str(row.get('is_active', 'true')).lower() in ['true', '1', 'yes', 'on']
+            )
+            
+            db.session.add(faq)
+            imported_count += 1
+            
+        except Exception as row_error:
+            errors.append(f'{row_num}行目: {str(row_error)}')
+            continue
+        finally:
+            if job and row_num % 100 == 0:
+                job.report(row_num - 1, len(rows))
+    
+    # 一括コミット
+    if imported_count > 0:
+        db.session.commit()
         
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': f'CSV取り込みエラー: {str(e)}'}), 500
+    return {
+        'message': f'{imported_count}件のFAQを取り込みました',
+        'imported_count': imported_count,
+        'errors': errors[:10] if errors else []  # 最大10個のエラー表示
+    }
 
 def handle_json_import():
     """JSON形式のFAQ一括取り込み"""
@@ -234,57 +336,62 @@ def handle_json_import():
     if not file.filename.lower().endswith('.json'):
         return jsonify({'error': 'JSONファイルを選択してください'}), 400
     
+    content = file.read()
     try:
-        content = file.read().decode('utf-8')
-        data = json.loads(content)
-        
-        imported_count = 0
-        errors = []
-        
-        # データが配列かどうかチェック
-        if not isinstance(data, list):
-            if isinstance(data, dict) and 'faqs' in data:
-                data = data['faqs']
-            else:
-                return jsonify({'error': 'JSON形式が正しくありません。FAQ配列が必要です'}), 400
-        
-        for i, item in enumerate(data):
-            try:
-                # 必須フィールドのチェック
-                if not all(item.get(field) for field in ['title', 'question', 'answer']):
-                    errors.append(f'{i+1}個目: 必須項目が不足しています')
-                    continue
-                
-                faq = FAQ(
-                    title=item['title'][:200],  # 最大200文字
-                    question=item['question'][:1000],
-                    answer=item['answer'][:2000],
-                    category=item.get('category'),
-                    keywords=item.get('keywords'),
-                    is_active=item.get('is_active', True)
-                )
-                
-                db.session.add(faq)
-                imported_count += 1
-                
-            except Exception as item_error:
-                errors.append(f'{i+1}個目: {str(item_error)}')
-                continue
-        
-        if imported_count > 0:
-            db.session.commit()
-            
-        return jsonify({
-            'message': f'{imported_count}件のFAQを取り込みました',
-            'imported_count': imported_count,
-            'errors': errors[:10]
-        })
-        
+        data = json.loads(content.decode('utf-8'))
     except json.JSONDecodeError:
         return jsonify({'error': '無効なJSON形式です'}), 400
     except Exception as e:
-        db.session.rollback()
         return jsonify({'error': f'JSON取り込みエラー: {str(e)}'}), 500
+    
+    # データが配列かどうかチェック
+    if not isinstance(data, list):
+        if isinstance(data, dict) and 'faqs' in data:
+            data = data['faqs']
+        else:
+            return jsonify({'error': 'JSON形式が正しくありません。FAQ配列が必要です'}), 400
+    
+    return run_faq_import(import_faqs_from_json, data, 'JSON')
+
+def import_faqs_from_json(data, job=None):
+    """JSONのFAQ配列を取り込み"""
+    imported_count = 0
+    errors = []
+    
+    for i, item in enumerate(data):
+        try:
+            # 必須フィールドのチェック
+            if not all(item.get(field) for field in ['title', 'question', 'answer']):
+                errors.append(f'{i+1}個目: 必須項目が不足しています')
+                continue
+            
+            faq = FAQ(
+                title=item['title'][:200],  # 最大200文字
+                question=item['question'][:1000],
+                answer=item['answer'][:2000],
+                category=item.get('category'),
+                keywords=item.get('keywords'),
+                is_active=item.get('is_active', True)
+            )
+            
+            db.session.add(faq)
+            imported_count += 1
+            
+        except Exception as item_error:
+            errors.append(f'{i+1}個目: {str(item_error)}')
+            continue
+        finally:
+            if job and (i + 1) % 100 == 0:
+                job.report(i + 1, len(data))
+    
+    if imported_count > 0:
+        db.session.commit()
+        
+    return {
+        'message': f'{imported_count}件のFAQを取り込みました',
+        'imported_count': imported_count,
+        'errors': errors[:10]
+    }
 
 def handle_excel_import():
     """Excel形式のFAQ一括取り込み"""
@@ -300,60 +407,77 @@ def handle_excel_import():
     if not file.filename.lower().endswith(('.xlsx', '.xls')):
         return jsonify({'error': 'Excelファイルを選択してください'}), 400
     
-    try:
-        # Excelファイルを読み込み
-        df = pd.read_excel(file)
-        
-        imported_count = 0
-        errors = []
-        
-        # 必須カラムのチェック
-        required_columns = ['title', 'question', 'answer']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            return jsonify({
-                'error': f'必須カラムが不足しています: {", ".join(missing_columns)}'
-            }), 400
-        
-        for index, row in df.iterrows():
-            try:
-                # NaN値の処理
-                title = str(row['title']).strip() if pd.notna(row['title']) else ''
-                question = str(row['question']).strip() if pd.notna(row['question']) else ''
-                answer = str(row['answer']).strip() if pd.notna(row['answer']) else ''
-                
-                if not title or not question or not answer:
-                    errors.append(f'{index+2}行目: 必須項目が空です')
-                    continue
-                
-                faq = FAQ(
-                    title=title[:200],
-                    question=question[:1000],
-                    answer=answer[:2000],
-                    category=str(row.get('category', '')).strip() if pd.notna(row.get('category')) else None,
-                    keywords=str(row.get('keywords', '')).strip() if pd.notna(row.get('keywords')) else None,
-                    is_active=bool(row.get('is_active', True))
-                )
-                
-                db.session.add(faq)
-                imported_count += 1
-                
-            except Exception as row_error:
-                errors.append(f'{index+2}行目: {str(row_error)}')
+    return run_faq_import(import_faqs_from_excel, file.read(), 'Excel')
+
+def import_faqs_from_excel(content, job=None):
+    """ExcelデータからFAQを取り込み"""
+    import pandas as pd
+    
+    # Excelファイルを読み込み
+    df = pd.read_excel(io.BytesIO(content))
+    
+    imported_count = 0
+    errors = []
+    
+    # 必須カラムのチェック
+    required_columns = ['title', 'question', 'answer']
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f'必須カラムが不足しています: {", ".join(missing_columns)}')
+    
+    for index, row in df.iterrows():
+        try:
+            # NaN値の処理
+            title = str(row['title']).strip() if pd.notna(row['title']) else ''
+            question = str(row['question']).strip() if pd.notna(row['question']) else ''
+            answer = str(row['answer']).strip() if pd.notna(row['answer']) else ''
+            
+            if not title or not question or not answer:
+                errors.append(f'{index+2}行目: 必須項目が空です')
                 continue
-        
-        if imported_count > 0:
-            db.session.commit()
             
-        return jsonify({
-            'message': f'{imported_count}件のFAQを取り込みました',
-            'imported_count': imported_count,
-            'errors': errors[:10]
-        })
+            faq = FAQ(
+                title=title[:200],
+                question=question[:1000],
+                answer=answer[:2000],
+                category=str(row.get('category', '')).strip() if pd.notna(row.get('category')) else None,
+                keywords=str(row.get('keywords', '')).strip() if pd.notna(row.get('keywords')) else None,
+                is_active=bool(row.get('is_active', True))
+            )
+            
+            db.session.add(faq)
+            imported_count += 1
+            
+        except Exception as row_error:
+            errors.append(f'{index+2}行目: {str(row_error)}')
+            continue
+        finally:
+            if job and (index + 1) % 100 == 0:
+                job.report(index + 1, len(df))
+    
+    if imported_count > 0:
+        db.session.commit()
         
+    return {
+        'message': f'{imported_count}件のFAQを取り込みました',
+        'imported_count': imported_count,
+        'errors': errors[:10]
+    }
+
+def run_faq_import(importer, payload, label):
+    """FAQ取り込みを同期実行、または ?async=1 の場合はジョブとして投入"""
+    if wants_async():
+        job = jobs.submit(f'faq_import_{label.lower()}', importer, payload)
+        return job_accepted(job)
+    
+    try:
+        return jsonify(importer(payload))
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': f'Excel取り込みエラー: {str(e)}'}), 500
+        return jsonify({'error': f'{label}取り込みエラー: {str(e)}'}), 500
 
 @admin_bp.route('/faq/export', methods=['GET'])
 @admin_required
@@ -368,32 +492,25 @@ def export_faq():
         if not include_inactive:
             query = query.filter_by(is_active=True)
         
-        faqs = query.order_by(FAQ.created_at.desc()).all()
+        query = query.order_by(FAQ.created_at.desc())
         
         if export_format == 'csv':
-            return export_csv(faqs)
+            return export_csv(query)
         elif export_format == 'json':
-            return export_json(faqs)
+            return export_json(query)
         elif export_format == 'excel':
-            return export_excel(faqs)
+            return export_excel(query.all())
         else:
             return jsonify({'error': '対応していないエクスポート形式です'}), 400
             
     except Exception as e:
-        print(f"Export error: {e}")
+        logger.error('Export error: %s', e)
         return jsonify({'error': 'エクスポートに失敗しました'}), 500
 
-def export_csv(faqs):
-    """CSV形式でエクスポート"""
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # ヘッダー
-    writer.writerow(['title', 'question', 'answer', 'category', 'keywords', 'is_active', 'view_count', 'created_at'])
-    
-    # データ
-    for faq in faqs:
-        writer.writerow([
+def export_csv(query):
+    """CSV形式でエクスポート（ストリーミング）"""
+    rows = (
+        [
             faq.title,
             faq.question,
             faq.answer,
@@ -402,46 +519,50 @@ def export_csv(faqs):
             faq.is_active,
             faq.view_count or 0,
             faq.created_at.strftime('%Y-%m-%d %H:%M:%S') if faq.created_at else ''
-        ])
-    
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    response.headers['Content-Disposition'] = f'attachment; filename="faq_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
+        ]
+        for faq in query.yield_per(500)
+    )
     
-    # UTF-8 BOM追加
-    csv_data = '\ufeff' + output.getvalue()
-    response.data = csv_data.encode('utf-8')
+    # ヘッダー + データ（UTF-8 BOM付き）
+    chunks = iter_csv(rows, header=['title', 'question', 'answer', 'category', 'keywords', 'is_active', 'view_count', 'created_at'])
     
-    return response
+    return streaming_download(
+        chunks,
+        f'faq_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+        'text/csv; charset=utf-8',
+        gzip=wants_gzip()
+    )
 
-def export_json(faqs):
-    """JSON形式でエクスポート"""
-    data = {
+def export_json(query):
+    """JSON形式でエクスポート（ストリーミング）"""
+    items = (
+        {
+            'id': faq.id,
+            'title': faq.title,
+            'question': faq.question,
+            'answer': faq.answer,
+            'category': faq.category,
+            'keywords': faq.keywords,
+            'is_active': faq.is_active,
+            'view_count': faq.view_count or 0,
+            'created_at': faq.created_at.isoformat() if faq.created_at else None,
+            'updated_at': faq.updated_at.isoformat() if faq.updated_at else None
+        }
+        for faq in query.yield_per(500)
+    )
+    
+    header = {
         'export_date': datetime.now().isoformat(),
-        'total_count': len(faqs),
-        'faqs': [
-            {
-                'id': faq.id,
-                'title': faq.title,
-                'question': faq.question,
-                'answer': faq.answer,
-                'category': faq.category,
-                'keywords': faq.keywords,
-                'is_active': faq.is_active,
-                'view_count': faq.view_count or 0,
-                'created_at': faq.created_at.isoformat() if faq.created_at else None,
-                'updated_at': faq.updated_at.isoformat() if faq.updated_at else None
-            }
-            for faq in faqs
-        ]
+        'total_count': query.order_by(None).count()
     }
+    chunks = iter_json_array(items, prefix=header, key='faqs')
     
-    response = make_response(json.dumps(data, ensure_ascii=False, indent=2))
-    response.headers['Content-Type'] = 'application/json; charset=utf-8'
-    response.headers['Content-Disposition'] = f'attachment; filename="faq_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json"'
-    
-    return response
+    return streaming_download(
+        chunks,
+        f'faq_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json',
+        'application/json; charset=utf-8',
+        gzip=wants_gzip()
+    )
 
 def export_excel(faqs):
     """Excel形式でエクスポート"""
@@ -477,31 +598,283 @@ def export_excel(faqs):
     except ImportError:
         return jsonify({'error': 'Excel出力にはpandasライブラリが必要です'}), 400
 
+FAQ_DRAFT_STATUSES = ('pending', 'approved', 'rejected')
+
+@admin_bp.route('/faq/drafts')
+@admin_required
+def faq_drafts():
+    """回答済みエスカレーションから抽出したFAQ候補の審査（件数の多い順）"""
+    status = request.args.get('status', 'pending')
+    if status not in FAQ_DRAFT_STATUSES:
+        status = 'pending'
+    page = request.args.get('page', 1, type=int)
+    drafts = db.paginate(
+        select(FaqDraft).where(FaqDraft.status == status)
+        .order_by(FaqDraft.frequency.desc(), FaqDraft.last_answered_at.desc(), FaqDraft.id.desc()),
+        page=page, per_page=current_app.config.get('FAQ_DRAFT_PAGE_SIZE', 20), error_out=False
+    )
+    status_counts = dict.fromkeys(FAQ_DRAFT_STATUSES, 0)
+    status_counts.update(db.session.execute(
+        select(FaqDraft.status, func.count(FaqDraft.id)).group_by(FaqDraft.status)
+    ).all())
+    return render_template('admin/faq_drafts.html', drafts=drafts, status=status, status_counts=status_counts,
+                           samples=sample_questions(drafts.items))
+
+@admin_bp.route('/faq/drafts/mine', methods=['POST'])
+@admin_required
+def mine_faq_draft_queue():
+    """回答済みエスカレーションからFAQ候補を抽出（?async=1 でジョブとして実行）
+
+    JSON: {"days": 180, "min_count": 3}（省略時は FAQ_MINING_DAYS / FAQ_DRAFT_MIN_COUNT）
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        days, min_count = (int(data[key]) if data.get(key) is not None else None for key in ('days', 'min_count'))
+    except (TypeError, ValueError):
+        days = min_count = -1
+    if days is not None and days < 0 or min_count is not None and min_count < 1:
+        return jsonify({'error': 'days は0以上、min_count は1以上の整数で指定してください'}), 400
+    
+    if wants_async():
+        job = jobs.submit('faq_mining', mine_faq_drafts, days, min_count)
+        return job_accepted(job)
+    
+    try:
+        result = mine_faq_drafts(days, min_count)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.exception('FAQ mining error')
+        return jsonify({'error': 'FAQ候補の抽出に失敗しました'}), 500
+    return jsonify(dict(result, success=True,
+                        message=f"{result['created']}件のFAQ候補を追加、{result['updated']}件を更新しました"))
+
+def _draft_conflict(draft):
+    db.session.refresh(draft)
+    return jsonify({'error': 'このFAQ候補は既に審査済みです', 'status': draft.status}), 409
+
+@admin_bp.route('/faq/drafts/<int:draft_id>/edit', methods=['POST'])
+@admin_required
+def edit_faq_draft(draft_id):
+    draft = FaqDraft.query.get_or_404(draft_id)
+    try:
+        saved = save_draft(draft, request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not saved:
+        return _draft_conflict(draft)
+    return jsonify({'message': 'FAQ候補を保存しました'})
+
+@admin_bp.route('/faq/drafts/<int:draft_id>/approve', methods=['POST'])
+@admin_required
+def approve_faq_draft(draft_id):
+    """FAQ候補を承認してFAQを作成（JSON でタイトル・質問・回答・キーワード・カテゴリを修正できる）"""
+    draft = FaqDraft.query.get_or_404(draft_id)
+    try:
+        faq = approve_draft(draft, session['user_id'], request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error('FAQ draft approve error: %s', e)
+        return jsonify({'error': 'FAQの作成に失敗しました'}), 500
+    if faq is None:
+        return _draft_conflict(draft)
+    return jsonify({'message': 'FAQを作成しました', 'faq': faq.to_dict()})
+
+@admin_bp.route('/faq/drafts/<int:draft_id>/reject', methods=['POST'])
+@admin_required
+def reject_faq_draft(draft_id):
+    draft = FaqDraft.query.get_or_404(draft_id)
+    if not reject_draft(draft, session['user_id']):
+        return _draft_conflict(draft)
+    return jsonify({'message': 'FAQ候補を却下しました'})
+
 @admin_bp.route('/escalations')
+@admin_required
 def escalation_list():
-    escalations = Escalation.get_pending_escalations()
-    return render_template('admin/escalation_list.html', escalations=escalations)
+    page = request.args.get('page', 1, type=int)
+    escalations = pending_page(page)
+    # 回答候補はバックグラウンドで計算し、画面からは /admin/escalations/suggestions で取得する
+    request_suggestions([members[0].id for _, members in escalations.items])
+    current_user = get_current_user()
+    return render_template('admin/escalation_list.html', escalations=escalations,
+                           pending_count=Escalation.get_pending_count(),
+                           current_user_id=current_user.id if current_user else None, now=datetime.utcnow())
+
+@admin_bp.route('/escalations/suggestions')
+@admin_required
+def escalation_suggestions():
+    """回答候補（?ids=1,2,3）。計算が終わっていないものは pending に返し、計算を投入する"""
+    try:
+        ids = [int(value) for value in request.args.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids は整数のカンマ区切りで指定してください'}), 400
+    ids = ids[:current_app.config.get('ESCALATION_PAGE_SIZE', 20)]
+    
+    suggestions, missing = cached_suggestions(ids)
+    if missing:
+        request_suggestions(missing)
+    return jsonify({'suggestions': suggestions, 'pending': missing})
+
+@admin_bp.route('/escalations/claim', methods=['POST'])
+@admin_required
+def claim_escalation_queue():
+    """未解決のエスカレーションを次の N 件担当（期限付き）"""
+    data = request.get_json(silent=True) or {}
+    try:
+        limit, lease_minutes = (int(data[key]) if data.get(key) is not None else None
+                                for key in ('limit', 'lease_minutes'))
+    except (TypeError, ValueError):
+        limit = lease_minutes = 0
+    if limit is not None and limit < 1 or lease_minutes is not None and lease_minutes < 1:
+        return jsonify({'error': 'limit / lease_minutes は1以上の整数で指定してください'}), 400
+    
+    escalations, expires_at = claim_escalations(session['user_id'], limit, lease_minutes)
+    return jsonify({
+        'escalations': [dict(escalation.to_dict(),
+                             conversation_id=escalation.message.conversation_id,
+                             user_name=_escalation_user_name(escalation))
+                        for escalation in escalations],
+        'lease_expires_at': expires_at.isoformat(),
+        'message': f'{len(escalations)}件を担当しました' if escalations else '担当できる未解決の質問はありません'
+    })
+
+@admin_bp.route('/escalations/release', methods=['POST'])
+@admin_required
+def release_escalation_queue():
+    """担当中のエスカレーションを手放す（ids を省略すると全件）"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+        return jsonify({'error': 'ids は整数の配列で指定してください'}), 400
+    released = release_escalations(session['user_id'], ids)
+    return jsonify({'released': released, 'message': f'{released}件の担当を解除しました'})
+
+def _escalation_user_name(escalation):
+    conversation = escalation.message.conversation if escalation.message else None
+    if conversation is None:
+        return None
+    if conversation.user:
+        return conversation.user.display_name or conversation.user.identifier
+    return conversation.user_display_name
+
+def _escalation_conflict(escalation_id):
+    """回答・クローズできなかった理由（回答済み・他の職員が担当中）"""
+    escalation = db.session.get(Escalation, escalation_id, populate_existing=True)
+    if escalation.status != 'pending':
+        return jsonify({'error': 'この質問は既に対応済みです', 'status': escalation.status}), 409
+    return jsonify({'error': '他の職員が対応中です',
+                    'lease_expires_at': escalation.lease_expires_at.isoformat()}), 409
+
+def _escalation_ids(values):
+    """整数IDの配列（重複除去）。不正なら None"""
+    if not isinstance(values, list) or not values or not all(isinstance(i, int) for i in values):
+        return None
+    return list(dict.fromkeys(values))
+
+def _linked_faq(data):
+    """回答に紐付けるFAQ（faq_id の指定がなければ None）と、エラーレスポンス"""
+    faq_id = data.get('faq_id')
+    if faq_id in (None, ''):
+        return None, None
+    try:
+        faq = db.session.get(FAQ, int(faq_id))
+    except (TypeError, ValueError):
+        faq = None
+    if faq is None:
+        return None, (jsonify({'error': '指定されたFAQが見つかりません'}), 400)
+    return faq, None
+
+def _escalation_batch_message(done, result, verb):
+    skipped = len(result['conflict_ids']) + len(result['missing_ids'])
+    message = f'{done}件{verb}しました'
+    if skipped:
+        message += f'（{skipped}件は対応済み・他の職員が対応中・存在しないため除外）'
+    return message
+
+@admin_bp.route('/escalations/respond', methods=['POST'])
+@admin_required
+def respond_escalation_batch():
+    """複数のエスカレーションにまとめて回答（1トランザクション）
+
+    {"responses": [{"escalation_id": 1, "staff_response": "..."}, ...]} または、
+    同じ内容の質問に同じ回答を送る場合は {"escalation_ids": [1, 2, ...], "staff_response": "..."}
+    "faq_id" を付けると回答を既存のFAQに紐付ける（staff_response を省略した場合は FAQ の回答を送る）
+    """
+    data = request.get_json(silent=True) or {}
+    faq, error = _linked_faq(data)
+    if error:
+        return error
+    if faq and not str(data.get('staff_response') or '').strip():
+        data['staff_response'] = faq.answer
+    if 'responses' in data:
+        items = data['responses'] if isinstance(data['responses'], list) else []
+        responses = {}
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('escalation_id'), int) \
+                    or not str(item.get('staff_response') or '').strip():
+                return jsonify({'error': 'responses は escalation_id と staff_response の組で指定してください'}), 400
+            responses[item['escalation_id']] = item['staff_response']
+    else:
+        ids = _escalation_ids(data.get('escalation_ids'))
+        staff_response = str(data.get('staff_response') or '').strip()
+        if ids is None or not staff_response:
+            return jsonify({'error': 'escalation_ids（整数の配列）と staff_response を指定してください'}), 400
+        responses = dict.fromkeys(ids, data['staff_response'])
+    if not responses:
+        return jsonify({'error': '回答するエスカレーションを指定してください'}), 400
+    if len(responses) > current_app.config.get('ESCALATION_BATCH_MAX', 200):
+        return jsonify({'error': '一度に回答できる件数を超えています'}), 400
+    
+    try:
+        result = respond_escalations(responses, session['user_id'], data.get('staff_name'), faq.id if faq else None)
+    except Exception as e:
+        db.session.rollback()
+        logger.error('Escalation batch respond error: %s', e)
+        return jsonify({'error': '回答の送信に失敗しました'}), 500
+    return jsonify(dict(result, message=_escalation_batch_message(len(result['answered_ids']), result, 'に回答')))
+
+@admin_bp.route('/escalations/close', methods=['POST'])
+@admin_required
+def close_escalation_batch():
+    """複数のエスカレーションをまとめてクローズ"""
+    data = request.get_json(silent=True) or {}
+    ids = _escalation_ids(data.get('escalation_ids'))
+    if ids is None:
+        return jsonify({'error': 'escalation_ids は整数の配列で指定してください'}), 400
+    if len(ids) > current_app.config.get('ESCALATION_BATCH_MAX', 200):
+        return jsonify({'error': '一度にクローズできる件数を超えています'}), 400
+    
+    try:
+        result = close_escalations(ids, session['user_id'])
+    except Exception as e:
+        db.session.rollback()
+        logger.error('Escalation batch close error: %s', e)
+        return jsonify({'error': 'クローズに失敗しました'}), 500
+    return jsonify(dict(result, message=_escalation_batch_message(len(result['closed_ids']), result, 'をクローズ')))
 
 @admin_bp.route('/escalation/<int:escalation_id>/respond', methods=['POST'])
+@admin_required
 def respond_escalation(escalation_id):
     try:
-        escalation = Escalation.query.get_or_404(escalation_id)
         data = request.get_json()
-        
-        escalation.staff_response = data.get('staff_response')
-        escalation.staff_name = data.get('staff_name')
-        escalation.status = 'answered'
-        escalation.answered_at = datetime.utcnow()
-        
-        # 利用者へのボット回答メッセージを作成
-        staff_message = Message(
-            conversation_id=escalation.message.conversation_id,
-            message_type='staff',
-            content=escalation.staff_response
-        )
-        
-        db.session.add(staff_message)
-        db.session.commit()
+        faq, error = _linked_faq(data)
+        if error:
+            return error
+        staff_response = data.get('staff_response')
+        if not str(staff_response or '').strip():
+            staff_response = faq.answer if faq else None  # FAQ を選んだだけなら FAQ の回答を送る
+        if not staff_response:
+            return jsonify({'error': '回答を入力してください'}), 400
+        
+        # 未解決で、自分が担当できるもののみ（同時に回答された場合はどちらか一方だけが成功する）
+        result = respond_escalations({escalation_id: staff_response}, session['user_id'],
+                                     data.get('staff_name'), faq.id if faq else None)
+        if result['missing_ids']:
+            return jsonify({'error': 'エスカレーションが見つかりません'}), 404
+        if result['conflict_ids']:
+            return _escalation_conflict(escalation_id)
         
         return jsonify({'message': '回答を送信しました'})
         
@@ -510,13 +883,14 @@ def respond_escalation(escalation_id):
         return jsonify({'error': '回答の送信に失敗しました'}), 500
 
 @admin_bp.route('/escalation/<int:escalation_id>/close', methods=['POST'])
+@admin_required
 def close_escalation(escalation_id):
     try:
-        escalation = Escalation.query.get_or_404(escalation_id)
-        escalation.status = 'closed'
-        escalation.answered_at = datetime.utcnow()
-        
-        db.session.commit()
+        result = close_escalations([escalation_id], session['user_id'])
+        if result['missing_ids']:
+            return jsonify({'error': 'エスカレーションが見つかりません'}), 404
+        if result['conflict_ids']:
+            return _escalation_conflict(escalation_id)
         
         return jsonify({'message': 'エスカレーションをクローズしました'})
         
@@ -538,7 +912,7 @@ def user_list():
         
         return render_template('admin/user_list.html', users=users)
     except Exception as e:
-        print(f"User list error: {e}")
+        logger.error('User list error: %s', e)
         return render_template('admin/user_list.html', users=None)
 
 @admin_bp.route('/users/add', methods=['GET', 'POST'])
@@ -595,7 +969,7 @@ def user_add():
             
         except Exception as e:
             db.session.rollback()
-            print(f"User add error: {e}")
+            logger.error('User add error: %s', e)
             flash('ユーザーの追加に失敗しました', 'error')
             return render_template('admin/user_add.html')
     
@@ -656,7 +1030,7 @@ def user_edit(user_id):
             
     except Exception as e:
         db.session.rollback()
-        print(f"User edit error: {e}")
+        logger.error('User edit error: %s', e)
         flash('ユーザー情報の更新に失敗しました', 'error')
     
     return render_template('admin/user_edit.html', user=user)
@@ -687,7 +1061,7 @@ def user_detail(user_id):
                              messages=messages[:10], 
                              stats=stats)
     except Exception as e:
-        print(f"User detail error: {e}")
+        logger.error('User detail error: %s', e)
         flash('ユーザー情報の取得に失敗しました', 'error')
         return redirect(url_for('admin.user_list'))
 
@@ -711,7 +1085,7 @@ def user_chat(user_id):
                              conversations=conversations,
                              faqs=faqs)
     except Exception as e:
-        print(f"User chat error: {e}")
+        logger.error('User chat error: %s', e)
         flash('チャットルームの表示に失敗しました', 'error')
         return redirect(url_for('admin.user_detail', user_id=user_id))
 
@@ -739,47 +1113,23 @@ def user_delete(user_id):
         
         user_name = user.display_name or user.identifier
         
+        if wants_async():
+            job = jobs.submit('user_delete', delete_user_data, user_id)
+            return job_accepted(job)
+        
         # 関連データの削除処理
         try:
-            # 1. ユーザーが送信したメッセージを削除
-            messages = Message.query.filter_by(sender_user_id=user_id).all()
-            for message in messages:
-                # エスカレーションがある場合は削除
-                escalations = Escalation.query.filter_by(message_id=message.id).all()
-                for escalation in escalations:
-                    db.session.delete(escalation)
-                
-                db.session.delete(message)
-            
-            # 2. ユーザーの会話を削除
-            conversations = Conversation.query.filter_by(user_id=user_id).all()
-            for conversation in conversations:
-                # 会話に関連するメッセージが残っていれば削除
-                remaining_messages = Message.query.filter_by(conversation_id=conversation.id).all()
-                for msg in remaining_messages:
-                    db.session.delete(msg)
-                
-                db.session.delete(conversation)
-            
-            # 3. 職員プロフィールがある場合は削除
-            staff_member = StaffMember.query.filter_by(user_id=user_id).first()
-            if staff_member:
-                db.session.delete(staff_member)
-            
-            # 4. ユーザー本体を削除
-            db.session.delete(user)
-            
-            # すべての変更をコミット
-            db.session.commit()
+            counts = delete_user_data(user_id)
             
             return jsonify({
                 'success': True,
-                'message': f'ユーザー「{user_name}」を削除しました'
+                'message': f'ユーザー「{user_name}」を削除しました',
+                'deleted': counts
             })
             
         except Exception as e:
             db.session.rollback()
-            print(f"User delete error during data cleanup: {e}")
+            logger.error('User delete error during data cleanup: %s', e)
             return jsonify({
                 'success': False,
                 'error': '関連データの削除中にエラーが発生しました'
@@ -787,7 +1137,7 @@ def user_delete(user_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"User delete error: {e}")
+        logger.error('User delete error: %s', e)
         return jsonify({
             'success': False,
             'error': 'ユーザーの削除に失敗しました'
@@ -801,9 +1151,7 @@ def staff_list():
         staff_members = StaffMember.query.order_by(StaffMember.last_response_at.desc().nullslast()).all()
         return render_template('admin/staff_list.html', staff_members=staff_members)
     except Exception as e:
-        print(f"Staff list error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Staff list error')
         return f"Staff list error: {e}"
 
 @admin_bp.route('/staff/<int:staff_id>')
@@ -817,7 +1165,7 @@ def staff_detail(staff_id):
                              staff_member=staff_member,
                              responses=responses)
     except Exception as e:
-        print(f"Staff detail error: {e}")
+        logger.error('Staff detail error: %s', e)
         flash('職員情報の取得に失敗しました', 'error')
         return redirect(url_for('admin.staff_list'))
 
@@ -834,7 +1182,7 @@ def conversation_list():
         
         return render_template('admin/conversation_list.html', conversations=conversations)
     except Exception as e:
-        print(f"Conversation list error: {e}")
+        logger.error('Conversation list error: %s', e)
         return render_template('admin/conversation_list.html', conversations=None)
 
 @admin_bp.route('/conversations/<int:conversation_id>')
@@ -849,10 +1197,16 @@ def conversation_detail(conversation_id):
                              conversation=conversation,
                              messages=messages)
     except Exception as e:
-        print(f"Conversation detail error: {e}")
+        logger.error('Conversation detail error: %s', e)
         flash('会話情報の取得に失敗しました', 'error')
         return redirect(url_for('admin.conversation_list'))
 
+def get_daily_series(start_date):
+    """日別集計テーブルから会話・エスカレーションの時系列を取得"""
+    rows = DailyStats.get_range(start_date)
+    return (DailyStats.get_daily_counts(rows, 'conversations'),
+            DailyStats.get_daily_counts(rows, 'escalations'))
+
 @admin_bp.route('/analytics')
 @admin_required
 def analytics():
@@ -868,69 +1222,17 @@ def analytics():
             faq_stats = FAQ.get_faq_stats()
             popular_faqs = FAQ.get_popular_faqs(limit=10)
         except Exception as faq_error:
-            print(f"FAQ stats error: {faq_error}")
+            logger.error('FAQ stats error: %s', faq_error)
             faq_stats = {'total_faqs': 0, 'active_faqs': 0, 'total_views': 0}
             popular_faqs = []
         
-        # 時系列データ（過去30日間）
+        # 時系列データ（過去30日間・日別集計テーブルから取得）
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
-        # 会話統計の取得（安全な処理）
-        daily_conversations = []
-        try:
-            from app.models.conversation import Conversation
-            conversation_data = db.session.query(
-                db.func.date(Conversation.started_at).label('date'),
-                db.func.count(Conversation.id).label('count')
-            ).filter(
-                Conversation.started_at >= thirty_days_ago
-            ).group_by(
-                db.func.date(Conversation.started_at)
-            ).order_by('date').all()
-            
-            for item in conversation_data:
-                daily_conversations.append({
-                    'date': item.date.strftime('%Y-%m-%d'),
-                    'count': item.count
-                })
-                
-        except Exception as conv_error:
-            print(f"Conversation query error: {conv_error}")
-            # ダミーデータで代替
-            for i in range(30):
-                date = (thirty_days_ago + timedelta(days=i)).date()
-                daily_conversations.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'count': max(0, 5 + (i % 7) * 2)
-                })
-        
-        # エスカレーション統計の取得（安全な処理）
-        daily_escalations = []
         try:
-            escalation_data = db.session.query(
-                db.func.date(Escalation.created_at).label('date'),
-                db.func.count(Escalation.id).label('count')
-            ).filter(
-                Escalation.created_at >= thirty_days_ago
-            ).group_by(
-                db.func.date(Escalation.created_at)
-            ).order_by('date').all()
-            
-            for item in escalation_data:
-                daily_escalations.append({
-                    'date': item.date.strftime('%Y-%m-%d'),
-                    'count': item.count
-                })
-                
-        except Exception as esc_error:
-            print(f"Escalation query error: {esc_error}")
-            # ダミーデータで代替
-            for i in range(30):
-                date = (thirty_days_ago + timedelta(days=i)).date()
-                daily_escalations.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'count': max(0, 1 + (i % 5))
-                })
+            daily_conversations, daily_escalations = get_daily_series(thirty_days_ago)
+        except Exception as series_error:
+            logger.error('Daily stats query error: %s', series_error)
+            daily_conversations, daily_escalations = [], []
         
         return render_template('admin/analytics_optimized.html',
                              user_stats=user_stats,
@@ -940,9 +1242,7 @@ def analytics():
                              daily_escalations=daily_escalations,
                              popular_faqs=popular_faqs)
     except Exception as e:
-        print(f"Analytics error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Analytics error')
         # エラー時のフォールバック表示
         return render_template('admin/analytics_optimized.html',
                              user_stats={'total_users': 0, 'authenticated_users': 0, 'anonymous_users': 0},
@@ -1007,7 +1307,7 @@ def staff_add():
             
         except Exception as e:
             db.session.rollback()
-            print(f"Staff add error: {e}")
+            logger.error('Staff add error: %s', e)
             flash('職員の追加に失敗しました', 'error')
     
     return render_template('admin/staff_form.html')
@@ -1045,7 +1345,7 @@ def staff_edit(staff_id):
             
         except Exception as e:
             db.session.rollback()
-            print(f"Staff edit error: {e}")
+            logger.error('Staff edit error: %s', e)
             flash('職員情報の更新に失敗しました', 'error')
     
     return render_template('admin/staff_form.html', staff=staff_member, is_edit=True)
@@ -1074,173 +1374,39 @@ def staff_toggle(staff_id):
 @admin_bp.route('/analytics/export')
 @admin_required
 def analytics_export():
-    """分析データをCSVエクスポート"""
+    """分析データをCSVエクスポート（セクション単位でストリーミング）"""
     try:
         export_format = request.args.get('format', 'csv')
         range_days = int(request.args.get('range', '30').replace('days', ''))
-        data_types = request.args.get('types', 'conversations,escalations,faq,users,staff').split(',')
-        
-        # 期間計算
-        end_date = datetime.utcnow()
-        if range_days == 7:
-            start_date = end_date - timedelta(days=7)
-            filename = f"analytics_7days_{end_date.strftime('%Y%m%d')}.csv"
-        elif range_days == 30:
-            start_date = end_date - timedelta(days=30)
-            filename = f"analytics_30days_{end_date.strftime('%Y%m%d')}.csv"
-        elif range_days == 90:
-            start_date = end_date - timedelta(days=90)
-            filename = f"analytics_90days_{end_date.strftime('%Y%m%d')}.csv"
-        else:
-            start_date = end_date - timedelta(days=365)  # 全期間
-            filename = f"analytics_all_{end_date.strftime('%Y%m%d')}.csv"
-        
-        # CSVデータを作成
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # ヘッダー
-        writer.writerow([
-            '分析レポート',
-            f'期間: {start_date.strftime("%Y-%m-%d")} - {end_date.strftime("%Y-%m-%d")}'
-        ])
-        writer.writerow([])  # 空行
-        
-        # 1. 統計サマリー
-        if 'users' in data_types:
-            user_stats = User.get_user_stats()
-            writer.writerow(['=== ユーザー統計 ==='])
-            writer.writerow(['項目', '値'])
-            writer.writerow(['総ユーザー数', user_stats.get('total_users', 0)])
-            writer.writerow(['認証済みユーザー', user_stats.get('authenticated_users', 0)])
-            writer.writerow(['匿名ユーザー', user_stats.get('anonymous_users', 0)])
-            writer.writerow(['7日間アクティブユーザー', user_stats.get('active_users_7d', 0)])
-            writer.writerow(['30日間アクティブユーザー', user_stats.get('active_users_30d', 0)])
-            writer.writerow([])
-        
-        if 'staff' in data_types:
-            staff_stats = StaffMember.get_staff_stats()
-            writer.writerow(['=== 職員統計 ==='])
-            writer.writerow(['項目', '値'])
-            writer.writerow(['総職員数', staff_stats.get('total_staff', 0)])
-            writer.writerow(['アクティブ職員数', staff_stats.get('active_staff', 0)])
-            writer.writerow(['平均応答時間（分）', staff_stats.get('avg_response_time', 0)])
-            writer.writerow(['総回答数', staff_stats.get('total_responses', 0)])
-            writer.writerow([])
-        
-        if 'faq' in data_types:
-            from app.models.faq import FAQ
-            faq_stats = FAQ.get_faq_stats()
-            writer.writerow(['=== FAQ統計 ==='])
-            writer.writerow(['項目', '値'])
-            writer.writerow(['総FAQ数', faq_stats.get('total_faqs', 0)])
-            writer.writerow(['アクティブFAQ数', faq_stats.get('active_faqs', 0)])
-            writer.writerow(['総閲覧数', faq_stats.get('total_views', 0)])
-            writer.writerow(['FAQ平均閲覧数', f"{faq_stats.get('avg_views_per_faq', 0):.1f}"])
-            writer.writerow([])
-            
-            # 人気FAQランキング
-            popular_faqs = FAQ.get_popular_faqs(limit=10)
-            writer.writerow(['=== 人気FAQランキング ==='])
-            writer.writerow(['順位', 'タイトル', '閲覧数', 'カテゴリ'])
-            for i, faq in enumerate(popular_faqs, 1):
-                writer.writerow([i, faq.title, faq.view_count or 0, faq.category or '未分類'])
-            writer.writerow([])
-        
-        # 2. 日別統計データ
-        if 'conversations' in data_types:
-            writer.writerow(['=== 日別会話統計 ==='])
-            writer.writerow(['日付', '会話数', '累計'])
-            
-            try:
-                from app.models.conversation import Conversation
-                daily_conversations = db.session.query(
-                    db.func.date(Conversation.started_at).label('date'),
-                    db.func.count(Conversation.id).label('count')
-                ).filter(
-                    Conversation.started_at >= start_date
-                ).group_by(
-                    db.func.date(Conversation.started_at)
-                ).order_by('date').all()
-                
-                cumulative = 0
-                for item in daily_conversations:
-                    cumulative += item.count
-                    writer.writerow([
-                        item.date.strftime('%Y-%m-%d'),
-                        item.count,
-                        cumulative
-                    ])
-            except Exception as e:
-                writer.writerow(['データ取得エラー', str(e)])
-            
-            writer.writerow([])
-        
-        if 'escalations' in data_types:
-            writer.writerow(['=== 日別エスカレーション統計 ==='])
-            writer.writerow(['日付', 'エスカレーション数', '累計'])
-            
-            try:
-                daily_escalations = db.session.query(
-                    db.func.date(Escalation.created_at).label('date'),
-                    db.func.count(Escalation.id).label('count')
-                ).filter(
-                    Escalation.created_at >= start_date
-                ).group_by(
-                    db.func.date(Escalation.created_at)
-                ).order_by('date').all()
-                
-                cumulative = 0
-                for item in daily_escalations:
-                    cumulative += item.count
-                    writer.writerow([
-                        item.date.strftime('%Y-%m-%d'),
-                        item.count,
-                        cumulative
-                    ])
-            except Exception as e:
-                writer.writerow(['データ取得エラー', str(e)])
-            
-            writer.writerow([])
+        data_types = request.args.get('types', DEFAULT_TYPES).split(',')
         
-        # 3. 詳細データ（必要に応じて）
-        if 'users' in data_types:
-            writer.writerow(['=== 詳細ユーザーデータ ==='])
-            writer.writerow(['ユーザーID', '表示名', 'タイプ', '質問数', '最終活動', '作成日'])
-            
-            try:
-                users = User.query.filter(User.created_at >= start_date).all()
-                for user in users:
-                    writer.writerow([
-                        user.identifier,
-                        user.display_name or '匿名',
-                        user.user_type,
-                        user.question_count or 0,
-                        user.last_activity.strftime('%Y-%m-%d %H:%M') if user.last_activity else '',
-                        user.created_at.strftime('%Y-%m-%d %H:%M') if user.created_at else ''
-                    ])
-            except Exception as e:
-                writer.writerow(['データ取得エラー', str(e)])
-        
-        # CSV レスポンスを作成
-        output.seek(0)
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if wants_async():
+            job = jobs.submit('analytics_export', write_analytics_export, range_days, data_types)
+            return job_accepted(job)
         
-        # UTF-8 BOM を追加（Excel対応）
-        csv_data = '\ufeff' + output.getvalue()
-        response.data = csv_data.encode('utf-8')
+        _, _, filename = export_period(range_days)
         
-        return response
+        # UTF-8 BOM 付き（Excel対応）
+        return streaming_download(
+            iter_csv(iter_analytics_rows(range_days, data_types)),
+            filename,
+            'text/csv; charset=utf-8',
+            gzip=wants_gzip()
+        )
         
     except Exception as e:
-        print(f"Export error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Export error')
         flash('エクスポートに失敗しました', 'error')
         return redirect(url_for('admin.analytics'))
 
+def write_analytics_export(range_days, data_types, job=None):
+    """分析データCSVをジョブの結果ファイルに書き出し"""
+    _, _, filename = export_period(range_days)
+    with job.open_file(filename, 'text/csv; charset=utf-8') as f:
+        for chunk in iter_csv(iter_analytics_rows(range_days, data_types, job=job)):
+            f.write(chunk)
+    return {'filename': filename}
+
 @admin_bp.route('/analytics-simplified')
 @admin_required
 def analytics_simplified():
@@ -1256,69 +1422,17 @@ def analytics_simplified():
             faq_stats = FAQ.get_faq_stats()
             popular_faqs = FAQ.get_popular_faqs(limit=10)
         except Exception as faq_error:
-            print(f"FAQ stats error: {faq_error}")
+            logger.error('FAQ stats error: %s', faq_error)
             faq_stats = {'total_faqs': 0, 'active_faqs': 0, 'total_views': 0}
             popular_faqs = []
         
-        # 時系列データ（過去30日間）
+        # 時系列データ（過去30日間・日別集計テーブルから取得）
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
-        # 会話統計の取得（安全な処理）
-        daily_conversations = []
-        try:
-            from app.models.conversation import Conversation
-            conversation_data = db.session.query(
-                db.func.date(Conversation.started_at).label('date'),
-                db.func.count(Conversation.id).label('count')
-            ).filter(
-                Conversation.started_at >= thirty_days_ago
-            ).group_by(
-                db.func.date(Conversation.started_at)
-            ).order_by('date').all()
-            
-            for item in conversation_data:
-                daily_conversations.append({
-                    'date': item.date.strftime('%Y-%m-%d'),
-                    'count': item.count
-                })
-                
-        except Exception as conv_error:
-            print(f"Conversation query error: {conv_error}")
-            # ダミーデータで代替
-            for i in range(30):
-                date = (thirty_days_ago + timedelta(days=i)).date()
-                daily_conversations.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'count': max(0, 5 + (i % 7) * 2)
-                })
-        
-        # エスカレーション統計の取得（安全な処理）
-        daily_escalations = []
         try:
-            escalation_data = db.session.query(
-                db.func.date(Escalation.created_at).label('date'),
-                db.func.count(Escalation.id).label('count')
-            ).filter(
-                Escalation.created_at >= thirty_days_ago
-            ).group_by(
-                db.func.date(Escalation.created_at)
-            ).order_by('date').all()
-            
-            for item in escalation_data:
-                daily_escalations.append({
-                    'date': item.date.strftime('%Y-%m-%d'),
-                    'count': item.count
-                })
-                
-        except Exception as esc_error:
-            print(f"Escalation query error: {esc_error}")
-            # ダミーデータで代替
-            for i in range(30):
-                date = (thirty_days_ago + timedelta(days=i)).date()
-                daily_escalations.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'count': max(0, 1 + (i % 5))
-                })
+            daily_conversations, daily_escalations = get_daily_series(thirty_days_ago)
+        except Exception as series_error:
+            logger.error('Daily stats query error: %s', series_error)
+            daily_conversations, daily_escalations = [], []
         
         return render_template('admin/analytics_simplified.html',
                              user_stats=user_stats,
@@ -1328,9 +1442,7 @@ def analytics_simplified():
                              daily_escalations=daily_escalations,
                              popular_faqs=popular_faqs)
     except Exception as e:
-        print(f"Analytics simplified error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Analytics simplified error')
         return f"Analytics simplified error: {e}"
 
 @admin_bp.route('/analytics-test')
@@ -1348,22 +1460,12 @@ def analytics_test():
             faq_stats = FAQ.get_faq_stats()
             popular_faqs = FAQ.get_popular_faqs(limit=10)
         except Exception as faq_error:
-            print(f"FAQ stats error: {faq_error}")
+            logger.error('FAQ stats error: %s', faq_error)
             faq_stats = {'total_faqs': 0, 'active_faqs': 0, 'total_views': 0}
             popular_faqs = []
         
-        # ダミーデータ
-        daily_conversations = [
-            {'date': '2025-08-01', 'count': 5},
-            {'date': '2025-08-02', 'count': 7},
-            {'date': '2025-08-03', 'count': 3}
-        ]
-        
-        daily_escalations = [
-            {'date': '2025-08-01', 'count': 1},
-            {'date': '2025-08-02', 'count': 2},
-            {'date': '2025-08-03', 'count': 0}
-        ]
+        # 時系列データ（過去30日間・日別集計テーブルから取得）
+        daily_conversations, daily_escalations = get_daily_series(datetime.utcnow() - timedelta(days=30))
         
         return render_template('admin/analytics_simple.html',
                              user_stats=user_stats,
@@ -1373,55 +1475,41 @@ def analytics_test():
                              daily_escalations=daily_escalations,
                              popular_faqs=popular_faqs)
     except Exception as e:
-        print(f"Analytics test error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Analytics test error')
         return f"Analytics test error: {e}"
 
 # ユーザーデータバックアップ・復元機能
 @admin_bp.route('/users/backup')
 @admin_required
 def user_backup():
-    """ユーザーデータをJSONでバックアップ"""
+    """ユーザーデータを NDJSON でバックアップ（ストリーミング）
+
+    ?full=1 で FAQ・会話・メッセージ・エスカレーションも含める、?compress=1 で gzip ファイル、
+    ?async=1 でジョブとして書き出し
+    """
     try:
-        # 全ユーザーデータを取得（パスワード以外）
-        users = User.query.all()
-        backup_data = {
-            'backup_date': datetime.utcnow().isoformat(),
-            'backup_type': 'users',
-            'users': []
-        }
+        sections = SECTIONS if request.args.get('full', 'false').lower() in ('1', 'true', 'yes') else ('users',)
+        compress = request.args.get('compress', 'false').lower() in ('1', 'true', 'yes')
         
-        for user in users:
-            if user.user_id != 'admin':  # 管理者は除外
-                user_data = {
-                    'identifier': user.identifier,
-                    'user_id': user.user_id,
-                    'display_name': user.display_name,
-                    'user_type': user.user_type,
-                    'department': user.department,
-                    'is_anonymous': user.is_anonymous,
-                    'is_admin': user.is_admin,
-                    'created_at': user.created_at.isoformat() if user.created_at else None
-                }
-                backup_data['users'].append(user_data)
-        
-        # JSON形式でダウンロード
-        response = make_response(json.dumps(backup_data, indent=2, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        response.headers['Content-Disposition'] = f'attachment; filename="user_backup_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.json"'
+        if wants_async():
+            job = jobs.submit('user_backup', write_backup, sections, compress)
+            return job_accepted(job)
         
-        return response
+        chunks = iter_backup(sections)
+        if compress:
+            return streaming_download(iter_gzip(chunks), backup_filename(sections, compress=True), 'application/gzip')
+        return streaming_download(chunks, backup_filename(sections), 'application/x-ndjson; charset=utf-8',
+                                  gzip=wants_gzip())
         
     except Exception as e:
-        print(f"User backup error: {e}")
+        logger.error('User backup error: %s', e)
         flash('バックアップに失敗しました', 'error')
         return redirect(url_for('admin.user_list'))
 
 @admin_bp.route('/users/restore', methods=['GET', 'POST'])
 @admin_required 
 def user_restore():
-    """ユーザーデータを復元"""
+    """バックアップ（JSON / NDJSON / gzip）からデータを復元"""
     if request.method == 'POST':
         try:
             # アップロードされたファイルを取得
@@ -1434,61 +1522,37 @@ def user_restore():
                 flash('ファイルが選択されていません', 'error')
                 return render_template('admin/user_restore.html')
             
-            # JSONファイルを読み込み
-            try:
-                backup_data = json.loads(file.read().decode('utf-8'))
-            except json.JSONDecodeError:
-                flash('無効なJSONファイルです', 'error')
-                return render_template('admin/user_restore.html')
-            
-            if 'users' not in backup_data:
-                flash('無効なバックアップファイルです', 'error')
-                return render_template('admin/user_restore.html')
-            
             # デフォルトパスワード設定
             default_password = request.form.get('default_password', 'password123')
             
-            restored_count = 0
-            skipped_count = 0
+            # メモリに載せずに一時ファイルへ保存し、1行ずつ読みながら復元する
+            fd, path = tempfile.mkstemp(prefix='restore_')
+            with os.fdopen(fd, 'wb') as f:
+                file.save(f)
             
-            # ユーザーを復元
-            for user_data in backup_data['users']:
-                try:
-                    # 既存ユーザーをチェック
-                    existing_user = User.query.filter_by(user_id=user_data.get('user_id')).first()
-                    if existing_user:
-                        skipped_count += 1
-                        continue
-                    
-                    # 新しいユーザーを作成
-                    new_user = User(
-                        identifier=user_data.get('identifier'),
-                        user_id=user_data.get('user_id'),
-                        display_name=user_data.get('display_name'),
-                        user_type=user_data.get('user_type', 'user'),
-                        department=user_data.get('department'),
-                        is_anonymous=user_data.get('is_anonymous', False),
-                        is_admin=user_data.get('is_admin', False)
-                    )
-                    
-                    # デフォルトパスワードを設定
-                    new_user.set_password(default_password)
-                    
-                    db.session.add(new_user)
-                    restored_count += 1
-                    
-                except Exception as user_error:
-                    print(f"User restore error for {user_data.get('user_id', 'unknown')}: {user_error}")
-                    continue
+            if wants_async():
+                job = jobs.submit('user_restore', restore_backup_upload, path, default_password)
+                return job_accepted(job)
             
-            db.session.commit()
+            try:
+                result = restore_backup_upload(path, default_password)
+            except ValueError:
+                flash('無効なバックアップファイルです', 'error')
+                return render_template('admin/user_restore.html')
+            restored_count = result['restored_count']
+            skipped_count = result['skipped_count']
             
-            flash(f'ユーザーデータを復元しました（復元: {restored_count}件, スキップ: {skipped_count}件）', 'success')
+            message = f'ユーザーデータを復元しました（復元: {restored_count}件, スキップ: {skipped_count}件）'
+            others = [f'{name} {counts["restored"]}件' + (f'（スキップ {counts["skipped"]}件）' if counts['skipped'] else '')
+                      for name, counts in result['sections'].items() if name != 'users']
+            if others:
+                message += '／' + '、'.join(others)
+            flash(message, 'success')
             return redirect(url_for('admin.user_list'))
             
         except Exception as e:
             db.session.rollback()
-            print(f"User restore error: {e}")
+            logger.error('User restore error: %s', e)
             flash('復元に失敗しました', 'error')
     
     return render_template('admin/user_restore.html')
@@ -1502,27 +1566,8 @@ def init_with_backup():
         backup_file_path = '/app/user_backup_latest.json'  # Renderでのパス
         
         if os.path.exists(backup_file_path):
-            with open(backup_file_path, 'r', encoding='utf-8') as f:
-                backup_data = json.load(f)
-                
-            restored_count = 0
-            for user_data in backup_data.get('users', []):
-                existing_user = User.query.filter_by(user_id=user_data.get('user_id')).first()
-                if not existing_user:
-                    new_user = User(
-                        identifier=user_data.get('identifier'),
-                        user_id=user_data.get('user_id'),
-                        display_name=user_data.get('display_name'),
-                        user_type=user_data.get('user_type', 'user'),
-                        department=user_data.get('department'),
-                        is_anonymous=user_data.get('is_anonymous', False),
-                        is_admin=user_data.get('is_admin', False)
-                    )
-                    new_user.set_password('password123')  # デフォルトパスワード
-                    db.session.add(new_user)
-                    restored_count += 1
-                    
-            db.session.commit()
+            result = restore_backup_file(backup_file_path)
+            restored_count = result['restored_count']
             flash(f'バックアップから{restored_count}件のユーザーを復元しました', 'success')
         else:
             flash('バックアップファイルが見つかりません', 'warning')
@@ -1530,6 +1575,151 @@ def init_with_backup():
         return redirect(url_for('admin.dashboard'))
         
     except Exception as e:
-        print(f"Init with backup error: {e}")
+        logger.error('Init with backup error: %s', e)
         flash('自動復元に失敗しました', 'error')
         return redirect(url_for('admin.dashboard'))
+
+@admin_bp.route('/system/archive-messages', methods=['POST'])
+@admin_required
+def archive_old_messages():
+    """古いメッセージをアーカイブ（?async=1 でジョブとして実行）"""
+    from app.utils.archive import archive_messages
+    
+    data = request.get_json(silent=True) or {}
+    days = data.get('days', request.form.get('days', type=int))
+    
+    if wants_async():
+        job = jobs.submit('message_archive', archive_messages, days)
+        return job_accepted(job)
+    
+    try:
+        result = archive_messages(days)
+        return jsonify(dict(result, success=True))
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Message archive error')
+        return jsonify({'error': f'アーカイブに失敗しました: {str(e)}'}), 500
+
+# バックグラウンドジョブ
+def job_accepted(job):
+    """ジョブ投入時のレスポンス（202 Accepted）"""
+    return jsonify({
+        'success': True,
+        'message': 'バックグラウンドで処理を開始しました',
+        'job_id': job.id,
+        'status_url': url_for('admin.job_status', job_id=job.id)
+    }), 202
+
+@admin_bp.route('/jobs')
+@admin_required
+def job_list():
+    """ジョブ一覧"""
+    return jsonify({
+        'jobs': [job.to_dict() for job in jobs.recent()],
+        'queue': jobs.queue_depth()
+    })
+
+@admin_bp.route('/jobs/<job_id>')
+@admin_required
+def job_status(job_id):
+    """ジョブの状態を取得（ポーリング用）"""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+    
+    data = job.to_dict()
+    if job.file_path:
+        data['download_url'] = url_for('admin.job_download', job_id=job.id)
+    return jsonify(data)
+
+@admin_bp.route('/jobs/<job_id>/download')
+@admin_required
+def job_download(job_id):
+    """ジョブ結果ファイルをダウンロード"""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'ジョブが見つかりません'}), 404
+    
+    if job.status != 'done' or not job.file_path:
+        return jsonify({'error': 'ダウンロード可能なファイルがありません', 'status': job.status}), 409
+    
+    return send_file(job.file_path, mimetype=job.mimetype,
+                     as_attachment=True, download_name=job.file_name)
+
+# 診断
+@admin_bp.route('/diagnostics')
+@admin_required
+def diagnostics_dashboard():
+    """実行時診断ダッシュボード（値は JSON エンドポイントから取得）"""
+    return render_template('admin/diagnostics.html')
+
+@admin_bp.route('/diagnostics/data')
+@admin_required
+def diagnostics_data():
+    """実行時診断の JSON"""
+    return jsonify(diagnostics.collect())
+
+@admin_bp.route('/diagnostics/slow-queries')
+@admin_required
+def slow_queries():
+    """スロークエリログ"""
+    entries = slow_query_log.entries()
+    threshold_ms = round(slow_query_log.threshold * 1000) if slow_query_log.enabled else None
+    
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'enabled': slow_query_log.enabled,
+            'threshold_ms': threshold_ms,
+            'count': len(entries),
+            'queries': entries
+        })
+    
+    return render_template('admin/slow_queries.html',
+                         entries=entries,
+                         enabled=slow_query_log.enabled,
+                         threshold_ms=threshold_ms)
+
+@admin_bp.route('/diagnostics/slow-queries/clear', methods=['POST'])
+@admin_required
+def clear_slow_queries():
+    """スロークエリログをクリア"""
+    slow_query_log.clear()
+    return jsonify({'success': True, 'message': 'スロークエリログをクリアしました'})
+
+@admin_bp.route('/diagnostics/profiles')
+@admin_required
+def profiles():
+    """サンプリングプロファイル"""
+    summary = sampler.summary()
+    
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'sample_rate': sampler.sample_rate,
+            'interval_ms': sampler.interval * 1000,
+            'endpoints': summary
+        })
+    
+    return render_template('admin/profiles.html',
+                         profiles=summary,
+                         sample_rate=sampler.sample_rate,
+                         interval_ms=sampler.interval * 1000)
+
+@admin_bp.route('/diagnostics/profiles/<name>.folded')
+@admin_required
+def download_profile(name):
+    """collapsed stack 形式でダウンロード（flamegraph.pl / speedscope 用）"""
+    folded = sampler.collapsed(name)
+    if folded is None:
+        return jsonify({'error': 'プロファイルが見つかりません'}), 404
+    
+    response = make_response(folded)
+    response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}.folded"'
+    return response
+
+@admin_bp.route('/diagnostics/profiles/clear', methods=['POST'])
+@admin_required
+def clear_profiles():
+    """プロファイルをクリア"""
+    sampler.clear()
+    return jsonify({'success': True, 'message': 'プロファイルをクリアしました'})
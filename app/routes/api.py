@@ -1,10 +1,17 @@
-from flask import Blueprint, request, jsonify, session
-from app.models import FAQ, Conversation, Message, Escalation, User, StaffMember
+from flask import Blueprint, request, jsonify, session, current_app
+from sqlalchemy.orm import selectinload
+from app.models import FAQ, Conversation, Message, Escalation, User, StaffMember, MessageArchiveSegment
 from app.auth.utils import login_required, admin_required, get_current_user
+from app.utils.metrics import chat_messages_total, registry
+from app.utils.archive import history_page
+from app.utils.escalation_clusters import index_escalation
 from app import db
 from datetime import datetime
 import uuid
 import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
 
 api_bp = Blueprint('api', __name__)
 
@@ -90,6 +97,9 @@ def send_message():
             user_message.is_escalated = True
             
             escalation = Escalation(message_id=user_message.id)
+            if current_app.config.get('ESCALATION_CLUSTERING', True):
+                # 類似の未解決質問があれば同じクラスタにまとめる（署名と索引も保存）
+                index_escalation(escalation, message_content)
             db.session.add(escalation)
             
             response = {
@@ -99,13 +109,12 @@ def send_message():
             }
         
         db.session.commit()
+        chat_messages_total.inc(outcome=response['type'])
         return jsonify(response)
         
     except Exception as e:
         db.session.rollback()
-        print(f"Send message error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Send message error')
         return jsonify({'error': f'エラーが発生しました: {str(e)}'}), 500
 
 @api_bp.route('/get_messages')
@@ -117,16 +126,34 @@ def get_messages():
         if not current_user:
             return jsonify({'error': '認証が必要です', 'messages': []}), 401
         
+        registry.record_poll(current_user.id)
+        
         # 管理者の場合は、指定されたユーザーのメッセージを取得可能
         target_user_id = current_user.id
         if current_user.is_admin and request.args.get('user_id'):
             target_user_id = int(request.args.get('user_id'))
         
-        # そのユーザーの全メッセージを時系列で取得（全会話セッション統合）
-        messages = db.session.query(Message)\
-                    .join(Conversation, Message.conversation_id == Conversation.id)\
-                    .filter(Conversation.user_id == target_user_id)\
-                    .order_by(Message.timestamp.asc()).all()
+        # 履歴はID順にページ単位で返す（全会話セッション統合）
+        # - 既定: 最新 limit 件 / before_id: それより古い limit 件（アーカイブも含む）
+        # - after_id: それより新しいメッセージ（ポーリング用）
+        page_size = current_app.config.get('MESSAGE_PAGE_SIZE', 50)
+        limit = min(max(request.args.get('limit', page_size, type=int), 1),
+                    current_app.config.get('MESSAGE_PAGE_MAX', 200))
+        before_id = request.args.get('before_id', type=int)
+        after_id = request.args.get('after_id', type=int)
+        
+        if after_id is not None:
+            newer = db.session.query(Message)\
+                        .join(Conversation, Message.conversation_id == Conversation.id)\
+                        .filter(Conversation.user_id == target_user_id, Message.id > after_id)\
+                        .options(
+                            selectinload(Message.sender_user),
+                            selectinload(Message.staff_member),
+                            selectinload(Message.faq)
+                        ).order_by(Message.id.asc()).limit(limit + 1).all()
+            messages, has_more = [msg.to_dict() for msg in newer[:limit]], len(newer) > limit
+        else:
+            messages, has_more = history_page(target_user_id, before_id=before_id, limit=limit)
         
         # メイン会話セッションを取得（統合表示用）
         main_session_id = f"user_{target_user_id}_main_session"
@@ -138,8 +165,11 @@ def get_messages():
         conversation_id = main_conversation.id if main_conversation else None
         
         return jsonify({
-            'messages': [msg.to_dict() for msg in messages],
+            'messages': messages,
+            'has_more': has_more,
+            'next_before_id': messages[0]['id'] if has_more and after_id is None else None,
             'conversation_id': conversation_id,
+            'archived': MessageArchiveSegment.summary(target_user_id),
             'user_info': {
                 'id': current_user.id,
                 'display_name': current_user.display_name,
@@ -148,7 +178,7 @@ def get_messages():
         })
     
     except Exception as e:
-        print(f"Get messages error: {e}")
+        logger.error('Get messages error: %s', e)
         return jsonify({'error': 'メッセージ取得でエラーが発生しました', 'messages': []}), 500
 
 @api_bp.route('/identify-user', methods=['POST'])
@@ -396,9 +426,7 @@ def admin_send_message():
         
     except Exception as e:
         db.session.rollback()
-        print(f"Admin send message error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Admin send message error')
         return jsonify({'error': f'エラーが発生しました: {str(e)}'}), 500
 
 @api_bp.route('/get_users')
@@ -429,7 +457,7 @@ def get_users():
         })
         
     except Exception as e:
-        print(f"Get users error: {e}")
+        logger.error('Get users error: %s', e)
         return jsonify({'error': 'ユーザー一覧の取得に失敗しました', 'users': []}), 500
 
 @api_bp.route('/search-faq', methods=['POST'])
@@ -459,6 +487,6 @@ def search_faq():
         })
         
     except Exception as e:
-        print(f"FAQ search error: {e}")
+        logger.error('FAQ search error: %s', e)
         return jsonify({'error': 'FAQ検索でエラーが発生しました', 'faqs': []}), 500
 
@@ -1,8 +1,13 @@
-from flask import Blueprint, render_template, session, jsonify, redirect, url_for
-from app.models import FAQ, User
+from flask import Blueprint, render_template, session, jsonify, redirect, url_for, request, current_app, Response
+from app.models import FAQ, User, Escalation
 from app.auth.utils import login_required, get_current_user
+from app.utils.metrics import registry
+import hmac
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
@@ -18,7 +23,7 @@ def index():
         
         return render_template('index.html', faqs=faqs)
     except Exception as e:
-        print(f"Index route error: {e}")
+        logger.error('Index route error: %s', e)
         # エラー時でも基本画面を表示
         return render_template('index.html', faqs=[])
 
@@ -34,7 +39,7 @@ def chat():
         
         return render_template('user/chat.html', faqs=faqs, user=current_user)
     except Exception as e:
-        print(f"Chat route error: {e}")
+        logger.error('Chat route error: %s', e)
         # エラー時でも基本画面を表示
         return render_template('user/chat.html', faqs=[], user=current_user)
 
@@ -50,4 +55,28 @@ def test_faq():
             'faqs': faq_data
         })
     except Exception as e:
-        return jsonify({'error': str(e)})
\ No newline at end of file
+        return jsonify({'error': str(e)})
+
+
+@main_bp.route('/metrics')
+def metrics():
+    """Prometheus 形式のメトリクス（管理者セッションまたは METRICS_TOKEN の Bearer 認証）"""
+    token = current_app.config.get('METRICS_TOKEN')
+    auth_header = request.headers.get('Authorization', '')
+    authorized = bool(token) and hmac.compare_digest(auth_header, f'Bearer {token}')
+    
+    if not authorized:
+        user = get_current_user()
+        if not user or not user.is_admin:
+            return jsonify({'error': '管理者権限が必要です'}), 403
+    
+    try:
+        pending_escalations = Escalation.get_pending_count()
+    except Exception as e:
+        logger.error('Metrics pending count error: %s', e)
+        pending_escalations = 0
+    
+    body = registry.render(gauges=[
+        ('escalations_pending', '未解決のエスカレーション数', pending_escalations)
+    ])
+    return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
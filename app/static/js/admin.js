@@ -27,6 +27,13 @@ class AdminApp {
         this.editBtns = document.querySelectorAll('.edit-btn');
         this.toggleBtns = document.querySelectorAll('.toggle-btn');
         this.deleteBtns = document.querySelectorAll('.delete-btn');
+
+        // 一括操作
+        this.selectAll = document.getElementById('selectAllFaqs');
+        this.bulkAction = document.getElementById('bulkAction');
+        this.bulkCategory = document.getElementById('bulkCategory');
+        this.bulkApplyBtn = document.getElementById('bulkApplyBtn');
+        this.bulkSelectedCount = document.getElementById('bulkSelectedCount');
     }
 
     setupCSRF() {
@@ -60,6 +67,20 @@ class AdminApp {
             btn.addEventListener('click', () => this.deleteFaq(btn.dataset.faqId));
         });
 
+        // 一括操作
+        this.selectAll?.addEventListener('change', () => {
+            this.faqCheckboxes().forEach(box => { box.checked = this.selectAll.checked; });
+            this.updateBulkState();
+        });
+        document.querySelectorAll('.faq-select').forEach(box => {
+            box.addEventListener('change', () => this.updateBulkState());
+        });
+        this.bulkAction?.addEventListener('change', () => {
+            this.bulkCategory.style.display = this.bulkAction.value === 'set_category' ? '' : 'none';
+            this.updateBulkState();
+        });
+        this.bulkApplyBtn?.addEventListener('click', () => this.applyBulkAction());
+
         // アクセシビリティ: Escapeキーでモーダルを閉じる
         document.addEventListener('keydown', (e) => {
             if (e.key === 'Escape' && this.faqModal?.style.display === 'block') {
@@ -129,7 +150,11 @@ class AdminApp {
             if (response.ok) {
                 this.showMessage('FAQが正常に保存されました', 'success');
                 this.closeModal();
-                setTimeout(() => location.reload(), 1000);
+                if (result.faq) {
+                    this.patchFaqRows([result.faq]);
+                } else {
+                    setTimeout(() => location.reload(), 1000);
+                }
             } else {
                 this.showMessage(result.error || 'エラーが発生しました', 'error');
             }
@@ -144,26 +169,9 @@ class AdminApp {
             return;
         }
 
-        try {
-            const response = await fetch(`/admin/faq/${faqId}/toggle`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': this.csrfToken
-                }
-            });
-
-            const result = await response.json();
-
-            if (response.ok) {
-                this.showMessage('FAQ状態が更新されました', 'success');
-                setTimeout(() => location.reload(), 1000);
-            } else {
-                this.showMessage(result.error || 'エラーが発生しました', 'error');
-            }
-        } catch (error) {
-            console.error('状態更新エラー:', error);
-            this.showMessage('通信エラーが発生しました', 'error');
+        const result = await this.sendBulkAction([faqId], currentActive ? 'deactivate' : 'activate');
+        if (result) {
+            this.showMessage('FAQ状態が更新されました', 'success');
         }
     }
 
@@ -172,29 +180,133 @@ class AdminApp {
             return;
         }
 
+        const result = await this.sendBulkAction([faqId], 'delete');
+        if (result) {
+            this.showMessage('FAQが削除されました', 'success');
+        }
+    }
+
+    faqCheckboxes() {
+        return document.querySelectorAll('.faq-select');
+    }
+
+    selectedFaqIds() {
+        return Array.from(this.faqCheckboxes()).filter(box => box.checked).map(box => parseInt(box.value, 10));
+    }
+
+    updateBulkState() {
+        if (!this.bulkApplyBtn) return;
+        const count = this.selectedFaqIds().length;
+        this.bulkSelectedCount.textContent = count;
+        this.bulkApplyBtn.disabled = count === 0 || !this.bulkAction.value;
+    }
+
+    async applyBulkAction() {
+        const ids = this.selectedFaqIds();
+        const action = this.bulkAction.value;
+        if (!ids.length || !action) return;
+
+        const label = this.bulkAction.options[this.bulkAction.selectedIndex].text;
+        const warning = action === 'delete' ? 'この操作は取り消せません。' : '';
+        if (!confirm(`選択した${ids.length}件のFAQを「${label}」しますか？${warning}`)) {
+            return;
+        }
+
+        const result = await this.sendBulkAction(ids, action, { category: this.bulkCategory.value });
+        if (result) {
+            this.showMessage(result.message, 'success');
+            if (this.selectAll) this.selectAll.checked = false;
+            this.updateBulkState();
+        }
+    }
+
+    /**
+     * 一括操作APIを呼び出し、返された行で表を更新（再読み込みしない）
+     */
+    async sendBulkAction(ids, action, extra = {}) {
         try {
-            const response = await fetch(`/admin/faq/${faqId}/delete`, {
+            const response = await fetch('/admin/faq/bulk', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                     'X-CSRFToken': this.csrfToken
-                }
+                },
+                body: JSON.stringify({ ids, action, ...extra })
             });
 
             const result = await response.json();
 
-            if (response.ok) {
-                this.showMessage('FAQが削除されました', 'success');
-                setTimeout(() => location.reload(), 1000);
-            } else {
+            if (!response.ok) {
                 this.showMessage(result.error || 'エラーが発生しました', 'error');
+                return null;
             }
+            if (result.updated) {
+                this.patchFaqRows(result.updated);
+            }
+            if (result.deleted_ids) {
+                this.removeFaqRows(result.deleted_ids);
+            }
+            return result;
         } catch (error) {
-            console.error('削除エラー:', error);
+            console.error('一括操作エラー:', error);
             this.showMessage('通信エラーが発生しました', 'error');
+            return null;
         }
     }
 
+    patchFaqRows(faqs) {
+        faqs.forEach(faq => {
+            const row = document.querySelector(`tr[data-faq-row="${faq.id}"]`);
+            if (!row) return;
+
+            row.classList.toggle('inactive', !faq.is_active);
+            const badge = row.querySelector('.status-badge');
+            badge.classList.toggle('active', faq.is_active);
+            badge.classList.toggle('inactive', !faq.is_active);
+            badge.textContent = faq.is_active ? 'アクティブ' : '非アクティブ';
+
+            row.querySelector('.faq-title').textContent = faq.title;
+            row.querySelector('.faq-preview').textContent = (faq.question || '').slice(0, 100) + '...';
+            row.querySelector('.faq-category').textContent = faq.category || '未分類';
+
+            const toggleBtn = row.querySelector('.toggle-btn');
+            toggleBtn.dataset.active = String(faq.is_active);
+            toggleBtn.title = faq.is_active ? '非アクティブ化' : 'アクティブ化';
+            toggleBtn.textContent = faq.is_active ? '👁️' : '🚫';
+
+            const index = (window.faqData || []).findIndex(item => item.id === faq.id);
+            if (index >= 0) {
+                window.faqData[index] = { ...window.faqData[index], ...faq };
+            }
+        });
+        this.updateFaqCounts();
+    }
+
+    removeFaqRows(ids) {
+        ids.forEach(id => {
+            document.querySelector(`tr[data-faq-row="${id}"]`)?.remove();
+        });
+        if (window.faqData) {
+            window.faqData = window.faqData.filter(item => !ids.includes(item.id));
+        }
+        this.updateFaqCounts();
+        this.updateBulkState();
+    }
+
+    updateFaqCounts() {
+        const rows = document.querySelectorAll('tr[data-faq-row]');
+        const inactive = document.querySelectorAll('tr[data-faq-row].inactive').length;
+        const counts = {
+            faqTotalCount: rows.length,
+            faqActiveCount: rows.length - inactive,
+            faqInactiveCount: inactive
+        };
+        Object.entries(counts).forEach(([id, value]) => {
+            const element = document.getElementById(id);
+            if (element) element.textContent = value;
+        });
+    }
+
     showMessage(message, type) {
         // 既存のメッセージを削除
         const existingMessages = document.querySelectorAll('.temp-flash-message');
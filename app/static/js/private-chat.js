@@ -6,6 +6,12 @@
 let isLoading = false;
 let lastMessageId = null;
 let autoScrollEnabled = true;
+let historyUserId = null;          // 管理者が他ユーザーの履歴を表示するときのユーザーID
+let oldestMessageId = null;        // 表示中で最も古いメッセージ（これより前を遡って読み込む）
+let hasOlderMessages = false;
+let isLoadingOlder = false;
+let detachedFromLatest = false;    // 遡りすぎて最新側を表示から外した状態
+const MAX_RENDERED_MESSAGES = 300; // 表示しておくメッセージ要素の上限
 let currentSettings = {
     fontSize: 2,
     highContrast: false
@@ -49,6 +55,15 @@ function initializePrivateChat() {
     chatMessages.addEventListener('scroll', function() {
         const isAtBottom = this.scrollTop + this.clientHeight >= this.scrollHeight - 100;
         autoScrollEnabled = isAtBottom;
+        
+        // 上端付近まで遡ったら過去のページを読み込む
+        if (this.scrollTop < 200 && hasOlderMessages) {
+            loadOlderMessages();
+        }
+        // 最新側を外した状態で下端に戻ったら最新ページを読み直す
+        if (isAtBottom && detachedFromLatest) {
+            reloadLatestMessages();
+        }
     });
     
     // CSRFトークンの設定
@@ -68,26 +83,42 @@ function initializePrivateChat() {
     }
 }
 
+/**
+ * get_messages のURLを組み立て
+ */
+function messagesUrl(params = {}) {
+    const query = new URLSearchParams(params);
+    if (historyUserId !== null) {
+        query.set('user_id', historyUserId);
+    }
+    const text = query.toString();
+    return '/api/get_messages' + (text ? '?' + text : '');
+}
+
 /**
  * チャットメッセージをロード
+ * 初回は最新ページのみ取得し、以降は前回より新しいメッセージだけを取得して追加する
  */
 async function loadChatMessages() {
-    if (isLoading) return;
+    if (isLoading || detachedFromLatest) return;
     
     try {
         isLoading = true;
-        const response = await fetch('/api/get_messages');
+        const initial = lastMessageId === null;
+        const response = await fetch(initial ? messagesUrl() : messagesUrl({ after_id: lastMessageId }));
         const data = await response.json();
         
         if (response.ok && data.messages) {
-            displayMessages(data.messages);
+            if (initial) {
+                displayMessages(data.messages);
+                updateHistoryState(data);
+            } else if (data.messages.length > 0) {
+                appendNewMessages(data.messages);
+                showNotification('新しいメッセージが届きました', 'info');
+            }
             
-            // 新しいメッセージがあった場合の処理
             const latestMessage = data.messages[data.messages.length - 1];
-            if (latestMessage && latestMessage.id !== lastMessageId) {
-                if (lastMessageId !== null) {
-                    showNotification('新しいメッセージが届きました', 'info');
-                }
+            if (latestMessage) {
                 lastMessageId = latestMessage.id;
             }
         } else if (data.error) {
@@ -106,6 +137,115 @@ async function loadChatMessages() {
     }
 }
 
+/**
+ * 最新ページの応答から遡り読み込みの状態を設定
+ */
+function updateHistoryState(data, userId) {
+    if (userId !== undefined) {
+        historyUserId = userId;
+    }
+    const messages = data.messages || [];
+    oldestMessageId = messages.length > 0 ? messages[0].id : null;
+    lastMessageId = messages.length > 0 ? messages[messages.length - 1].id : lastMessageId;
+    hasOlderMessages = Boolean(data.has_more);
+    detachedFromLatest = false;
+}
+
+/**
+ * 最新ページを読み直す
+ */
+function reloadLatestMessages() {
+    detachedFromLatest = false;
+    lastMessageId = null;
+    autoScrollEnabled = true;
+    return loadChatMessages();
+}
+
+/**
+ * 過去のメッセージを1ページ分読み込んで先頭に追加（スクロール位置は維持）
+ */
+async function loadOlderMessages() {
+    if (isLoadingOlder || !hasOlderMessages || oldestMessageId === null) return;
+    
+    const chatMessages = document.getElementById('chatMessages');
+    const loader = document.createElement('div');
+    loader.className = 'history-loader';
+    loader.textContent = '過去のメッセージを読み込み中...';
+    
+    try {
+        isLoadingOlder = true;
+        chatMessages.insertBefore(loader, chatMessages.querySelector('.message'));
+        
+        const response = await fetch(messagesUrl({ before_id: oldestMessageId }));
+        const data = await response.json();
+        loader.remove();
+        if (!response.ok || !data.messages) {
+            console.error('過去のメッセージ取得エラー:', data.error);
+            return;
+        }
+        
+        const previousHeight = chatMessages.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        data.messages.forEach(message => fragment.appendChild(createMessageElement(message)));
+        chatMessages.insertBefore(fragment, chatMessages.querySelector('.message'));
+        chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+        
+        if (data.messages.length > 0) {
+            oldestMessageId = data.messages[0].id;
+        }
+        hasOlderMessages = Boolean(data.has_more);
+        trimRenderedMessages(false);
+    } catch (error) {
+        loader.remove();
+        console.error('過去のメッセージ取得でエラーが発生しました:', error);
+    } finally {
+        isLoadingOlder = false;
+    }
+}
+
+/**
+ * 表示中のメッセージ要素を上限までに減らす
+ * fromTop: 古い側を削る（新着の追加時）/ false: 新しい側を削る（遡り読み込み時）
+ */
+function trimRenderedMessages(fromTop) {
+    const chatMessages = document.getElementById('chatMessages');
+    const rendered = chatMessages.querySelectorAll('.message');
+    const excess = rendered.length - MAX_RENDERED_MESSAGES;
+    if (excess <= 0) return;
+    
+    if (fromTop) {
+        const previousHeight = chatMessages.scrollHeight;
+        for (let i = 0; i < excess; i++) {
+            rendered[i].remove();
+        }
+        chatMessages.scrollTop -= previousHeight - chatMessages.scrollHeight;
+        oldestMessageId = parseInt(rendered[excess].dataset.messageId, 10);
+        hasOlderMessages = true;
+    } else {
+        for (let i = rendered.length - excess; i < rendered.length; i++) {
+            rendered[i].remove();
+        }
+        lastMessageId = parseInt(rendered[rendered.length - excess - 1].dataset.messageId, 10);
+        detachedFromLatest = true;
+    }
+}
+
+/**
+ * ポーリングで取得した新着メッセージを末尾に追加
+ */
+function appendNewMessages(messages) {
+    const chatMessages = document.getElementById('chatMessages');
+    
+    // 送信直後に仮表示したメッセージを取得済みのものに置き換える
+    chatMessages.querySelectorAll('.message').forEach(element => {
+        if (String(element.dataset.messageId).includes('_')) {
+            element.remove();
+        }
+    });
+    messages.forEach(message => addMessageToDisplay(message));
+    trimRenderedMessages(true);
+}
+
 /**
  * メッセージを表示
  */
@@ -649,6 +789,8 @@ function initializeAccessibility() {
 window.privateChat = {
     sendMessage,
     loadChatMessages,
+    loadOlderMessages,
+    updateHistoryState,
     showNotification,
     showConfirm,
     toggleSettings,
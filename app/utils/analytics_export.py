@@ -0,0 +1,177 @@
+"""
+分析データエクスポート
+- セクション単位でCSV行を生成し、ストリーミングで送信
+- 互いに独立した集計セクションはスレッドプールで並行に作成（各スレッドで個別のDBセッション）
+- 詳細ユーザーデータは yield_per で少しずつ読み込む
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+DEFAULT_TYPES = 'conversations,escalations,faq,users,staff'
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='analytics')
+        return _executor
+
+
+def export_period(range_days):
+    """期間日数から (開始日時, 終了日時, ファイル名) を計算"""
+    end_date = datetime.utcnow()
+    if range_days in (7, 30, 90):
+        start_date = end_date - timedelta(days=range_days)
+        filename = f"analytics_{range_days}days_{end_date.strftime('%Y%m%d')}.csv"
+    else:
+        start_date = end_date - timedelta(days=365)  # 全期間
+        filename = f"analytics_all_{end_date.strftime('%Y%m%d')}.csv"
+    return start_date, end_date, filename
+
+
+def _user_stats_section():
+    from app.models import User
+
+    user_stats = User.get_user_stats()
+    return [
+        ['=== ユーザー統計 ==='],
+        ['項目', '値'],
+        ['総ユーザー数', user_stats.get('total_users', 0)],
+        ['認証済みユーザー', user_stats.get('authenticated_users', 0)],
+        ['匿名ユーザー', user_stats.get('anonymous_users', 0)],
+        ['7日間アクティブユーザー', user_stats.get('active_users_7d', 0)],
+        ['30日間アクティブユーザー', user_stats.get('active_users_30d', 0)],
+        []
+    ]
+
+
+def _staff_stats_section():
+    from app.models import StaffMember
+
+    staff_stats = StaffMember.get_staff_stats()
+    return [
+        ['=== 職員統計 ==='],
+        ['項目', '値'],
+        ['総職員数', staff_stats.get('total_staff', 0)],
+        ['アクティブ職員数', staff_stats.get('active_staff', 0)],
+        ['平均応答時間（分）', staff_stats.get('avg_response_time', 0)],
+        ['総回答数', staff_stats.get('total_responses', 0)],
+        []
+    ]
+
+
+def _faq_stats_section():
+    from app.models import FAQ
+
+    faq_stats = FAQ.get_faq_stats()
+    rows = [
+        ['=== FAQ統計 ==='],
+        ['項目', '値'],
+        ['総FAQ数', faq_stats.get('total_faqs', 0)],
+        ['アクティブFAQ数', faq_stats.get('active_faqs', 0)],
+        ['総閲覧数', faq_stats.get('total_views', 0)],
+        ['FAQ平均閲覧数', f"{faq_stats.get('avg_views_per_faq', 0):.1f}"],
+        []
+    ]
+
+    # 人気FAQランキング
+    rows.append(['=== 人気FAQランキング ==='])
+    rows.append(['順位', 'タイトル', '閲覧数', 'カテゴリ'])
+    for i, faq in enumerate(FAQ.get_popular_faqs(limit=10), 1):
+        rows.append([i, faq.title, faq.view_count or 0, faq.category or '未分類'])
+    rows.append([])
+    return rows
+
+
+def _daily_section(start_date, data_types):
+    from app.models import DailyStats
+
+    daily_rows = DailyStats.get_range(start_date)
+    rows = []
+    for counter, title, label in (
+        ('conversations', '=== 日別会話統計 ===', '会話数'),
+        ('escalations', '=== 日別エスカレーション統計 ===', 'エスカレーション数'),
+    ):
+        if counter not in data_types:
+            continue
+        rows.append([title])
+        rows.append(['日付', label, '累計'])
+        cumulative = 0
+        for item in DailyStats.get_daily_counts(daily_rows, counter):
+            cumulative += item['count']
+            rows.append([item['date'], item['count'], cumulative])
+        rows.append([])
+    return rows
+
+
+def _run_in_app_context(app, builder, args):
+    # スレッドごとにアプリコンテキストを作成し、独立したDBセッションを使う
+    with app.app_context():
+        return builder(*args)
+
+
+def iter_analytics_rows(range_days, data_types, job=None):
+    """分析レポートのCSV行を順に生成"""
+    from app.models import User
+
+    start_date, end_date, _ = export_period(range_days)
+    app = current_app._get_current_object()
+
+    # 独立したセクションを並行して作成（出力順は固定）
+    sections = []
+    if 'users' in data_types:
+        sections.append((_user_stats_section, ()))
+    if 'staff' in data_types:
+        sections.append((_staff_stats_section, ()))
+    if 'faq' in data_types:
+        sections.append((_faq_stats_section, ()))
+    if 'conversations' in data_types or 'escalations' in data_types:
+        sections.append((_daily_section, (start_date, data_types)))
+
+    executor = _get_executor()
+    futures = [executor.submit(_run_in_app_context, app, builder, args) for builder, args in sections]
+
+    # ヘッダー
+    yield ['分析レポート', f'期間: {start_date.strftime("%Y-%m-%d")} - {end_date.strftime("%Y-%m-%d")}']
+    yield []  # 空行
+
+    for i, future in enumerate(futures, start=1):
+        try:
+            rows = future.result()
+        except Exception as e:
+            logger.error('Analytics export section error: %s', e)
+            rows = [['データ取得エラー', str(e)], []]
+        yield from rows
+        if job:
+            job.report(i, len(futures) + 1)
+
+    # 詳細データ（必要に応じて）
+    if 'users' in data_types:
+        yield ['=== 詳細ユーザーデータ ===']
+        yield ['ユーザーID', '表示名', 'タイプ', '質問数', '最終活動', '作成日']
+
+        try:
+            users = User.query.filter(User.created_at >= start_date)\
+                              .order_by(User.id.asc())\
+                              .yield_per(1000)
+            for user in users:
+                yield [
+                    user.identifier,
+                    user.display_name or '匿名',
+                    user.user_type,
+                    user.question_count or 0,
+                    user.last_activity.strftime('%Y-%m-%d %H:%M') if user.last_activity else '',
+                    user.created_at.strftime('%Y-%m-%d %H:%M') if user.created_at else ''
+                ]
+        except Exception as e:
+            yield ['データ取得エラー', str(e)]
@@ -0,0 +1,122 @@
+"""
+メッセージのアーカイブ
+- MESSAGE_ARCHIVE_DAYS より古いメッセージを message テーブルから message_archive_segment に移す
+- ユーザーごとに ID 順で MESSAGE_ARCHIVE_SEGMENT_SIZE 件ずつ圧縮し、未満のセグメントには次回追記する
+- セグメントはユーザー内で ID 範囲が重ならない（既存セグメントより小さいIDのメッセージは移さない）
+- エスカレーションから参照されているメッセージは移さない（管理画面の参照を壊さないため）
+- 日別集計（DailyStats）は移動前の件数のまま残る（DailyStats.rebuild もアーカイブ済みのメッセージを数える）
+- history_page でチャット履歴を新しい順にページ単位で取得（message テーブルとアーカイブをID順に統合）
+"""
+
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, select
+from sqlalchemy.orm import selectinload
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def _archivable(cutoff):
+    from app.models import Conversation, Message, Escalation
+
+    return db.session.query(Message).join(Conversation, Message.conversation_id == Conversation.id).filter(
+        Conversation.user_id.isnot(None),
+        Message.timestamp < cutoff,
+        ~Message.id.in_(select(Escalation.message_id))
+    )
+
+
+def archive_messages(days=None, segment_size=None, job=None):
+    """古いメッセージをアーカイブし、件数を返す"""
+    from app.models import Conversation, Message, MessageArchiveSegment
+
+    days = days if days is not None else current_app.config.get('MESSAGE_ARCHIVE_DAYS', 180)
+    segment_size = segment_size or current_app.config.get('MESSAGE_ARCHIVE_SEGMENT_SIZE', 500)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    user_ids = [row[0] for row in _archivable(cutoff).with_entities(Conversation.user_id).distinct().all()]
+    archived = segments = 0
+
+    for i, user_id in enumerate(user_ids, start=1):
+        while True:
+            # 追記先: 容量に余裕のある最新セグメント（なければ新規作成）
+            latest = MessageArchiveSegment.query.filter_by(user_id=user_id)\
+                .order_by(MessageArchiveSegment.last_message_id.desc()).first()
+            segment = latest if latest is not None and latest.message_count < segment_size else None
+            room = segment_size - (segment.message_count if segment else 0)
+
+            # セグメント同士のID範囲が重ならないよう、最新セグメントより後のメッセージだけを対象にする
+            query = _archivable(cutoff).filter(Conversation.user_id == user_id)
+            if latest is not None:
+                query = query.filter(Message.id > latest.last_message_id)
+            messages = query.options(
+                selectinload(Message.sender_user),
+                selectinload(Message.staff_member),
+                selectinload(Message.faq)
+            ).order_by(Message.id.asc()).limit(room).all()
+            if not messages:
+                break
+
+            if segment is None:
+                segment = MessageArchiveSegment(user_id=user_id)
+                db.session.add(segment)
+                segments += 1
+
+            ids = [message.id for message in messages]
+            segment.append(message.to_dict() for message in messages)
+            db.session.execute(delete(Message).where(Message.id.in_(ids)))
+            db.session.commit()
+            archived += len(ids)
+
+            if len(messages) < room:
+                break
+
+        if job:
+            job.report(i, len(user_ids))
+
+    logger.info('Archived %d messages into %d new segments for %d users (cutoff=%s)',
+                archived, segments, len(user_ids), cutoff.isoformat())
+    return {'archived_messages': archived, 'new_segments': segments, 'users': len(user_ids),
+            'cutoff': cutoff.isoformat()}
+
+
+def history_page(user_id, before_id=None, limit=50):
+    """before_id より前のメッセージを新しい方から limit 件（古い順の dict 一覧）と、さらに古いものがあるか
+
+    アーカイブはユーザー内でID範囲が重ならないため、新しいセグメントから順に必要な件数だけ展開する
+    message テーブルの分でページが埋まる場合は、ページ内にIDが入り込むセグメントだけを展開する
+    """
+    from app.models import Conversation, Message, MessageArchiveSegment
+
+    query = db.session.query(Message).join(Conversation, Message.conversation_id == Conversation.id)\
+        .filter(Conversation.user_id == user_id)
+    if before_id:
+        query = query.filter(Message.id < before_id)
+    hot = query.options(
+        selectinload(Message.sender_user),
+        selectinload(Message.staff_member),
+        selectinload(Message.faq)
+    ).order_by(Message.id.desc()).limit(limit + 1).all()
+    items = [message.to_dict() for message in hot]
+
+    # アーカイブ側も limit + 1 件集まるまで（データ本体は必要なセグメントだけ読み込む）
+    segments = db.session.query(MessageArchiveSegment.id).filter(MessageArchiveSegment.user_id == user_id)
+    if before_id:
+        segments = segments.filter(MessageArchiveSegment.first_message_id < before_id)
+    if len(hot) > limit:
+        # message テーブルだけでページが埋まる場合は、ページ内の最も古いIDより新しいメッセージを含むセグメントだけ読む
+        # （最新ページの表示では通常アーカイブを展開しない）
+        segments = segments.filter(MessageArchiveSegment.last_message_id > hot[limit - 1].id)
+    archived = 0
+    for (segment_id,) in segments.order_by(MessageArchiveSegment.last_message_id.desc()):
+        if archived > limit:
+            break
+        older = [item for item in db.session.get(MessageArchiveSegment, segment_id).messages()
+                 if not before_id or item['id'] < before_id]
+        items.extend(older)
+        archived += len(older)
+
+    items.sort(key=lambda item: item['id'], reverse=True)
+    return items[:limit][::-1], len(items) > limit
@@ -0,0 +1,391 @@
+"""
+バックアップ（NDJSON ストリーミング）
+- 1行目がヘッダー（{"format": "chatbot-backup", "version": 3, "sections": [...]}）、以降は
+  {"section": "<セクション名>", "data": {...}} を1行1件で並べる
+- セクションは users / faqs / conversations / archive_segments / escalations / messages の順（復元時に参照先が先に来る順）
+  - escalations を messages より前に置き、復元時はエスカレーション（件数が少ない）だけを保持して
+    メッセージの INSERT に合わせて書き込む（全メッセージのID対応表を持たないため）
+- 書き出しは yield_per で BACKUP_BATCH_SIZE 件ずつ読み、gzip 圧縮も逐次行う
+- 復元はストリームを1行ずつ読み、IDを振り直しながら BACKUP_BATCH_SIZE 件ずつ一括 INSERT する
+  - ユーザーは user_id / identifier、FAQ はタイトル・質問・回答、会話は session_id が復元前からあるものと一致すればスキップ
+  - スキップした会話のメッセージは復元しない（重複を避けるため）
+  - 職員（staff_member）はバックアップ対象外のため、メッセージの staff_id は空にする
+- 旧形式（{"users": [...]} の JSON）もそのまま復元できる
+- アーカイブ済みメッセージ（archive_segments）はセグメント1件を1行（展開したメッセージの一覧）で書き出す
+  - 復元先では message テーブルに戻す（アーカイブのメッセージIDは元のDBのもので、振り直したIDと並びが合わないため）
+    messages より先に復元するので、元のDBと同じく通常のメッセージより古いIDになる（エスカレーションから参照されて
+    移されなかった古いメッセージだけは後ろに並ぶ）。必要なら復元後に flask archive-messages で再度アーカイブする
+  - 送信者は sender_info のユーザーIDを振り直し、会話を復元しなかったメッセージはスキップする
+"""
+
+import gzip
+import io
+import itertools
+import json
+import logging
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import insert, select
+from app import db
+
+logger = logging.getLogger(__name__)
+
+BACKUP_FORMAT = 'chatbot-backup'
+BACKUP_VERSION = 3
+SECTIONS = ('users', 'faqs', 'conversations', 'archive_segments', 'escalations', 'messages')
+USER_EXCLUDED_COLUMNS = ('password_hash', 'login_attempts', 'is_locked')
+# 担当（リース）とクラスタは復元しない（クラスタは復元後に索引を作り直す）
+ESCALATION_EXCLUDED_COLUMNS = ('claimed_by_id', 'claimed_at', 'lease_expires_at', 'cluster_id', 'fingerprint')
+
+
+def _batch_size():
+    return current_app.config.get('BACKUP_BATCH_SIZE', 1000)
+
+
+def _section_query(section):
+    from app.models import User, FAQ, Conversation, Message, Escalation, MessageArchiveSegment
+
+    if section == 'users':
+        columns = [c for c in User.__table__.columns if c.name not in USER_EXCLUDED_COLUMNS]
+        return select(*columns).where(User.user_id.is_distinct_from('admin')).order_by(User.id)  # 管理者は除外
+    if section == 'escalations':
+        columns = [c for c in Escalation.__table__.columns if c.name not in ESCALATION_EXCLUDED_COLUMNS]
+        return select(*columns).order_by(Escalation.id)
+    model = {'faqs': FAQ, 'conversations': Conversation, 'messages': Message,
+             'archive_segments': MessageArchiveSegment}[section]
+    if section == 'archive_segments':
+        return select(model).order_by(model.id)
+    return select(model.__table__).order_by(model.__table__.c.id)
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_backup_records(sections=('users',), job=None):
+    """ヘッダーと各セクションの行（dict）を順に生成"""
+    sections = [section for section in SECTIONS if section in sections]
+    yield {'format': BACKUP_FORMAT, 'version': BACKUP_VERSION, 'backup_date': datetime.utcnow().isoformat(),
+           'backup_type': 'full' if len(sections) > 1 else 'users', 'sections': sections}
+
+    for i, section in enumerate(sections):
+        if section == 'archive_segments':
+            # セグメントは1件に最大 MESSAGE_ARCHIVE_SEGMENT_SIZE 件のメッセージを含むため、少しずつ読んで1件ずつ展開する
+            result = db.session.execute(_section_query(section).execution_options(yield_per=10)).scalars()
+            for segment in result:
+                yield {'section': section, 'data': {'user_id': segment.user_id, 'messages': segment.messages()}}
+        else:
+            result = db.session.execute(_section_query(section).execution_options(yield_per=_batch_size()))
+            for row in result.mappings():
+                yield {'section': section, 'data': {key: _jsonable(value) for key, value in row.items()}}
+        if job:
+            job.report(i + 1, len(sections), message=f'{section} を書き出しました')
+
+
+def iter_backup(sections=('users',), job=None):
+    """バックアップを NDJSON のバイト列チャンクとして生成"""
+    batch_size = _batch_size()
+    lines = []
+    for record in iter_backup_records(sections, job=job):
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= batch_size:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def backup_filename(sections, compress=False):
+    kind = 'full_backup' if len(sections) > 1 else 'user_backup'
+    return f'{kind}_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.ndjson' + ('.gz' if compress else '')
+
+
+def write_backup(sections=('users',), compress=True, job=None):
+    """バックアップをジョブの結果ファイルに書き出し"""
+    from app.utils.streaming import iter_gzip
+
+    filename = backup_filename(sections, compress)
+    chunks = iter_backup(sections, job=job)
+    if compress:
+        chunks = iter_gzip(chunks)
+    with job.open_file(filename, 'application/gzip' if compress else 'application/x-ndjson') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return {'filename': filename}
+
+
+def read_backup(stream):
+    """バックアップのストリームを (section, data) として1件ずつ読む（gzip・旧形式JSONにも対応）"""
+    head = stream.read(2)
+    stream.seek(0)
+    if head == b'\x1f\x8b':
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+
+    first = text.readline()
+    try:
+        header = json.loads(first)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('format') != BACKUP_FORMAT:
+        # 旧形式（整形された1つのJSON）。ユーザーのみでサイズも小さいため一括で読む
+        backup_data = json.loads(first + text.read())
+        if 'users' not in backup_data:
+            raise ValueError('無効なバックアップファイルです')
+        for user_data in backup_data['users']:
+            yield 'users', user_data
+        return
+
+    for line in text:
+        if line.strip():
+            record = json.loads(line)
+            yield record['section'], record['data']
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _rows(items, model, datetime_columns, **overrides):
+    """バックアップの dict をテーブルの列だけに絞って INSERT 用の行にする"""
+    columns = {c.name for c in model.__table__.columns} - {'id'}
+    row = {key: value for key, value in items.items() if key in columns}
+    for name in datetime_columns:
+        if name in row:
+            row[name] = _parse_datetime(row[name])
+    row.update(overrides)
+    return row
+
+
+def _insert_returning_ids(model, rows):
+    """一括 INSERT して新しいIDを行の順に返す"""
+    if not rows:
+        return []
+    result = db.session.execute(
+        insert(model.__table__).returning(model.__table__.c.id, sort_by_parameter_order=True), rows
+    )
+    return [row[0] for row in result]
+
+
+class _Restorer:
+    """セクションごとの復元（旧ID -> 新IDの対応を保持）"""
+
+    def __init__(self, default_password, job=None):
+        self.default_password = default_password
+        self.job = job
+        self.batch_size = _batch_size()
+        self.user_ids = {}
+        self.faq_ids = {}
+        self.conversation_ids = {}
+        self.pending_escalations = defaultdict(list)  # 旧メッセージID -> エスカレーション
+        self.counts = defaultdict(lambda: {'restored': 0, 'skipped': 0})
+        self.daily = defaultdict(Counter)
+
+    def restore(self, records):
+        for section, items in itertools.groupby(records, key=lambda record: record[0]):
+            items = (data for _, data in items)
+            handler = getattr(self, f'_restore_{section}', None)
+            if handler is None:
+                logger.warning('Unknown backup section %s skipped', section)
+                for _ in items:
+                    pass
+                continue
+            handler(items)
+            if self.job:
+                self.job.update(message=f'{section} を復元しました')
+
+        if self.pending_escalations:  # メッセージが復元されなかったもの
+            self.counts['escalations']['skipped'] += sum(len(items) for items in self.pending_escalations.values())
+        self._apply_daily_stats()
+        if 'escalations' in self.counts and self.counts['escalations']['restored']:
+            from app.utils.escalation_clusters import index_escalations
+            index_escalations()
+        return {name: dict(counts) for name, counts in self.counts.items()}
+
+    def _batches(self, items):
+        while True:
+            batch = list(itertools.islice(items, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _restore_users(self, items):
+        from app.models import User
+        from app.utils.user_restore import restore_users
+
+        identifiers = {}
+
+        def remember(items):
+            for data in items:
+                if data.get('id') is not None:
+                    identifiers[data.get('identifier') or data.get('user_id')] = data['id']
+                yield data
+
+        result = restore_users(remember(items), self.default_password, batch_size=self.batch_size, job=self.job)
+        self.counts['users'] = {'restored': result['restored_count'], 'skipped': result['skipped_count']}
+        if identifiers:
+            for user_id, identifier in db.session.query(User.id, User.identifier):
+                if identifier in identifiers:
+                    self.user_ids[identifiers[identifier]] = user_id
+
+    def _restore_faqs(self, items):
+        from app.models import FAQ
+
+        # 復元前からあるFAQとタイトル・質問・回答が一致するものだけをスキップする
+        # （バックアップ内の FAQ どうしは同じ質問でも別のFAQとしてすべて復元する）
+        existing = {(title, question, answer): faq_id for faq_id, title, question, answer
+                    in db.session.query(FAQ.id, FAQ.title, FAQ.question, FAQ.answer)}
+        for batch in self._batches(items):
+            new = []
+            for data in batch:
+                faq_id = existing.get((data.get('title'), data.get('question'), data.get('answer')))
+                if faq_id is None:
+                    new.append(data)
+                else:
+                    self.faq_ids[data['id']] = faq_id
+            rows = [_rows(data, FAQ, ('created_at', 'updated_at')) for data in new]
+            for data, new_id in zip(new, _insert_returning_ids(FAQ, rows)):
+                self.faq_ids[data['id']] = new_id
+            db.session.commit()
+            self.counts['faqs']['restored'] += len(new)
+            self.counts['faqs']['skipped'] += len(batch) - len(new)
+
+    def _restore_conversations(self, items):
+        from app.models import Conversation
+
+        existing = {session_id for (session_id,) in db.session.query(Conversation.session_id)}
+        for batch in self._batches(items):
+            new = [data for data in batch if data['session_id'] not in existing]
+            self.counts['conversations']['skipped'] += len(batch) - len(new)
+            rows = []
+            for data in new:
+                existing.add(data['session_id'])
+                row = _rows(data, Conversation, ('started_at', 'last_activity'),
+                            user_id=self.user_ids.get(data.get('user_id')))
+                rows.append(row)
+                self.daily[(row.get('started_at') or datetime.utcnow()).date()]['conversations'] += 1
+            for data, new_id in zip(new, _insert_returning_ids(Conversation, rows)):
+                self.conversation_ids[data['id']] = new_id
+            db.session.commit()
+            self.counts['conversations']['restored'] += len(new)
+
+    def _count_message(self, row):
+        counters = self.daily[(row.get('timestamp') or datetime.utcnow()).date()]
+        counters['messages'] += 1
+        if row.get('message_type') == 'bot' and row.get('faq_id'):
+            counters['faq_hits'] += 1
+        elif row.get('message_type') == 'staff':
+            counters['staff_responses'] += 1
+
+    def _archived_message_row(self, data):
+        """アーカイブのメッセージ（Message.to_dict()）を message テーブルの行に戻す"""
+        from app.models import Message
+
+        info = data.get('sender_info') or {}
+        sender_name = sender_type = None
+        if 'user_id' in info:  # 登録ユーザー（set_sender_from_user と同じ値）
+            sender_name = info.get('display_name') or info.get('identifier')
+            sender_type = 'anonymous' if info.get('is_anonymous') else 'registered'
+        elif info.get('display_name') != f"匿名ユーザー#{data.get('id')}":  # 送信者名がなければ表示用の既定名
+            sender_name, sender_type = info.get('display_name'), info.get('sender_type')
+        return _rows(data, Message, ('timestamp',),
+                     conversation_id=self.conversation_ids[data['conversation_id']],
+                     sender_user_id=self.user_ids.get(info.get('user_id')),
+                     sender_name=sender_name,
+                     sender_type=sender_type,
+                     faq_id=self.faq_ids.get(data.get('faq_id')),
+                     staff_id=None)
+
+    def _restore_archive_segments(self, items):
+        from app.models import Message
+
+        counts = self.counts['archived_messages']
+        rows = []
+
+        def flush():
+            if rows:
+                db.session.execute(insert(Message.__table__), rows)
+                db.session.commit()
+                counts['restored'] += len(rows)
+                rows.clear()
+
+        for segment in items:
+            for data in segment.get('messages') or ():
+                if data.get('conversation_id') not in self.conversation_ids:
+                    counts['skipped'] += 1
+                    continue
+                rows.append(self._archived_message_row(data))
+                self._count_message(rows[-1])
+                if len(rows) >= self.batch_size:
+                    flush()
+        flush()
+
+    def _restore_escalations(self, items):
+        # メッセージの復元時にまとめて書き込む
+        for data in items:
+            self.pending_escalations[data['message_id']].append(data)
+
+    def _restore_messages(self, items):
+        from app.models import Message, Escalation
+
+        for batch in self._batches(items):
+            new = [data for data in batch if data['conversation_id'] in self.conversation_ids]
+            self.counts['messages']['skipped'] += len(batch) - len(new)
+            rows = []
+            for data in new:
+                row = _rows(data, Message, ('timestamp',),
+                            conversation_id=self.conversation_ids[data['conversation_id']],
+                            sender_user_id=self.user_ids.get(data.get('sender_user_id')),
+                            faq_id=self.faq_ids.get(data.get('faq_id')),
+                            staff_id=None)
+                rows.append(row)
+                self._count_message(row)
+
+            escalations = []
+            for data, new_id in zip(new, _insert_returning_ids(Message, rows)):
+                for escalation in self.pending_escalations.pop(data['id'], ()):
+                    row = _rows(escalation, Escalation, ('created_at', 'answered_at'), message_id=new_id)
+                    escalations.append(row)
+                    self.daily[(row.get('created_at') or datetime.utcnow()).date()]['escalations'] += 1
+            if escalations:
+                db.session.execute(insert(Escalation.__table__), escalations)
+            db.session.commit()
+            self.counts['messages']['restored'] += len(new)
+            self.counts['escalations']['restored'] += len(escalations)
+            if self.job:
+                self.job.update(message=f"メッセージ {self.counts['messages']['restored']}件復元")
+
+    def _apply_daily_stats(self):
+        # 一括 INSERT は日別集計のセッションイベントを通らないため、まとめて加算する
+        from app.models import DailyStats
+        from app.utils.cache import invalidate_cache
+
+        if not self.daily:
+            return
+        connection = db.session.connection()
+        for day, counters in self.daily.items():
+            DailyStats.increment(connection, day, **counters)
+        db.session.commit()
+        invalidate_cache()
+
+
+def restore_backup_stream(stream, default_password, job=None):
+    """バックアップのストリームから復元し、セクションごとの件数を返す"""
+    counts = _Restorer(default_password, job=job).restore(read_backup(stream))
+    users = counts.get('users', {'restored': 0, 'skipped': 0})
+    logger.info('Restored backup: %s', counts)
+    return {'restored_count': users['restored'], 'skipped_count': users['skipped'], 'sections': counts}
+
+
+def restore_backup_upload(path, default_password, job=None):
+    """アップロードされたバックアップ（一時ファイル）から復元し、一時ファイルを削除"""
+    import os
+
+    try:
+        with open(path, 'rb') as f:
+            return restore_backup_stream(f, default_password, job=job)
+    finally:
+        os.remove(path)
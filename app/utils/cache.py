@@ -7,52 +7,112 @@
 
 import time
 import hashlib
+import threading
 import json
 from functools import wraps
 from datetime import datetime, timedelta
 from flask import current_app
 
 class SimpleCache:
-    """シンプルなメモリキャッシュ"""
+    """シンプルなメモリキャッシュ
+
+    分析エクスポートのスレッドプールなど複数のスレッドから使われるため、
+    辞書とヒット・ミスの集計はロックの内側で更新する
+    """
     
     def __init__(self):
         self._cache = {}
         self._timestamps = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # 期限切れ・無効化で削除された件数
+        self._prefix_counts = {}  # キーの接頭辞 -> [ヒット数, ミス数]
+        self._lock = threading.Lock()
     
     def get(self, key):
         """キャッシュから値を取得"""
-        if key in self._cache:
-            timestamp = self._timestamps.get(key, 0)
-            if timestamp > time.time():  # まだ有効
-                return self._cache[key]
-            else:  # 期限切れ
-                self.delete(key)
-        return None
+        with self._lock:
+            counts = self._prefix_counts.setdefault(key.split(':', 1)[0], [0, 0])
+            if key in self._cache:
+                timestamp = self._timestamps.get(key, 0)
+                if timestamp > time.time():  # まだ有効
+                    self.hits += 1
+                    counts[0] += 1
+                    return self._cache[key]
+                else:  # 期限切れ
+                    self._delete(key)
+            self.misses += 1
+            counts[1] += 1
+            return None
+    
+    def peek(self, key):
+        """有効な値を統計（ヒット・ミス）を更新せずに取得"""
+        with self._lock:
+            if self._timestamps.get(key, 0) > time.time():
+                return self._cache.get(key)
+            return None
     
     def set(self, key, value, timeout=300):
         """キャッシュに値を設定（デフォルト5分）"""
-        self._cache[key] = value
-        self._timestamps[key] = time.time() + timeout
+        with self._lock:
+            self._cache[key] = value
+            self._timestamps[key] = time.time() + timeout
+    
+    def _delete(self, key):
+        if self._cache.pop(key, None) is not None:
+            self.evictions += 1
+        self._timestamps.pop(key, None)
     
     def delete(self, key):
         """キャッシュから削除"""
-        self._cache.pop(key, None)
-        self._timestamps.pop(key, None)
+        with self._lock:
+            self._delete(key)
+    
+    def delete_matching(self, pattern):
+        """pattern を含むキーをすべて削除"""
+        with self._lock:
+            for key in [key for key in self._cache if pattern in key]:
+                self._delete(key)
     
     def clear(self):
         """全キャッシュクリア"""
-        self._cache.clear()
-        self._timestamps.clear()
+        with self._lock:
+            self.evictions += len(self._cache)
+            self._cache.clear()
+            self._timestamps.clear()
     
     def stats(self):
         """キャッシュ統計"""
         current_time = time.time()
-        valid_keys = [k for k, t in self._timestamps.items() if t > current_time]
-        return {
-            'total_keys': len(self._cache),
-            'valid_keys': len(valid_keys),
-            'expired_keys': len(self._cache) - len(valid_keys)
-        }
+        with self._lock:
+            valid_keys = [k for k, t in self._timestamps.items() if t > current_time]
+            return {
+                'total_keys': len(self._cache),
+                'valid_keys': len(valid_keys),
+                'expired_keys': len(self._cache) - len(valid_keys),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+    
+    def prefix_stats(self):
+        """キーの接頭辞（faq / stats / user など）別の件数とヒット率"""
+        current_time = time.time()
+        with self._lock:
+            timestamps = list(self._timestamps.items())
+            prefix_counts = [(prefix, tuple(counts)) for prefix, counts in self._prefix_counts.items()]
+        result = {}
+        for key, timestamp in timestamps:
+            item = result.setdefault(key.split(':', 1)[0], {'keys': 0, 'valid_keys': 0})
+            item['keys'] += 1
+            if timestamp > current_time:
+                item['valid_keys'] += 1
+        for prefix, (hits, misses) in prefix_counts:
+            item = result.setdefault(prefix, {'keys': 0, 'valid_keys': 0})
+            item['hits'] = hits
+            item['misses'] = misses
+            item['hit_rate'] = round(hits / (hits + misses), 3) if hits + misses else None
+        return result
 
 # グローバルキャッシュインスタンス
 _cache = SimpleCache()
@@ -101,25 +161,75 @@ def cache_user_data(timeout=180):
     """ユーザーデータ専用キャッシュ（3分）"""
     return cached(timeout=timeout, key_prefix='user')
 
+def get_cached(key):
+    """キーを指定してキャッシュから取得（なければ None）"""
+    return _cache.get(key)
+
+def set_cached(key, value, timeout=300):
+    """キーを指定してキャッシュに保存"""
+    _cache.set(key, value, timeout)
+
+def peek_cached(key):
+    """ヒット率に数えずに取得（診断表示用）"""
+    return _cache.peek(key)
+
 def invalidate_cache(pattern=None):
     """キャッシュ無効化"""
     if pattern:
         # パターンマッチングでキャッシュクリア
-        keys_to_delete = []
-        for key in _cache._cache.keys():
-            if pattern in key:
-                keys_to_delete.append(key)
-        
-        for key in keys_to_delete:
-            _cache.delete(key)
+        _cache.delete_matching(pattern)
     else:
         # 全キャッシュクリア
         _cache.clear()
 
+# モデル変更時のキャッシュ無効化ルール: (モデル, キーパターン, 監視カラム)
+_invalidation_rules = []
+
+def invalidate_on_change(model, pattern, columns=None):
+    """モデルの追加・削除・更新がコミットされたらキャッシュを無効化
+    
+    columns を指定した場合、更新はそのカラムが変わったときのみ対象にする
+    """
+    if not _invalidation_rules:
+        _register_session_events()
+    _invalidation_rules.append((model, pattern, columns))
+
+def _register_session_events():
+    from sqlalchemy import event, inspect
+    from sqlalchemy.orm import Session
+    
+    def changed(obj, columns):
+        if columns is None:
+            return True
+        attrs = inspect(obj).attrs
+        return any(attrs[col].history.has_changes() for col in columns)
+    
+    @event.listens_for(Session, 'after_flush')
+    def collect_invalidations(session, flush_context):
+        patterns = session.info.setdefault('cache_invalidations', set())
+        for model, pattern, columns in _invalidation_rules:
+            if any(isinstance(obj, model) for obj in session.new) or \
+               any(isinstance(obj, model) for obj in session.deleted) or \
+               any(isinstance(obj, model) and changed(obj, columns) for obj in session.dirty):
+                patterns.add(pattern)
+    
+    @event.listens_for(Session, 'after_commit')
+    def apply_invalidations(session):
+        for pattern in session.info.pop('cache_invalidations', ()):
+            invalidate_cache(pattern)
+    
+    @event.listens_for(Session, 'after_rollback')
+    def discard_invalidations(session):
+        session.info.pop('cache_invalidations', None)
+
 def get_cache_stats():
     """キャッシュ統計取得"""
     return _cache.stats()
 
+def get_cache_prefix_stats():
+    """接頭辞別のキャッシュ統計取得"""
+    return _cache.prefix_stats()
+
 # Flask レスポンスキャッシュヘルパー
 def add_cache_headers(response, max_age=300):
     """レスポンスにキャッシュヘッダーを追加"""
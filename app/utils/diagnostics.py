@@ -0,0 +1,181 @@
+"""
+実行時診断
+- キャッシュ（全体・接頭辞別）、検索インデックス、DBコネクションプール、ジョブキュー、
+  遅いエンドポイント、プロセスのRSS推移をまとめて取得
+- 検索インデックスなど後から追加される仕組みは register_section で項目を登録する
+- RSS はリクエスト処理の合間に一定間隔（DIAGNOSTICS_RSS_INTERVAL 秒）で記録
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+RSS_HISTORY_SIZE = 240
+
+_sections = {}  # 項目名 -> 値を返す関数
+_events_registered = False
+
+
+def register_section(name, provider):
+    """診断項目を追加（provider は JSON 化できる dict を返す関数）"""
+    _sections[name] = provider
+
+
+class PoolStats:
+    """コネクションの貸し出し回数・使用中の数・保持時間"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.total_hold_time = 0.0
+        self.max_hold_time = 0.0
+        self.connects = 0
+
+    def on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checkout_at'] = time.perf_counter()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        started = connection_record.info.pop('checkout_at', None)
+        if started is None:
+            return
+        held = time.perf_counter() - started
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+            self.total_hold_time += held
+            self.max_hold_time = max(self.max_hold_time, held)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'avg_hold_ms': round(self.total_hold_time / self.checkouts * 1000, 2) if self.checkouts else 0,
+                'max_hold_ms': round(self.max_hold_time * 1000, 2)
+            }
+
+
+pool_stats = PoolStats()
+
+
+def current_rss():
+    """プロセスの常駐メモリ（バイト）。取得できない場合は None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # Linux は KB 単位（ピーク値）
+    except (ImportError, OSError):
+        return None
+
+
+class RssHistory:
+    """RSS の推移（一定間隔で記録）"""
+
+    def __init__(self, maxlen=RSS_HISTORY_SIZE):
+        self.interval = 30
+        self._samples = deque(maxlen=maxlen)
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def maybe_sample(self):
+        now = time.time()
+        if now - self._last < self.interval:
+            return
+        with self._lock:
+            if now - self._last < self.interval:
+                return
+            self._last = now
+        rss = current_rss()
+        if rss is not None:
+            self._samples.append((now, rss))
+
+    def samples(self):
+        return [{'time': t, 'rss_mb': round(rss / 1024 / 1024, 1)} for t, rss in list(self._samples)]
+
+
+rss_history = RssHistory()
+
+
+def _pool_section():
+    from app import db
+
+    pool = db.engine.pool
+    data = {'class': type(pool).__name__, 'status': pool.status()}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            data[name] = method()
+    data.update(pool_stats.snapshot())
+    return data
+
+
+def collect(endpoint_limit=10):
+    """診断情報を取得（管理画面の JSON エンドポイントから呼ばれる）"""
+    from app.utils.cache import get_cache_stats, get_cache_prefix_stats
+    from app.utils.instrumentation import endpoint_stats
+    from app.utils.jobs import jobs
+
+    rss_history.maybe_sample()
+    rss = current_rss()
+
+    data = {
+        'time': time.time(),
+        'pid': os.getpid(),
+        'cache': dict(get_cache_stats(), prefixes=get_cache_prefix_stats()),
+        'db_pool': _pool_section(),
+        'jobs': jobs.queue_depth(),
+        'slow_endpoints': [
+            {
+                'endpoint': item['endpoint'],
+                'count': item['count'],
+                'avg_ms': round(item['avg_time'] * 1000, 1),
+                'max_ms': round(item['max_time'] * 1000, 1),
+                'avg_queries': round(item['avg_queries'], 1),
+                'n_plus_one': item['n_plus_one']
+            }
+            for item in endpoint_stats.top(endpoint_limit)
+        ],
+        'memory': {
+            'rss_mb': round(rss / 1024 / 1024, 1) if rss is not None else None,
+            'history': rss_history.samples()
+        }
+    }
+
+    for name, provider in _sections.items():
+        try:
+            data[name] = provider()
+        except Exception as e:
+            data[name] = {'error': str(e)}
+    return data
+
+
+def init_diagnostics(app):
+    """コネクションプールの計測と RSS の定期記録を登録"""
+    global _events_registered
+    rss_history.interval = app.config.get('DIAGNOSTICS_RSS_INTERVAL', 30)
+    if not _events_registered:
+        event.listen(Pool, 'connect', pool_stats.on_connect)
+        event.listen(Pool, 'checkout', pool_stats.on_checkout)
+        event.listen(Pool, 'checkin', pool_stats.on_checkin)
+        _events_registered = True
+    app.before_request(rss_history.maybe_sample)
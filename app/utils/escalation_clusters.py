@@ -0,0 +1,102 @@
+"""
+類似エスカレーションのクラスタリング
+- send_message でエスカレーションを作成するたびに index_escalation で MinHash 署名と LSH 帯キーを保存し、
+  帯キーが一致する未解決のエスカレーションのうち最も似ているもの（ESCALATION_CLUSTER_THRESHOLD 以上）のクラスタに入れる
+- 候補は帯キーの索引（escalation_band）から引くため、既存のエスカレーションとの総当たり比較はしない
+- cluster_id はクラスタの最初の質問のID（最初の質問自身は NULL）。cluster_key() で「自分のID」に読み替えて集計する
+- 署名のないもの（マイグレーション前・バックアップから復元したもの）は index_escalations でまとめて索引に追加
+"""
+
+import logging
+from flask import current_app
+from sqlalchemy import insert, select
+from sqlalchemy.orm import joinedload
+from app import db
+from app.utils.similarity import band_keys, pack, signature, similarity, unpack
+
+logger = logging.getLogger(__name__)
+
+CANDIDATE_LIMIT = 200  # 帯キーが一致した候補のうち比較する件数（新しいものから）
+
+
+def _scored_candidates(sig, status, exclude_id=None):
+    """帯キーが一致する status のエスカレーションを (類似度, 行) で返す"""
+    from app.models import Escalation, EscalationBand
+
+    query = select(Escalation.id, Escalation.cluster_id, Escalation.fingerprint, Escalation.message_id,
+                   Escalation.staff_response).where(
+        Escalation.id.in_(select(EscalationBand.escalation_id).where(EscalationBand.band_key.in_(band_keys(sig)))),
+        Escalation.status == status
+    )
+    if exclude_id is not None:
+        query = query.where(Escalation.id != exclude_id)
+    return [(similarity(sig, unpack(row.fingerprint)), row)
+            for row in db.session.execute(query.order_by(Escalation.id.desc()).limit(CANDIDATE_LIMIT))
+            if row.fingerprint]
+
+
+def _nearest_cluster(sig, threshold, exclude_id=None):
+    """署名が最も近い未解決エスカレーションのクラスタID（threshold 未満なら None）"""
+    best_score, best = max(_scored_candidates(sig, 'pending', exclude_id), default=(0.0, None),
+                           key=lambda item: item[0])
+    if best is None or best_score < threshold:
+        return None
+    return best.cluster_id or best.id
+
+
+def similar_answered(text, limit=3, exclude_id=None):
+    """回答済みのエスカレーションのうち質問が似ているもの（類似度順の dict 一覧）"""
+    from app.models import Message
+
+    sig = signature(text)
+    if sig is None:
+        return []
+    scored = sorted(_scored_candidates(sig, 'answered', exclude_id), key=lambda item: -item[0])[:limit]
+    questions = dict(db.session.execute(
+        select(Message.id, Message.content).where(Message.id.in_([row.message_id for _, row in scored]))
+    ).all())
+    return [{'escalation_id': row.id, 'question': questions.get(row.message_id), 'staff_response': row.staff_response,
+             'score': round(score, 3)} for score, row in scored]
+
+
+def index_escalation(escalation, text, threshold=None):
+    """エスカレーションの署名と帯キーを保存し、類似の質問があればそのクラスタに入れる（コミットは呼び出し側）"""
+    from app.models import EscalationBand
+
+    threshold = threshold if threshold is not None else current_app.config.get('ESCALATION_CLUSTER_THRESHOLD', 0.6)
+    sig = signature(text)
+    if sig is None:  # 比較できる文字がない（添付ファイルのみなど）
+        escalation.fingerprint = b''
+        return None
+
+    escalation.fingerprint = pack(sig)
+    escalation.cluster_id = _nearest_cluster(sig, threshold, exclude_id=escalation.id)
+    if escalation.id is None:
+        db.session.add(escalation)
+        db.session.flush()
+    db.session.execute(insert(EscalationBand),
+                       [{'band_key': key, 'escalation_id': escalation.id} for key in band_keys(sig)])
+    return escalation.cluster_id
+
+
+def index_escalations(batch_size=None, job=None):
+    """署名のないエスカレーションを古い順に索引に追加し、件数を返す"""
+    from app.models import Escalation
+
+    batch_size = batch_size or current_app.config.get('ESCALATION_INDEX_BATCH_SIZE', 500)
+    total = db.session.query(Escalation.id).filter(Escalation.fingerprint.is_(None)).count()
+    indexed = 0
+    while True:
+        escalations = Escalation.query.filter(Escalation.fingerprint.is_(None))\
+            .options(joinedload(Escalation.message)).order_by(Escalation.id).limit(batch_size).all()
+        if not escalations:
+            break
+        for escalation in escalations:
+            index_escalation(escalation, escalation.message.content if escalation.message else '')
+        db.session.commit()
+        indexed += len(escalations)
+        if job:
+            job.report(indexed, total)
+
+    logger.info('Indexed %d escalations for clustering', indexed)
+    return indexed
@@ -0,0 +1,174 @@
+"""
+エスカレーションの作業キュー
+- claim_escalations で未解決の古いものから N 件を期限付き（ESCALATION_LEASE_MINUTES）で担当する
+  対象の選択と担当者の書き込みは1回の UPDATE ... WHERE status='pending' で行うため、同時に取得しても重複しない
+- 担当中のものはリース期限まで他の職員が回答・クローズできない（期限切れは再び取得可能）
+- 回答・クローズは条件付き UPDATE で未解決かどうかを確認し、二重回答を防ぐ
+  respond_escalations / close_escalations は複数件を1トランザクションで処理する（同じ回答をまとめて送る場合も同じ）
+- pending_page で未解決一覧を類似質問のクラスタ単位でページ分割（メッセージ・会話・利用者を一括読み込み）
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import joinedload
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def _with_context(query):
+    """一覧・担当結果の表示に使うメッセージ・会話・利用者をまとめて読み込む"""
+    from app.models import Escalation, Message, Conversation
+
+    return query.options(
+        joinedload(Escalation.message).joinedload(Message.conversation).joinedload(Conversation.user),
+        joinedload(Escalation.claimed_by)
+    )
+
+
+def pending_page(page=1, per_page=None):
+    """未解決のエスカレーションを類似質問のクラスタ単位でページ分割（最初の質問が古い順）
+
+    Pagination の items は (クラスタID, クラスタ内の未解決エスカレーション一覧（古い順）) のリスト
+    """
+    from app.models import Escalation
+
+    per_page = per_page or current_app.config.get('ESCALATION_PAGE_SIZE', 20)
+    cluster_key = Escalation.cluster_key()
+    pagination = db.paginate(
+        select(cluster_key).where(Escalation.status == 'pending').group_by(cluster_key)
+        .order_by(func.min(Escalation.created_at), cluster_key),
+        page=page, per_page=per_page, error_out=False
+    )
+
+    members = defaultdict(list)
+    if pagination.items:
+        query = _with_context(Escalation.query.filter(Escalation.status == 'pending',
+                                                      cluster_key.in_(pagination.items)))
+        for escalation in query.order_by(Escalation.created_at.asc(), Escalation.id.asc()):
+            members[escalation.cluster_id or escalation.id].append(escalation)
+    pagination.items = [(cluster_id, members[cluster_id]) for cluster_id in pagination.items]
+    return pagination
+
+
+def claim_escalations(user_id, limit=None, lease_minutes=None):
+    """未解決のエスカレーションを最大 limit 件担当し、(担当したエスカレーション一覧, リース期限) を返す
+
+    自分が担当中のものも対象に含め、リースを延長する
+    """
+    from app.models import Escalation
+
+    limit = min(limit or current_app.config.get('ESCALATION_CLAIM_SIZE', 5),
+                current_app.config.get('ESCALATION_CLAIM_MAX', 50))
+    lease_minutes = lease_minutes or current_app.config.get('ESCALATION_LEASE_MINUTES', 15)
+    now = datetime.utcnow()
+    expires_at = now + timedelta(minutes=lease_minutes)
+
+    available = (Escalation.status == 'pending', Escalation.available_to(user_id, now))
+    # 自分が担当中のものを優先し、残りは古い順
+    candidates = select(Escalation.id).where(*available)\
+        .order_by(case((Escalation.claimed_by_id == user_id, 0), else_=1),
+                  Escalation.created_at.asc(), Escalation.id.asc()).limit(limit)
+    # 外側にも同じ条件を付け、選択から更新までの間に他の職員が担当したものは更新しない
+    claimed_ids = db.session.execute(
+        update(Escalation).where(Escalation.id.in_(candidates), *available)
+        .values(claimed_by_id=user_id, claimed_at=now, lease_expires_at=expires_at)
+        .returning(Escalation.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+
+    if not claimed_ids:
+        return [], expires_at
+    escalations = _with_context(Escalation.query.filter(Escalation.id.in_(claimed_ids)))\
+        .order_by(Escalation.created_at.asc(), Escalation.id.asc()).populate_existing().all()
+    logger.info('User %s claimed %d escalations until %s', user_id, len(escalations), expires_at.isoformat())
+    return escalations, expires_at
+
+
+def release_escalations(user_id, escalation_ids=None):
+    """担当中のエスカレーションを手放し、件数を返す（escalation_ids を省略すると全件）"""
+    from app.models import Escalation
+
+    statement = update(Escalation).where(Escalation.claimed_by_id == user_id, Escalation.status == 'pending')
+    if escalation_ids is not None:
+        statement = statement.where(Escalation.id.in_(escalation_ids))
+    released = db.session.execute(
+        statement.values(claimed_by_id=None, claimed_at=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return released
+
+
+def _settle(escalation_ids, user_id, status, now, returning, **values):
+    """未解決で user_id が担当できるものだけを status にし、(RETURNING の行, 対応済み・担当中のID, 存在しないID) を返す"""
+    from app.models import Escalation
+
+    rows = db.session.execute(
+        update(Escalation)
+        .where(Escalation.id.in_(escalation_ids), Escalation.status == 'pending',
+               Escalation.available_to(user_id, now))
+        .values(status=status, answered_at=now, lease_expires_at=None, **values)
+        .returning(*returning)
+        .execution_options(synchronize_session=False)
+    ).all()
+    settled = {row.id for row in rows}
+    existing = set(db.session.execute(select(Escalation.id).where(Escalation.id.in_(escalation_ids))).scalars())
+    return rows, sorted(existing - settled), sorted(set(escalation_ids) - existing)
+
+
+def respond_escalations(responses, user_id, staff_name=None, faq_id=None):
+    """複数のエスカレーションに1トランザクションで回答する（responses は {エスカレーションID: 回答}）
+
+    エスカレーションの更新は1回の UPDATE、職員回答メッセージは1回の flush でまとめて書き込み、
+    回答者に職員プロフィールがあれば回答数・平均回答時間も1回だけ更新する
+    faq_id を指定すると、回答メッセージを既存のFAQに紐付ける
+    """
+    from app.models import Escalation, Message, StaffMember
+
+    now = datetime.utcnow()
+    staff = StaffMember.query.filter_by(user_id=user_id, is_active=True).first() if user_id else None
+    rows, conflict_ids, missing_ids = _settle(
+        list(responses), user_id, 'answered', now,
+        (Escalation.id, Escalation.message_id, Escalation.created_at),
+        staff_response=case(responses, value=Escalation.id),
+        staff_name=staff_name or (staff.name if staff else None)
+    )
+
+    conversation_ids = dict(db.session.execute(
+        select(Message.id, Message.conversation_id).where(Message.id.in_([row.message_id for row in rows]))
+    ).all())
+    response_times = []
+    for row in rows:
+        response_time = (now - row.created_at).total_seconds() / 60 if row.created_at else None
+        response_times.append(response_time)
+        db.session.add(Message(
+            conversation_id=conversation_ids[row.message_id],
+            message_type='staff',
+            content=responses[row.id],
+            faq_id=faq_id,
+            timestamp=now,
+            staff_id=staff.id if staff else None,
+            response_time_minutes=response_time if staff else None
+        ))
+    if staff and rows:
+        staff.record_responses(response_times)
+    db.session.commit()
+
+    answered_ids = sorted(row.id for row in rows)
+    logger.info('User %s answered %d escalations (%d conflicts, %d missing)',
+                user_id, len(answered_ids), len(conflict_ids), len(missing_ids))
+    return {'answered_ids': answered_ids, 'conflict_ids': conflict_ids, 'missing_ids': missing_ids}
+
+
+def close_escalations(escalation_ids, user_id):
+    """複数のエスカレーションを1回の UPDATE でクローズする"""
+    from app.models import Escalation
+
+    rows, conflict_ids, missing_ids = _settle(escalation_ids, user_id, 'closed', datetime.utcnow(), (Escalation.id,))
+    db.session.commit()
+    return {'closed_ids': sorted(row.id for row in rows), 'conflict_ids': conflict_ids, 'missing_ids': missing_ids}
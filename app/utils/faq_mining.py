@@ -0,0 +1,244 @@
+"""
+回答済みエスカレーションからのFAQ候補の抽出
+- 期間内（FAQ_MINING_DAYS 日、0 で全期間）に回答した質問を古い順に読み、保存済みの MinHash 署名（なければ質問文から計算）で
+  似た質問をグループにまとめる。各グループの最初の質問の署名だけをメモリ上の LSH 索引（MinHashIndex）に入れ、
+  以降の質問は帯キーが一致するグループのうち最も似ているもの（FAQ_MINING_THRESHOLD 以上）に入れる
+- FAQ_DRAFT_MIN_COUNT 件以上のグループをFAQの下書き（faq_draft、status='pending'）にする。
+  質問・回答はグループ内で最も多い文面（同数なら短い方）を使う
+- 代表の質問が既存の下書きと似ていれば新しく作らず、件数・元のエスカレーション・最終回答日時だけを更新する
+  （文面は作成時・編集時のまま。承認・却下済みのものも状態は変えない）
+- 内容が近い既存のFAQ（FAQ.score が FAQ_DRAFT_SIMILAR_SCORE 以上）は similar_faq_id に記録し、審査画面で重複に気付けるようにする
+- 承認・編集・却下は status='pending' を条件にした UPDATE で行い、二重に承認しない
+  承認ではFAQを ORM で追加するため、検索索引のキャッシュ（faq:）も無効化される
+"""
+
+import json
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select, update
+from app import db
+from app.utils.similarity import MinHashIndex, normalize, pack, signature, unpack
+
+logger = logging.getLogger(__name__)
+
+DRAFT_FIELDS = ('title', 'question', 'answer', 'keywords', 'category')
+TITLE_LENGTH = 60
+
+_mining_lock = threading.Lock()  # 同時に抽出すると同じ下書きを重複して作るため、プロセス内では1件ずつ
+
+
+class _Group:
+    """似た質問のグループ（質問・回答の文面ごとの件数）"""
+
+    def __init__(self, sample_size):
+        self.count = 0
+        self.questions = Counter()
+        self.answers = Counter()
+        self.question_texts = {}  # 正規化した文面 -> 最初に見た文面
+        self.answer_texts = {}
+        self.escalation_ids = deque(maxlen=sample_size)
+        self.last_answered_at = None
+
+    def add(self, row):
+        self.count += 1
+        for counter, texts, text in ((self.questions, self.question_texts, row.question),
+                                     (self.answers, self.answer_texts, row.staff_response)):
+            key = normalize(text) or text.strip()
+            counter[key] += 1
+            texts.setdefault(key, text.strip())
+        self.escalation_ids.appendleft(row.id)
+        if row.answered_at and (self.last_answered_at is None or row.answered_at > self.last_answered_at):
+            self.last_answered_at = row.answered_at
+
+    @staticmethod
+    def _most_common(counter, texts):
+        return texts[max(counter, key=lambda key: (counter[key], -len(texts[key])))]
+
+    @property
+    def question(self):
+        return self._most_common(self.questions, self.question_texts)
+
+    @property
+    def answer(self):
+        return self._most_common(self.answers, self.answer_texts)
+
+
+def _title(question):
+    text = ' '.join(question.split())
+    return text if len(text) <= TITLE_LENGTH else text[:TITLE_LENGTH - 1] + '…'
+
+
+def _answered_rows(days):
+    """回答済みエスカレーションの (件数, 質問と回答の行のイテレータ)"""
+    from app.models import Escalation, Message
+
+    conditions = [Escalation.status == 'answered', Escalation.staff_response.isnot(None),
+                  Escalation.staff_response != '']
+    if days:
+        conditions.append(Escalation.answered_at >= datetime.utcnow() - timedelta(days=days))
+    total = db.session.execute(select(func.count(Escalation.id)).where(*conditions)).scalar()
+    rows = db.session.execute(
+        select(Escalation.id, Escalation.fingerprint, Escalation.staff_response, Escalation.answered_at,
+               Message.content.label('question'))
+        .join(Message, Message.id == Escalation.message_id)
+        .where(*conditions).order_by(Escalation.id)
+        .execution_options(yield_per=current_app.config.get('FAQ_MINING_BATCH_SIZE', 1000))
+    )
+    return total, rows
+
+
+def _group_answered(days, threshold, sample_size, job=None):
+    """回答済みの質問を似たものどうしでグループにまとめ、(読んだ件数, グループ一覧) を返す"""
+    index = MinHashIndex()
+    groups = []
+    total, rows = _answered_rows(days)
+    scanned = 0
+    for row in rows:
+        scanned += 1
+        if row.fingerprint is not None:
+            sig = unpack(row.fingerprint) if row.fingerprint else None  # b'' は比較できる文字がない質問
+        else:
+            sig = signature(row.question)
+        if sig is not None and row.question:
+            group_index, _ = index.nearest(sig, threshold)
+            if group_index is None:
+                group_index = len(groups)
+                groups.append(_Group(sample_size))
+                index.add(group_index, sig)
+            groups[group_index].add(row)
+        if job and scanned % 1000 == 0:
+            job.report(scanned, total * 2, message=f'{scanned}/{total}件の回答を分類中')
+    return scanned, groups
+
+
+def mine_faq_drafts(days=None, min_count=None, job=None):
+    """回答済みエスカレーションからFAQの下書きを作成・更新し、件数を返す（ジョブとして実行）"""
+    from app.models import FAQ, FaqDraft
+
+    config = current_app.config
+    days = config.get('FAQ_MINING_DAYS', 180) if days is None else days
+    min_count = min_count or config.get('FAQ_DRAFT_MIN_COUNT', 3)
+    threshold = config.get('FAQ_MINING_THRESHOLD', config.get('ESCALATION_CLUSTER_THRESHOLD', 0.6))
+    similar_score = config.get('FAQ_DRAFT_SIMILAR_SCORE', 0.5)
+
+    if not _mining_lock.acquire(blocking=False):
+        raise RuntimeError('FAQ候補の抽出は既に実行中です')
+    try:
+        scanned, groups = _group_answered(days, threshold, config.get('FAQ_DRAFT_SAMPLE_SIZE', 20), job)
+        groups = sorted((group for group in groups if group.count >= min_count), key=lambda group: -group.count)
+
+        drafts = MinHashIndex()
+        for draft in FaqDraft.query.filter(FaqDraft.fingerprint.isnot(None)):
+            drafts.add(draft, unpack(draft.fingerprint))
+
+        touched = {}  # 今回更新した下書き -> 元のエスカレーションID（複数のグループが同じ下書きに当たった場合は合算）
+        created = 0
+        for i, group in enumerate(groups, start=1):
+            question = group.question
+            sig = signature(question)
+            draft, _ = drafts.nearest(sig, threshold)
+            if draft is None:
+                draft = FaqDraft(title=_title(question), question=question, answer=group.answer,
+                                 keywords=','.join(list(dict.fromkeys(FAQ.extract_keywords(question)))[:10]) or None,
+                                 status='pending', frequency=0, fingerprint=pack(sig))
+                db.session.add(draft)
+                drafts.add(draft, sig)
+                created += 1
+            elif draft not in touched:
+                draft.frequency = 0
+
+            ids = touched.setdefault(draft, [])
+            ids.extend(group.escalation_ids)
+            draft.frequency += group.count
+            draft.escalation_ids = json.dumps(sorted(ids, reverse=True)[:group.escalation_ids.maxlen])
+            if group.last_answered_at and (draft.last_answered_at is None
+                                           or group.last_answered_at > draft.last_answered_at):
+                draft.last_answered_at = group.last_answered_at
+            if draft.status == 'pending':
+                scored = FAQ.score(draft.question, 1)
+                faq, score = scored[0] if scored else (None, None)
+                if faq is not None and score >= similar_score:
+                    draft.similar_faq_id, draft.similar_faq_score = faq.id, score
+                else:
+                    draft.similar_faq_id = draft.similar_faq_score = None
+            if job:
+                job.report(len(groups) + i, len(groups) * 2, message=f'{i}/{len(groups)}件の下書きを作成中')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        _mining_lock.release()
+
+    result = {'scanned': scanned, 'groups': len(groups), 'created': created, 'updated': len(touched) - created}
+    logger.info('Mined FAQ drafts: %s', result)
+    return result
+
+
+def _update_pending(draft_id, **values):
+    """審査待ちの下書きだけを更新し、更新できたかを返す"""
+    from app.models import FaqDraft
+
+    return db.session.execute(
+        update(FaqDraft).where(FaqDraft.id == draft_id, FaqDraft.status == 'pending')
+        .values(updated_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount > 0
+
+
+def _draft_values(draft, fields):
+    """下書きの文面に編集内容を反映した dict（タイトル・質問・回答が空なら ValueError）"""
+    values = {}
+    for key in DRAFT_FIELDS:
+        value = fields.get(key)
+        value = getattr(draft, key) if value is None else str(value).strip() or None
+        values[key] = value
+    if not all(values[key] for key in ('title', 'question', 'answer')):
+        raise ValueError('タイトル・質問・回答を入力してください')
+    return values
+
+
+def save_draft(draft, fields):
+    """審査待ちの下書きの文面を更新し、更新できたかを返す"""
+    saved = _update_pending(draft.id, **_draft_values(draft, fields))
+    db.session.commit()
+    return saved
+
+
+def approve_draft(draft, user_id, fields=None):
+    """下書きを（編集内容を反映して）承認し、作成したFAQを返す（審査待ちでなければ None）"""
+    from app.models import FAQ
+
+    values = _draft_values(draft, fields or {})
+    faq = FAQ(is_active=True, **values)
+    db.session.add(faq)
+    db.session.flush()
+    if not _update_pending(draft.id, status='approved', faq_id=faq.id, reviewed_by_id=user_id,
+                           reviewed_at=datetime.utcnow(), **values):
+        db.session.rollback()
+        return None
+    db.session.commit()
+    logger.info('User %s approved FAQ draft %s as FAQ %s', user_id, draft.id, faq.id)
+    return faq
+
+
+def reject_draft(draft, user_id):
+    """下書きを却下し、却下できたかを返す（却下したものは次回の抽出でも作り直さない）"""
+    rejected = _update_pending(draft.id, status='rejected', reviewed_by_id=user_id, reviewed_at=datetime.utcnow())
+    db.session.commit()
+    return rejected
+
+
+def sample_questions(drafts, limit=3):
+    """下書きごとの元の質問の例（下書きID -> 質問の一覧）"""
+    from app.models import Escalation, Message
+
+    samples = {draft.id: draft.source_ids()[:limit] for draft in drafts}
+    questions = dict(db.session.execute(
+        select(Escalation.id, Message.content).join(Message, Message.id == Escalation.message_id)
+        .where(Escalation.id.in_([i for ids in samples.values() for i in ids]))
+    ).all())
+    return {draft_id: [questions[i] for i in ids if i in questions] for draft_id, ids in samples.items()}
@@ -0,0 +1,164 @@
+"""
+未解決エスカレーションへの回答候補
+- 有効なFAQのタイトル・質問・キーワード・カテゴリから TF-IDF 索引（文字 2-gram と FAQ.extract_keywords の語）を作り、
+  キャッシュ（faq:search_index）に保持する。FAQ の変更時は faq: のキャッシュごと無効化され、次の利用時に作り直す
+- FAQ.search は一致しなければ候補を返さないが、ここでは一致が弱いFAQもスコア付きで上位 k 件を返す
+- 候補（FAQ と、質問が似ている回答済みのエスカレーション）はバックグラウンドジョブで計算して
+  エスカレーションごとにキャッシュ（faq:suggestions:<ID>、ESCALATION_SUGGEST_TTL 秒）する。一覧の表示は計算を待たない
+- キャッシュはプロセスごと（jobs と同じ）
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from flask import current_app
+from app.utils.cache import get_cached, peek_cached, set_cached
+from app.utils.diagnostics import register_section
+from app.utils.similarity import normalize, shingles
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = 'faq:search_index'
+SUGGESTIONS_KEY = 'faq:suggestions:{}'
+KEYWORD_WEIGHT = 2  # 語として一致した場合の重み（文字 2-gram 1つ分に対して）
+
+_inflight = set()  # 計算中のエスカレーションID
+_inflight_lock = threading.Lock()
+
+
+def _terms(text):
+    """索引・検索に使う語の頻度"""
+    from app.models import FAQ
+
+    terms = Counter(shingles(text))
+    for keyword in FAQ.extract_keywords(text or ''):
+        terms['kw:' + normalize(keyword)] += KEYWORD_WEIGHT
+    return terms
+
+
+class FaqSearchIndex:
+    """有効なFAQの TF-IDF 索引（語 -> [(FAQ ID, 重み)] の転置索引）"""
+
+    def __init__(self, faqs):
+        started = time.perf_counter()
+        documents = {faq.id: _terms(' '.join(filter(None, (faq.title, faq.question, faq.keywords, faq.category))))
+                     for faq in faqs}
+        document_frequency = Counter(term for terms in documents.values() for term in terms)
+        total = len(documents)
+        self.idf = {term: math.log((1 + total) / (1 + count)) + 1 for term, count in document_frequency.items()}
+
+        self.postings = defaultdict(list)
+        for faq_id, terms in documents.items():
+            weights = {term: count * self.idf[term] for term, count in terms.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self.postings[term].append((faq_id, weight / norm))
+
+        self.faq_count = total
+        self.built_at = datetime.utcnow()
+        self.build_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    def score(self, text, limit=5):
+        """コサイン類似度の高い順に (FAQ ID, スコア) を最大 limit 件（スコア 0 は除く）"""
+        weights = {term: count * self.idf[term] for term, count in _terms(text).items() if term in self.idf}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        if not norm:
+            return []
+        scores = defaultdict(float)
+        for term, weight in weights.items():
+            for faq_id, faq_weight in self.postings[term]:
+                scores[faq_id] += weight / norm * faq_weight
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        return [(faq_id, round(score, 3)) for faq_id, score in ranked[:limit]]
+
+    def stats(self):
+        return {'faqs': self.faq_count, 'terms': len(self.postings), 'built_at': self.built_at.isoformat(),
+                'build_ms': self.build_ms}
+
+
+def get_search_index():
+    """FAQ の検索索引（キャッシュになければ作成）"""
+    from app.models import FAQ
+
+    index = get_cached(INDEX_KEY)
+    if index is None:
+        index = FaqSearchIndex(FAQ.query.filter(FAQ.is_active == True).all())
+        set_cached(INDEX_KEY, index, current_app.config.get('FAQ_INDEX_TTL', 86400))
+        logger.info('Built FAQ search index: %s', index.stats())
+    return index
+
+
+def suggest(escalation, limit=None):
+    """エスカレーション1件の回答候補（FAQ と、似た質問への過去の回答）"""
+    from app.models import FAQ
+    from app.utils.escalation_clusters import similar_answered
+
+    limit = limit or current_app.config.get('ESCALATION_SUGGEST_LIMIT', 3)
+    question = escalation.message.content if escalation.message else ''
+    return {
+        'faqs': [{'id': faq.id, 'title': faq.title, 'answer': faq.answer, 'category': faq.category, 'score': score}
+                 for faq, score in FAQ.score(question, limit)],
+        'similar': similar_answered(question, limit, exclude_id=escalation.id)
+    }
+
+
+def compute_suggestions(escalation_ids, job=None):
+    """回答候補を計算してキャッシュし、件数を返す（ジョブとして実行）"""
+    from sqlalchemy.orm import joinedload
+    from app.models import Escalation
+
+    timeout = current_app.config.get('ESCALATION_SUGGEST_TTL', 600)
+    try:
+        escalations = Escalation.query.options(joinedload(Escalation.message))\
+            .filter(Escalation.id.in_(escalation_ids)).all()
+        for i, escalation in enumerate(escalations, start=1):
+            set_cached(SUGGESTIONS_KEY.format(escalation.id), suggest(escalation), timeout)
+            if job:
+                job.report(i, len(escalations))
+        return len(escalations)
+    finally:
+        with _inflight_lock:
+            _inflight.difference_update(escalation_ids)
+
+
+def cached_suggestions(escalation_ids):
+    """キャッシュ済みの回答候補（ID -> 候補）と、まだ計算していないIDの一覧"""
+    found, missing = {}, []
+    for escalation_id in escalation_ids:
+        suggestions = get_cached(SUGGESTIONS_KEY.format(escalation_id))
+        if suggestions is None:
+            missing.append(escalation_id)
+        else:
+            found[escalation_id] = suggestions
+    return found, missing
+
+
+def request_suggestions(escalation_ids):
+    """キャッシュにない回答候補の計算をジョブとして投入（計算中のものは除く）"""
+    from app.utils.jobs import jobs
+
+    with _inflight_lock:
+        targets = [escalation_id for escalation_id in escalation_ids
+                   if escalation_id not in _inflight and peek_cached(SUGGESTIONS_KEY.format(escalation_id)) is None]
+        _inflight.update(targets)
+    if targets:
+        try:
+            jobs.submit('escalation_suggestions', compute_suggestions, targets)
+        except Exception:
+            with _inflight_lock:
+                _inflight.difference_update(targets)
+            raise
+    return targets
+
+
+def _diagnostics():
+    index = peek_cached(INDEX_KEY)
+    with _inflight_lock:
+        inflight = len(_inflight)
+    return dict(index.stats() if index else {'faqs': None}, built=index is not None, suggestions_inflight=inflight)
+
+
+register_section('search_index', _diagnostics)
@@ -0,0 +1,157 @@
+"""
+リクエスト計測ミドルウェア
+- リクエストごとの処理時間・DB時間・クエリ数・ORM読み込み行数を記録
+- Server-Timing ヘッダーと構造化ログ（extra の fields）を出力
+- クエリ数がしきい値を超えたリクエストを N+1 の疑いとして警告
+"""
+
+import logging
+import threading
+import time
+from flask import current_app, g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.utils.metrics import observe_request
+
+logger = logging.getLogger('app.request')
+
+_events_registered = False
+
+
+class EndpointStats:
+    """エンドポイント別の累積計測値（プロセス内）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, endpoint, duration, db_time, queries, rows):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {
+                'count': 0, 'total_time': 0.0, 'max_time': 0.0,
+                'db_time': 0.0, 'queries': 0, 'rows': 0, 'n_plus_one': 0
+            })
+            stats['count'] += 1
+            stats['total_time'] += duration
+            stats['max_time'] = max(stats['max_time'], duration)
+            stats['db_time'] += db_time
+            stats['queries'] += queries
+            stats['rows'] += rows
+
+    def flag_n_plus_one(self, endpoint):
+        with self._lock:
+            if endpoint in self._stats:
+                self._stats[endpoint]['n_plus_one'] += 1
+
+    def top(self, limit=10, key='avg_time'):
+        """平均処理時間などで並べたエンドポイント一覧"""
+        with self._lock:
+            items = [dict(endpoint=name, **stats) for name, stats in self._stats.items()]
+        for item in items:
+            item['avg_time'] = item['total_time'] / item['count']
+            item['avg_queries'] = item['queries'] / item['count']
+        return sorted(items, key=lambda item: item[key], reverse=True)[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+def _current_metrics():
+    # リクエスト外（バックグラウンドジョブ等）のクエリは集計しない
+    if has_request_context():
+        return g.get('_request_metrics')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('query_start_time')
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+
+    metrics = _current_metrics()
+    if metrics is not None:
+        metrics['queries'] += 1
+        metrics['db_time'] += elapsed
+
+
+def _on_load(target, context):
+    metrics = _current_metrics()
+    if metrics is not None:
+        metrics['rows'] += 1
+
+
+def _register_events(model_base):
+    global _events_registered
+    if _events_registered:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(model_base, 'load', _on_load, propagate=True)
+    _events_registered = True
+
+
+def _start_request():
+    g._request_metrics = {
+        'start': time.perf_counter(),
+        'queries': 0,
+        'db_time': 0.0,
+        'rows': 0
+    }
+
+
+def _finish_request(response):
+    metrics = g.pop('_request_metrics', None)
+    if metrics is None:
+        return response
+
+    duration = time.perf_counter() - metrics['start']
+    endpoint = request.endpoint or 'unknown'
+    endpoint_stats.record(endpoint, duration, metrics['db_time'], metrics['queries'], metrics['rows'])
+    observe_request(endpoint, request.method, response.status_code, duration, metrics['queries'])
+
+    response.headers['Server-Timing'] = (
+        f'app;dur={duration * 1000:.1f}, '
+        f'db;dur={metrics["db_time"] * 1000:.1f};desc="{metrics["queries"]} queries"'
+    )
+
+    record = {
+        'endpoint': endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'db_ms': round(metrics['db_time'] * 1000, 2),
+        'queries': metrics['queries'],
+        'rows': metrics['rows']
+    }
+
+    threshold = current_app.config.get('QUERY_COUNT_WARN_THRESHOLD', 20)
+    if threshold and metrics['queries'] > threshold:
+        endpoint_stats.flag_n_plus_one(endpoint)
+        record['n_plus_one_suspect'] = True
+        logger.warning('%s %s %s (N+1 suspect: %d queries)', request.method, request.path,
+                       response.status_code, metrics['queries'], extra={'fields': record})
+    elif logger.isEnabledFor(logging.INFO):
+        logger.info('%s %s %s', request.method, request.path, response.status_code, extra={'fields': record})
+
+    return response
+
+
+def init_instrumentation(app):
+    """計測ミドルウェアを登録"""
+    if not app.config.get('REQUEST_METRICS_ENABLED', True):
+        return
+
+    from app import db
+    _register_events(db.Model)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
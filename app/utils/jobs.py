@@ -0,0 +1,185 @@
+"""
+バックグラウンドジョブ
+- 管理画面の重い処理（一括取り込み・エクスポート・復元・削除）をスレッドプールで実行
+- ジョブの状態（queued / running / done / failed）と進捗率を保持
+- 結果ファイルは一時ディレクトリに書き出し、ダウンロードAPIから取得する
+
+ジョブはプロセス内で管理されるため、ステータス確認は投入したワーカープロセスで行う必要がある
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """ジョブレコード"""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = 'queued'  # 'queued', 'running', 'done', 'failed'
+        self.progress = 0  # 進捗率（0-100）
+        self.message = None  # 進捗メッセージ
+        self.result = None  # 実行結果（JSONシリアライズ可能な値）
+        self.error = None
+        self.file_path = None  # 結果ファイルのパス
+        self.file_name = None  # ダウンロード時のファイル名
+        self.mimetype = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+
+    def update(self, progress=None, message=None):
+        """進捗を更新"""
+        if progress is not None:
+            self.progress = max(0, min(100, int(progress)))
+        if message is not None:
+            self.message = message
+
+    def report(self, done, total, message=None):
+        """処理件数から進捗率を更新"""
+        self.update(progress=(done * 100 / total) if total else 100, message=message)
+
+    def open_file(self, file_name, mimetype):
+        """結果ファイルを書き込み用に開く"""
+        fd, self.file_path = tempfile.mkstemp(prefix=f'job_{self.id}_')
+        self.file_name = file_name
+        self.mimetype = mimetype
+        return os.fdopen(fd, 'wb')
+
+    def discard_file(self):
+        """結果ファイルを削除"""
+        if self.file_path:
+            try:
+                os.remove(self.file_path)
+            except OSError:
+                pass
+            self.file_path = None
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'has_file': bool(self.file_path),
+            'file_name': self.file_name,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class JobManager:
+    """スレッドプールによるジョブ実行管理"""
+
+    def __init__(self):
+        self._app = None
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_workers = 2
+        self.history_size = 100
+
+    def init_app(self, app):
+        """アプリケーションに登録"""
+        self._app = app
+        self.max_workers = app.config.get('JOB_WORKERS', 2)
+        self.history_size = app.config.get('JOB_HISTORY_SIZE', 100)
+        app.extensions['jobs'] = self
+
+    def _get_executor(self):
+        # gunicorn の preload 時にフォーク前のスレッドを作らないよう遅延生成
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='job'
+                )
+            return self._executor
+
+    def submit(self, name, func, *args, **kwargs):
+        """ジョブを投入（func は job キーワード引数を受け取る）"""
+        if self._app is None:
+            raise RuntimeError('JobManager が初期化されていません')
+
+        job = Job(name)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+
+        self._get_executor().submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        from app import db
+
+        with self._app.app_context():
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            try:
+                job.result = func(*args, job=job, **kwargs)
+                job.progress = 100
+                job.status = 'done'
+            except Exception as e:
+                db.session.rollback()
+                job.discard_file()
+                job.error = str(e)
+                job.status = 'failed'
+                logger.exception('Job %s (%s) failed', job.name, job.id)
+            finally:
+                job.finished_at = datetime.utcnow()
+
+    def _prune(self):
+        # 完了済みの古いジョブから履歴上限まで削除（ロック取得済みで呼ぶ）
+        excess = len(self._jobs) - self.history_size
+        if excess <= 0:
+            return
+        for job_id in [jid for jid, j in self._jobs.items() if j.is_finished][:excess]:
+            self._jobs.pop(job_id).discard_file()
+
+    def get(self, job_id):
+        """ジョブを取得"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def recent(self, limit=50):
+        """新しい順にジョブ一覧を取得"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))[:limit]
+
+    def queue_depth(self):
+        """待機中・実行中のジョブ数"""
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == 'queued')
+            running = sum(1 for j in self._jobs.values() if j.status == 'running')
+        return {'queued': queued, 'running': running, 'workers': self.max_workers}
+
+
+# グローバルジョブマネージャー
+jobs = JobManager()
+
+
+def wants_async():
+    """リクエストがバックグラウンド実行を要求しているか"""
+    from flask import request
+    value = request.args.get('async') or request.form.get('async')
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get('async')
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
@@ -0,0 +1,143 @@
+"""
+ログ設定
+- モジュールごとのロガー（logging.getLogger(__name__)）を 'app' ロガー配下にまとめる
+- QueueHandler でキューに積むだけにし、出力は QueueListener の別スレッドで行う（リクエストを待たせない）
+- JSON 形式（LOG_FORMAT=json）またはテキスト形式で出力
+- リクエストIDを付与し、X-Request-ID ヘッダーで返す
+- LOG_LEVEL 未満のログはメッセージの組み立て自体を行わない（% 形式の遅延フォーマット）
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import uuid
+from datetime import datetime, timezone
+from flask import g, request, has_request_context
+
+APP_LOGGER = 'app'
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+_listener = None
+_queue_handler = None
+
+
+class RequestIdFilter(logging.Filter):
+    """ログを出したスレッドでリクエストIDを記録に付与"""
+
+    def filter(self, record):
+        request_id = None
+        if has_request_context():
+            request_id = g.get('request_id')
+        record.request_id = request_id or '-'
+        return True
+
+
+class AppQueueHandler(logging.handlers.QueueHandler):
+    """メッセージと例外だけを文字列化してキューに積む（整形は出力スレッドで行う）"""
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """1行1件の JSON 形式"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-')
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            data.update(fields)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """人が読むためのテキスト形式（追加フィールドは末尾に JSON で付与）"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text = f'{text} {json.dumps(fields, ensure_ascii=False, default=str)}'
+        return text
+
+
+def _assign_request_id():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+
+
+def _add_request_id_header(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    return response
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(level='INFO', fmt='text', filename=None):
+    """'app' ロガーにキュー経由のハンドラーを設定（再設定時は前の設定を置き換え）"""
+    global _listener, _queue_handler
+
+    formatter = JsonFormatter() if fmt == 'json' else TextFormatter()
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if filename:
+        handlers.append(logging.FileHandler(filename, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    app_logger = logging.getLogger(APP_LOGGER)
+    _stop_listener()
+    if _queue_handler is not None:
+        app_logger.removeHandler(_queue_handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = AppQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestIdFilter())
+    app_logger.addHandler(_queue_handler)
+    app_logger.setLevel(level)
+    app_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def init_logging(app):
+    """LOG_LEVEL / LOG_FORMAT / LOG_FILE に従ってログを設定し、リクエストIDを有効化"""
+    level = app.config.get('LOG_LEVEL') or ('DEBUG' if app.debug else 'INFO')
+    configure_logging(level=level,
+                      fmt=app.config.get('LOG_FORMAT', 'text'),
+                      filename=app.config.get('LOG_FILE'))
+
+    app.before_request(_assign_request_id)
+    app.after_request(_add_request_id_header)
+
+
+# 終了時にキューに残ったログを出力
+atexit.register(_stop_listener)
@@ -0,0 +1,297 @@
+"""
+Prometheus 形式のメトリクス
+- ルート別リクエスト数・レイテンシヒストグラム・DBクエリ数
+- キャッシュのヒット/ミス/削除数
+- チャット送信の FAQ 回答 / エスカレーション件数
+- 未解決エスカレーション数・アクティブなポーリングクライアント数
+
+METRICS_MULTIPROC_DIR を設定すると、各ワーカープロセスが自分の値を
+<dir>/metrics_<pid>.json に書き出し、/metrics で全プロセス分を合算する（gunicorn 対応）
+- 書き出しはプロセス内でロックし、スレッドごとの一時ファイルから置き換える（gthread ワーカー対応）
+- 終了したプロセスのファイルは合算時に削除する（カウンターはその分だけリセットされる）
+- ポーリングクライアント数（ゲージ）は POLL_WINDOW_SECONDS より古いスナップショットを数えない
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POLL_WINDOW_SECONDS = 30  # この秒数内にポーリングしたクライアントをアクティブとみなす
+SNAPSHOT_INTERVAL = 5  # スナップショット書き出し間隔（秒）
+
+
+class Counter:
+    """単調増加カウンター"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """プロセス内で別管理している累積値をそのまま反映"""
+        with self._lock:
+            self.values[self._key(labels)] = value
+
+    def merge(self, values):
+        for key, value in values.items():
+            self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Counter):
+    """累積バケット付きヒストグラム"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [各バケットの件数..., +Inf の件数, 合計値]
+            data = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            else:
+                data[len(self.buckets)] += 1
+            data[-1] += value
+
+    def merge(self, values):
+        for key, data in values.items():
+            current = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, value in enumerate(data):
+                current[i] += value
+
+    def samples(self):
+        for key, data in sorted(self.values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), data[:-1]):
+                cumulative += count
+                yield f'{self.name}_bucket', dict(labels, le=str(bound)), cumulative
+            yield f'{self.name}_sum', labels, data[-1]
+            yield f'{self.name}_count', labels, cumulative
+
+
+class MetricsRegistry:
+    """メトリクスの登録・スナップショット・テキスト出力"""
+
+    def __init__(self):
+        self.metrics = {}
+        self._pollers = {}  # クライアントID -> 最終ポーリング時刻
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()  # 間隔の判定と書き出し（snapshot 内で _lock を使うため別のロック）
+        self._last_snapshot = 0
+        self.multiproc_dir = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def record_poll(self, client_id):
+        with self._lock:
+            self._pollers[str(client_id)] = time.time()
+
+    def active_pollers(self):
+        cutoff = time.time() - POLL_WINDOW_SECONDS
+        with self._lock:
+            for client_id in [c for c, t in self._pollers.items() if t < cutoff]:
+                del self._pollers[client_id]
+            return set(self._pollers)
+
+    def snapshot(self):
+        """このプロセスのメトリクス値"""
+        _collect_process_metrics()
+        metrics = {}
+        for name, metric in self.metrics.items():
+            with metric._lock:
+                metrics[name] = {json.dumps(list(k)): v for k, v in metric.values.items()}
+        return {'pid': os.getpid(), 'time': time.time(), 'metrics': metrics,
+                'pollers': sorted(self.active_pollers())}
+
+    def write_snapshot(self, force=False):
+        """マルチプロセス用ディレクトリへスナップショットを書き出し（間隔制限あり）"""
+        if not self.multiproc_dir:
+            return
+        with self._snapshot_lock:
+            now = time.time()
+            if not force and now - self._last_snapshot < SNAPSHOT_INTERVAL:
+                return
+            self._last_snapshot = now
+
+            path = _snapshot_path(self.multiproc_dir, os.getpid())
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+
+    def remove_snapshot(self):
+        """このプロセスのスナップショットを削除（終了時）"""
+        if not self.multiproc_dir:
+            return
+        with self._snapshot_lock:
+            try:
+                os.remove(_snapshot_path(self.multiproc_dir, os.getpid()))
+            except FileNotFoundError:
+                pass
+
+    def collect(self):
+        """全プロセス分を合算したメトリクスとアクティブクライアント集合"""
+        if self.multiproc_dir:
+            self.write_snapshot(force=True)
+            snapshots = []
+            for path in glob.glob(os.path.join(self.multiproc_dir, 'metrics_*.json')):
+                if not _process_alive(path):
+                    _remove_quietly(path)
+                    continue
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        else:
+            snapshots = [self.snapshot()]
+
+        merged = {name: type(m)(m.name, m.documentation, m.labelnames, **_extra_args(m))
+                  for name, m in self.metrics.items()}
+        pollers = set()
+        cutoff = time.time() - POLL_WINDOW_SECONDS
+        for snapshot in snapshots:
+            for name, values in snapshot['metrics'].items():
+                if name in merged:
+                    merged[name].merge({tuple(json.loads(k)): v for k, v in values.items()})
+            if snapshot.get('time', 0) >= cutoff:
+                pollers.update(snapshot.get('pollers', []))
+        return merged, pollers
+
+    def render(self, gauges=()):
+        """Prometheus テキスト形式で出力（gauges: (名前, 説明, 値) の一覧）"""
+        merged, pollers = self.collect()
+        lines = []
+        for metric in merged.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample_name, labels, value in metric.samples():
+                lines.append(f'{sample_name}{_format_labels(labels)} {_format_value(value)}')
+
+        gauges = list(gauges) + [
+            ('chat_active_poll_clients', f'{POLL_WINDOW_SECONDS}秒以内にメッセージを取得したクライアント数', len(pollers))
+        ]
+        for name, documentation, value in gauges:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f'metrics_{pid}.json')
+
+
+def _process_alive(path):
+    """スナップショットを書いたプロセスが動いているか（ファイル名の pid で判定）"""
+    try:
+        pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+    except ValueError:
+        return True
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # 別ユーザーのプロセス
+        return True
+    return True
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:  # 他のワーカーが先に削除した
+        pass
+
+
+def _extra_args(metric):
+    return {'buckets': metric.buckets} if isinstance(metric, Histogram) else {}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+# グローバルレジストリ
+registry = MetricsRegistry()
+
+http_requests_total = registry.register(Counter(
+    'http_requests_total', 'ルート別のリクエスト数', ('endpoint', 'method', 'status')))
+http_request_duration_seconds = registry.register(Histogram(
+    'http_request_duration_seconds', 'ルート別のレイテンシ（秒）', ('endpoint',)))
+db_queries_total = registry.register(Counter(
+    'db_queries_total', 'ルート別のDBクエリ数', ('endpoint',)))
+cache_hits_total = registry.register(Counter('cache_hits_total', 'キャッシュヒット数'))
+cache_misses_total = registry.register(Counter('cache_misses_total', 'キャッシュミス数'))
+cache_evictions_total = registry.register(Counter('cache_evictions_total', 'キャッシュ削除数（期限切れ・無効化）'))
+chat_messages_total = registry.register(Counter(
+    'chat_messages_total', 'チャット送信の結果別件数（faq_answer / escalation）', ('outcome',)))
+
+
+def _collect_process_metrics():
+    # プロセス内キャッシュの累積値を反映
+    from app.utils.cache import get_cache_stats
+
+    stats = get_cache_stats()
+    cache_hits_total.set_total(stats.get('hits', 0))
+    cache_misses_total.set_total(stats.get('misses', 0))
+    cache_evictions_total.set_total(stats.get('evictions', 0))
+
+
+def observe_request(endpoint, method, status, duration, queries):
+    """リクエスト1件分を記録（計測ミドルウェアから呼ばれる）"""
+    http_requests_total.inc(endpoint=endpoint, method=method, status=status)
+    http_request_duration_seconds.observe(duration, endpoint=endpoint)
+    db_queries_total.inc(queries, endpoint=endpoint)
+    registry.write_snapshot()
+
+
+def init_metrics(app):
+    """マルチプロセス集計用ディレクトリを設定"""
+    multiproc_dir = app.config.get('METRICS_MULTIPROC_DIR') or os.environ.get('METRICS_MULTIPROC_DIR')
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        registry.multiproc_dir = multiproc_dir
+        atexit.register(registry.remove_snapshot)
@@ -0,0 +1,166 @@
+"""
+サンプリングプロファイラ
+- PROFILER_SAMPLE_RATE=N で N リクエストに1件をプロファイル（0で無効）
+- 管理者セッションからの X-Profile: 1 ヘッダー付きリクエストも対象
+- 専用スレッドが対象リクエストのスタックを一定間隔で採取し、エンドポイント別に集計
+- collapsed stack 形式（flamegraph.pl / speedscope 対応）で出力
+"""
+
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from flask import g, request
+
+MAX_STACKS_PER_ENDPOINT = 5000
+MAX_STACK_DEPTH = 128
+
+
+class StackSampler:
+    """登録されたスレッドのスタックを定期的に採取する"""
+
+    def __init__(self):
+        self.interval = 0.005
+        self.sample_rate = 0
+        self._targets = {}  # スレッドID -> エンドポイント
+        self._profiles = {}  # エンドポイント -> {'requests', 'samples', 'stacks'}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._counter = itertools.count(1)
+        self._root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def should_sample(self):
+        return self.sample_rate > 0 and next(self._counter) % self.sample_rate == 0
+
+    def start(self, endpoint):
+        """現在のスレッドを採取対象に追加"""
+        with self._lock:
+            self._targets[threading.get_ident()] = endpoint
+            profile = self._profiles.setdefault(endpoint, {'requests': 0, 'samples': 0, 'stacks': Counter()})
+            profile['requests'] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self):
+        """現在のスレッドを採取対象から外す"""
+        with self._lock:
+            self._targets.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = dict(self._targets)
+            if not targets:
+                # 対象がなければ次のリクエストまで待機
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+
+            frames = sys._current_frames()
+            collected = []
+            for thread_id, endpoint in targets.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    collected.append((endpoint, self._collapse(frame)))
+
+            with self._lock:
+                for endpoint, stack in collected:
+                    profile = self._profiles.get(endpoint)
+                    if profile is None:
+                        continue
+                    profile['samples'] += 1
+                    if stack in profile['stacks'] or len(profile['stacks']) < MAX_STACKS_PER_ENDPOINT:
+                        profile['stacks'][stack] += 1
+                    else:
+                        profile['stacks']['[truncated]'] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            filename = code.co_filename
+            if filename.startswith(self._root):
+                filename = os.path.relpath(filename, self._root)
+            else:
+                filename = os.path.basename(filename)
+            names.append(f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':'))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def summary(self, top=5):
+        """エンドポイント別の集計（自己時間の多い関数の上位付き）"""
+        with self._lock:
+            profiles = {name: (p['requests'], p['samples'], Counter(p['stacks'])) for name, p in self._profiles.items()}
+
+        result = []
+        for endpoint, (requests, samples, stacks) in profiles.items():
+            leaf_counts = Counter()
+            for stack, count in stacks.items():
+                leaf_counts[stack.rsplit(';', 1)[-1]] += count
+            result.append({
+                'endpoint': endpoint,
+                'requests': requests,
+                'samples': samples,
+                'sampled_ms': round(samples * self.interval * 1000, 1),
+                'top_functions': [
+                    {'function': name, 'samples': count,
+                     'percent': round(count * 100 / samples, 1) if samples else 0}
+                    for name, count in leaf_counts.most_common(top)
+                ]
+            })
+        return sorted(result, key=lambda item: item['samples'], reverse=True)
+
+    def collapsed(self, endpoint):
+        """collapsed stack 形式のテキスト（該当なしは None）"""
+        with self._lock:
+            profile = self._profiles.get(endpoint)
+            if profile is None:
+                return None
+            stacks = list(profile['stacks'].items())
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(stacks))
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+sampler = StackSampler()
+
+
+def _is_forced():
+    # ヘッダー指定は管理者のみ有効（ヘッダーがある場合だけユーザーを確認）
+    if request.headers.get('X-Profile') != '1':
+        return False
+    from app.auth.utils import get_current_user
+    user = get_current_user()
+    return bool(user and user.is_admin)
+
+
+def _start_profiling():
+    if sampler.should_sample() or _is_forced():
+        g._profiling = True
+        sampler.start(request.endpoint or 'unknown')
+
+
+def _stop_profiling(exc):
+    if g.pop('_profiling', False):
+        sampler.stop()
+
+
+def init_profiler(app):
+    """サンプリングプロファイラを登録（ヘッダー指定は常に有効）"""
+    if not app.config.get('PROFILER_ENABLED', True):
+        return
+
+    sampler.sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 0)
+    sampler.interval = app.config.get('PROFILER_INTERVAL_MS', 5) / 1000.0
+    app.before_request(_start_profiling)
+    # ストリーミングレスポンスの送信完了まで採取を続ける
+    app.teardown_request(_stop_profiling)
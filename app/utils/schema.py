@@ -0,0 +1,174 @@
+"""
+スキーマのバージョン管理
+- app_meta の schema_version が SCHEMA_VERSION と一致していれば起動時のDDL（create_all）を省略する
+- 一致しない場合は create_all で不足テーブルを作成し、既存DBには未適用のマイグレーションを順に適用する
+- 新規DB（user テーブルがない）は create_all だけで最新状態になるため、マイグレーションは適用しない
+- 移行はDBのロック内で行い、複数のワーカーが同時に起動しても同じDDLを二重に実行しない
+- スキーマを変更したら SCHEMA_VERSION を上げ、@migration(新バージョン) で既存DB向けの変更を登録する
+"""
+
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 5
+VERSION_KEY = 'schema_version'
+SCHEMA_LOCK_KEY = 0x63686174  # PostgreSQL のアドバイザリロックのキー
+LOCK_TIMEOUT_SECONDS = 300  # SQLite で他のプロセスの移行を待つ上限
+
+_migrations = {}  # バージョン -> 既存DBをそのバージョンにする関数（引数は Connection）
+
+
+def migration(version):
+    """既存DB向けのマイグレーションを登録"""
+    def decorator(func):
+        _migrations[version] = func
+        return func
+    return decorator
+
+
+def current_version():
+    """DBに記録されたスキーマのバージョン（app_meta がなければ None）"""
+    from app.models import AppMeta
+
+    try:
+        value = db.session.execute(select(AppMeta.value).where(AppMeta.key == VERSION_KEY)).scalar()
+    except SQLAlchemyError:
+        db.session.rollback()
+        return None
+    return int(value) if value else None
+
+
+def ensure_schema():
+    """スキーマを最新にする（アプリケーションコンテキスト内で呼ぶ）。DDLを実行した場合は True
+
+    バージョンが古い場合はDBのロックを取ってから読み直し、DDLとバージョンの記録を1つのトランザクションで行う
+    （同時に起動した複数のワーカーのうち1つだけが移行し、残りはロックが解けた後に最新のバージョンを読む）
+    """
+    if current_version() == SCHEMA_VERSION:
+        return False
+    db.session.rollback()  # SQLite ではセッションの読み取りが残っているとロックを取った側が書き込めない
+
+    with db.engine.connect() as connection:
+        with _schema_lock(connection):
+            version = _read_version(connection)
+            if version == SCHEMA_VERSION:
+                return False
+            if version is not None and version > SCHEMA_VERSION:
+                logger.warning('Database schema version %d is newer than this application (%d); skipping migrations',
+                               version, SCHEMA_VERSION)
+                return False
+
+            fresh = not inspect(connection).has_table('user')
+            db.metadata.create_all(connection)
+            if not fresh:
+                for target in range((version or 1) + 1, SCHEMA_VERSION + 1):
+                    if target in _migrations:
+                        logger.info('Applying schema migration %d', target)
+                        _migrations[target](connection)
+            _write_version(connection, SCHEMA_VERSION)
+
+    logger.info('Database schema is now version %d (%s)', SCHEMA_VERSION, 'created' if fresh else 'migrated')
+    return True
+
+
+@contextmanager
+def _schema_lock(connection):
+    """移行中は他のプロセスの移行を待たせるトランザクション（SQLite: BEGIN IMMEDIATE / PostgreSQL: アドバイザリロック）"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        timeout = connection.exec_driver_sql('PRAGMA busy_timeout').scalar()
+        connection.exec_driver_sql(f'PRAGMA busy_timeout = {LOCK_TIMEOUT_SECONDS * 1000}')
+        try:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
+        finally:
+            connection.exec_driver_sql(f'PRAGMA busy_timeout = {timeout}')
+    else:
+        with connection.begin():
+            if dialect == 'postgresql':
+                connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': SCHEMA_LOCK_KEY})
+            yield
+
+
+def _read_version(connection):
+    from app.models import AppMeta
+
+    if not inspect(connection).has_table(AppMeta.__tablename__):
+        return None
+    value = connection.execute(select(AppMeta.value).where(AppMeta.key == VERSION_KEY)).scalar()
+    return int(value) if value else None
+
+
+def _write_version(connection, version):
+    from app.models import AppMeta
+
+    table = AppMeta.__table__
+    values = {'value': str(version), 'updated_at': datetime.utcnow()}
+    if not connection.execute(table.update().where(table.c.key == VERSION_KEY).values(**values)).rowcount:
+        connection.execute(table.insert().values(key=VERSION_KEY, **values))
+
+
+def _create_missing_indexes(connection, table_names=None):
+    """モデルに定義された索引のうち既存テーブルにないものを作成
+
+    列がまだない索引（後のマイグレーションで追加する列）は作成しない
+    """
+    inspector = inspect(connection)
+    for table in db.metadata.sorted_tables:
+        if table_names is not None and table.name not in table_names or not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if all(column.name in existing for column in index.columns):
+                index.create(connection, checkfirst=True)
+
+
+@migration(2)
+def _add_history_indexes(connection):
+    # 履歴のページ取得用（conversation.user_id, message.conversation_id）
+    _create_missing_indexes(connection, ('conversation', 'message'))
+
+
+def _add_missing_columns(connection, table_name):
+    """モデルに定義された列のうち既存テーブルにないものを ALTER TABLE で追加（NULL 許可の列に限る）"""
+    table = db.metadata.tables[table_name]
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    preparer = connection.dialect.identifier_preparer
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f'ALTER TABLE {preparer.format_table(table)} '
+                                   f'ADD COLUMN {preparer.format_column(column)} {column_type}')
+
+
+@migration(3)
+def _add_escalation_claims(connection):
+    # エスカレーションの担当（リース）列と、未解決一覧用の索引
+    _add_missing_columns(connection, 'escalation')
+    _create_missing_indexes(connection)
+
+
+@migration(4)
+def _add_escalation_clusters(connection):
+    # 類似質問のクラスタ列（escalation_band テーブルは create_all で作成済み）
+    # 既存のエスカレーションは flask index-escalations で索引に追加する
+    _add_missing_columns(connection, 'escalation')
+    _create_missing_indexes(connection)
+
+
+@migration(5)
+def _add_faq_drafts(connection):
+    # faq_draft テーブル（FAQ候補）は create_all で作成済み。下書きは flask mine-faq-drafts で作る
+    pass
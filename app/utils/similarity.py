@@ -0,0 +1,92 @@
+"""
+質問文の類似度（MinHash / LSH）
+- 正規化（NFKC・小文字化・記号と空白の除去）した文字 n-gram の集合を MinHash 署名にする
+- 署名を LSH_BANDS 個の帯に分けた帯キーが1つでも一致するものだけを候補にし、全件の総当たり比較をしない
+  （64 個のハッシュを 16 帯 × 4 行に分けると、Jaccard 類似度 0.5 前後から候補になる）
+- ハッシュは固定の係数で計算するため、プロセスをまたいでも同じ文は同じ署名・帯キーになる
+- エスカレーションの索引（DB に保存）は app.utils.escalation_clusters、一括処理用のメモリ上の索引は MinHashIndex
+"""
+
+import random
+import re
+import struct
+import unicodedata
+import zlib
+from collections import defaultdict
+
+NGRAM_SIZE = 2
+NUM_PERM = 64
+LSH_BANDS = 16
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = 0xFFFFFFFF
+_rng = random.Random(20250101)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """比較用に正規化した文字列"""
+    return _SEPARATORS.sub('', unicodedata.normalize('NFKC', text or '').lower())
+
+
+def shingles(text, n=NGRAM_SIZE):
+    """正規化した文字列の n-gram 集合（n 文字未満なら文字列全体）"""
+    text = normalize(text)
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def signature(text):
+    """MinHash 署名（NUM_PERM 個の整数のタプル）。比較できる文字がなければ None"""
+    hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(text)]
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a, sig_b):
+    """2つの署名から推定した Jaccard 類似度"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def band_keys(sig):
+    """LSH の帯キー（帯番号を上位ビットに含む 63 ビット以内の整数）"""
+    rows = len(sig) // LSH_BANDS
+    return [band << 32 | zlib.crc32(pack(sig[band * rows:(band + 1) * rows]))
+            for band in range(LSH_BANDS)]
+
+
+def pack(sig):
+    """署名を DB 保存用のバイト列にする"""
+    return struct.pack(f'<{len(sig)}I', *sig)
+
+
+def unpack(data):
+    return struct.unpack(f'<{len(data) // 4}I', data)
+
+
+class MinHashIndex:
+    """メモリ上の LSH 索引（帯キー -> キー）。一括処理で署名どうしを総当たりせずに最も近いものを探す"""
+
+    def __init__(self):
+        self.buckets = defaultdict(list)
+        self.signatures = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def add(self, key, sig):
+        self.signatures[key] = sig
+        for band_key in band_keys(sig):
+            self.buckets[band_key].append(key)
+
+    def nearest(self, sig, threshold):
+        """帯キーが一致するもののうち最も似ている (キー, 類似度)。threshold 未満なら (None, 0.0)"""
+        candidates = {key for band_key in band_keys(sig) for key in self.buckets.get(band_key, ())}
+        best_score, best = max(((similarity(sig, self.signatures[key]), key) for key in candidates),
+                               default=(0.0, None), key=lambda item: item[0])
+        if best is None or best_score < threshold:
+            return None, 0.0
+        return best, best_score
@@ -0,0 +1,172 @@
+"""
+スロークエリログ
+- しきい値（SLOW_QUERY_THRESHOLD_MS）を超えたSQLをリングバッファに記録
+  既定では無効（記録のたびに同じ接続で EXPLAIN を実行するため、調査するときだけ設定または環境変数で有効にする）
+- パラメータ・呼び出し元ルート・実行計画（SQLite: EXPLAIN QUERY PLAN / PostgreSQL: EXPLAIN）を保存
+  パラメータは型と長さだけを記録する（パスワードハッシュやログインIDを画面に出さない）。
+  値も記録する場合は SLOW_QUERY_LOG_PARAMS=True（開発環境向け）
+- PostgreSQL の EXPLAIN はセーブポイント内で実行し、失敗しても呼び出し元のトランザクションを中断させない
+- /admin/diagnostics/slow-queries で確認
+"""
+
+import os
+import threading
+import time
+from collections import deque, OrderedDict
+from datetime import datetime
+from flask import request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MAX_STATEMENT_LENGTH = 4000
+MAX_PARAMS_LENGTH = 500
+PLAN_CACHE_SIZE = 200
+
+
+class SlowQueryLog:
+    """スロークエリのリングバッファ"""
+
+    def __init__(self, maxlen=200):
+        self.threshold = 0.2  # 秒
+        self._entries = deque(maxlen=maxlen)
+        self._plans = OrderedDict()  # SQL文 -> 実行計画（同じ文は再取得しない）
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.capture_values = False  # パラメータの値も記録するか
+
+    def configure(self, threshold_ms, maxlen, capture_values=False):
+        self.threshold = threshold_ms / 1000.0
+        self.capture_values = capture_values
+        with self._lock:
+            self._entries = deque(self._entries, maxlen=maxlen)
+        self.enabled = True
+
+    def record(self, cursor, dialect, statement, parameters, duration, executemany):
+        route = None
+        if has_request_context():
+            route = request.endpoint or request.path
+
+        entry = {
+            'recorded_at': datetime.utcnow().isoformat(),
+            'duration_ms': round(duration * 1000, 2),
+            'statement': statement[:MAX_STATEMENT_LENGTH],
+            'parameters': _format_params(parameters, self.capture_values),
+            'route': route or 'background',
+            'plan': None if executemany else self._explain(cursor, dialect, statement, parameters)
+        }
+        with self._lock:
+            self._entries.append(entry)
+
+    def _explain(self, cursor, dialect, statement, parameters):
+        if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return None
+
+        with self._lock:
+            if statement in self._plans:
+                return self._plans[statement]
+
+        if dialect == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        elif dialect == 'postgresql':
+            prefix = 'EXPLAIN '
+        else:
+            return None
+
+        try:
+            # SQLAlchemy のイベントを経由しない素のカーソルで実行
+            explain_cursor = cursor.connection.cursor()
+            try:
+                if dialect == 'sqlite':
+                    explain_cursor.execute(prefix + statement, parameters or ())
+                    rows = explain_cursor.fetchall()
+                else:
+                    # PostgreSQL はエラーでトランザクション全体が中断されるため、セーブポイントまでで取り消す
+                    explain_cursor.execute('SAVEPOINT slow_query_explain')
+                    try:
+                        explain_cursor.execute(prefix + statement, parameters or ())
+                        rows = explain_cursor.fetchall()
+                    except Exception:
+                        explain_cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                        raise
+                    finally:
+                        explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+            finally:
+                explain_cursor.close()
+        except Exception as e:
+            return f'実行計画の取得に失敗しました: {e}'
+
+        if dialect == 'sqlite':
+            plan = '\n'.join(str(row[-1]) for row in rows)  # (id, parent, notused, detail)
+        else:
+            plan = '\n'.join(str(row[0]) for row in rows)
+
+        with self._lock:
+            self._plans[statement] = plan
+            while len(self._plans) > PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+        return plan
+
+    def entries(self):
+        """新しい順の記録一覧"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def _describe(value):
+    """値を出さずに型（文字列・バイト列は長さも）だけを表す"""
+    if value is None:
+        return 'None'
+    if isinstance(value, (str, bytes)):
+        return f'{type(value).__name__}[{len(value)}]'
+    return type(value).__name__
+
+
+def _redact(parameters):
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {_describe(value)}' for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        if parameters and all(isinstance(row, (list, tuple, dict)) for row in parameters):  # executemany
+            return f'{len(parameters)}行 × {_redact(parameters[0])}'
+        return '(' + ', '.join(_describe(value) for value in parameters) + ')'
+    return _describe(parameters)
+
+
+def _format_params(parameters, capture_values=False):
+    text = repr(parameters) if capture_values else _redact(parameters)
+    if len(text) > MAX_PARAMS_LENGTH:
+        text = text[:MAX_PARAMS_LENGTH] + '...'
+    return text
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('slow_query_start')
+    if not start_times:
+        return
+    duration = time.perf_counter() - start_times.pop()
+    if duration >= slow_query_log.threshold:
+        slow_query_log.record(cursor, conn.dialect.name, statement, parameters, duration, executemany)
+
+
+def init_slow_query_log(app):
+    """SLOW_QUERY_THRESHOLD_MS が設定されていればスロークエリ記録を有効化"""
+    threshold_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS') or float(os.environ.get('SLOW_QUERY_THRESHOLD_MS') or 0)
+    if not threshold_ms:
+        return
+
+    slow_query_log.configure(threshold_ms, app.config.get('SLOW_QUERY_LOG_SIZE', 200),
+                             app.config.get('SLOW_QUERY_LOG_PARAMS', False))
+    if not event.contains(Engine, 'after_cursor_execute', _after_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
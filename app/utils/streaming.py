@@ -0,0 +1,96 @@
+"""
+ストリーミングレスポンスユーティリティ
+- CSV / JSON を行単位で生成しながら送信
+- 任意で gzip 圧縮
+- エクスポート全体をメモリに載せずにダウンロードを開始する
+"""
+
+import csv
+import io
+import json
+import zlib
+from flask import Response, stream_with_context, request
+
+UTF8_BOM = '\ufeff'
+
+
+class _RowBuffer:
+    """csv.writer の書き込み先（書いた内容をそのまま返す）"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, header=None, bom=True, batch_size=200):
+    """行のイテラブルをCSVのバイト列チャンクとして生成"""
+    writer = csv.writer(_RowBuffer())
+    buffer = io.StringIO()
+
+    if bom:
+        buffer.write(UTF8_BOM)  # Excel対応
+    if header:
+        buffer.write(writer.writerow(header))
+
+    for i, row in enumerate(rows, start=1):
+        buffer.write(writer.writerow(row))
+        if i % batch_size == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_json_array(items, prefix=None, key='items', batch_size=200):
+    """オブジェクトのイテラブルを JSON 配列として少しずつ生成
+
+    prefix に辞書を渡すと {"...": ..., "<key>": [ ... ]} の形式で出力する
+    """
+    if prefix is not None:
+        head = json.dumps(prefix, ensure_ascii=False)[:-1]
+        head += (', ' if prefix else '') + json.dumps(key) + ': [\n'
+        tail = '\n]}\n'
+    else:
+        head, tail = '[\n', '\n]\n'
+
+    buffer = [head]
+    for i, item in enumerate(items):
+        if i:
+            buffer.append(',\n')
+        buffer.append(json.dumps(item, ensure_ascii=False))
+        if (i + 1) % batch_size == 0:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+
+    buffer.append(tail)
+    yield ''.join(buffer).encode('utf-8')
+
+
+def iter_gzip(chunks, level=6):
+    """バイト列チャンクを gzip 圧縮しながら生成"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzipヘッダー付き
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def wants_gzip():
+    """gzip 圧縮が要求され、かつクライアントが対応しているか"""
+    requested = request.args.get('gzip', 'false').lower() in ('1', 'true', 'yes')
+    return requested and 'gzip' in request.headers.get('Accept-Encoding', '')
+
+
+def streaming_download(chunks, filename, content_type, gzip=False):
+    """チャンクのイテラブルからダウンロード用ストリーミングレスポンスを作成"""
+    if gzip:
+        chunks = iter_gzip(chunks)
+
+    response = Response(stream_with_context(chunks), content_type=content_type)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,75 @@
+"""
+ユーザーと関連データの削除
+- 行ごとに読み込まず、依存関係の順（エスカレーション → メッセージ → 会話 → アーカイブ → 職員 → ログインセッション → ユーザー）に
+  DELETE ... WHERE ... IN (サブクエリ) でまとめて削除する
+- 削除するユーザーが担当中のエスカレーション（他のユーザーの質問）は担当を外し、審査したFAQ候補からは審査者を外す
+- メッセージは USER_DELETE_CHUNK_SIZE 件ずつ削除してコミットし、書き込みロックを長時間保持しない
+- 一括削除はセッションイベントを通らないため、集計キャッシュは最後にまとめて無効化する
+  （日別集計は従来どおり削除後も減算しない）
+"""
+
+import logging
+from flask import current_app
+from sqlalchemy import delete, or_, select, update
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def _execute(statement):
+    return db.session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+
+def delete_user_data(user_id, chunk_size=None, job=None):
+    """ユーザーと関連データを削除し、テーブルごとの削除件数を返す"""
+    from app.models import (User, StaffMember, LoginSession, Conversation, Message, Escalation, EscalationBand,
+                            MessageArchiveSegment, FaqDraft)
+    from app.utils.cache import invalidate_cache
+
+    if db.session.get(User, user_id) is None:
+        raise ValueError(f'ユーザーが見つかりません: {user_id}')
+    chunk_size = chunk_size or current_app.config.get('USER_DELETE_CHUNK_SIZE', 500)
+    counts = dict.fromkeys(('escalations', 'messages', 'conversations', 'archive_segments',
+                            'staff_members', 'login_sessions'), 0)
+
+    # 1-2. ユーザーが送信したメッセージと、ユーザーの会話内のメッセージ（エスカレーションを先に削除）
+    conversation_ids = select(Conversation.id).where(Conversation.user_id == user_id)
+    target = or_(Message.sender_user_id == user_id, Message.conversation_id.in_(conversation_ids))
+    while True:
+        ids = db.session.execute(select(Message.id).where(target).limit(chunk_size)).scalars().all()
+        if not ids:
+            break
+        escalation_ids = select(Escalation.id).where(Escalation.message_id.in_(ids))
+        _execute(delete(EscalationBand).where(EscalationBand.escalation_id.in_(escalation_ids)))
+        counts['escalations'] += _execute(delete(Escalation).where(Escalation.message_id.in_(ids)))
+        counts['messages'] += _execute(delete(Message).where(Message.id.in_(ids)))
+        db.session.commit()
+        if job:
+            job.update(message=f"メッセージ {counts['messages']}件削除")
+
+    if job:
+        job.update(progress=80, message='会話を削除中')
+
+    # 3. 会話とアーカイブ済みメッセージ
+    counts['conversations'] = _execute(delete(Conversation).where(Conversation.user_id == user_id))
+    counts['archive_segments'] = _execute(delete(MessageArchiveSegment).where(MessageArchiveSegment.user_id == user_id))
+
+    # 4. 職員プロフィール（他のユーザーへの回答からは参照を外す）
+    staff_ids = select(StaffMember.id).where(StaffMember.user_id == user_id)
+    _execute(update(Message).where(Message.staff_id.in_(staff_ids)).values(staff_id=None))
+    counts['staff_members'] = _execute(delete(StaffMember).where(StaffMember.user_id == user_id))
+
+    # 5. 担当中のエスカレーション（他のユーザーの質問）は担当を外し、FAQ候補の審査者からも外す
+    _execute(update(Escalation).where(Escalation.claimed_by_id == user_id)
+             .values(claimed_by_id=None, claimed_at=None, lease_expires_at=None))
+    _execute(update(FaqDraft).where(FaqDraft.reviewed_by_id == user_id).values(reviewed_by_id=None))
+
+    # 6. ログインセッションとユーザー本体
+    counts['login_sessions'] = _execute(delete(LoginSession).where(LoginSession.user_id == user_id))
+    _execute(delete(User).where(User.id == user_id))
+    db.session.commit()
+    db.session.expire_all()
+
+    invalidate_cache()
+    logger.info('Deleted user %s: %s', user_id, counts)
+    return dict(counts, user_id=user_id)
@@ -0,0 +1,110 @@
+"""
+ユーザーバックアップの一括復元
+- 既存の user_id / identifier を1回のクエリでまとめて取得し、未登録のユーザーだけを復元
+- デフォルトパスワードのハッシュは1回だけ計算して全員に使い回す
+- USER_RESTORE_BATCH_SIZE 件ずつ一括 INSERT してコミット（ORM を経由しないため日別集計・キャッシュは手動で更新）
+- 起動時の自動復元は同じ内容のファイルを一度だけ適用する（app_meta に SHA-256 を記録）
+- ファイル形式の判別と会話・メッセージなどの復元は app.utils.backup
+"""
+
+import hashlib
+import logging
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from app import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PASSWORD = 'password123'
+RESTORE_MARKER_KEY = 'user_backup_restored'
+
+
+def restore_users(users_data, default_password=DEFAULT_PASSWORD, batch_size=None, job=None):
+    """バックアップのユーザー一覧を復元し、復元・スキップ件数を返す"""
+    from app.models import User, DailyStats
+    from app.utils.cache import invalidate_cache
+
+    batch_size = batch_size or current_app.config.get('USER_RESTORE_BATCH_SIZE', 1000)
+    existing_user_ids = set()
+    existing_identifiers = set()
+    for user_id, identifier in db.session.query(User.user_id, User.identifier):
+        existing_user_ids.add(user_id)
+        existing_identifiers.add(identifier)
+
+    password_hash = generate_password_hash(default_password)
+    now = datetime.utcnow()
+    total = len(users_data) if hasattr(users_data, '__len__') else None
+    rows = []
+    restored_count = skipped_count = 0
+
+    def flush():
+        db.session.execute(insert(User), rows)
+        db.session.commit()
+        if job:
+            done = restored_count + skipped_count
+            if total:
+                job.report(done, total)
+            else:
+                job.update(message=f'ユーザー {done}件処理')
+        rows.clear()
+
+    # users_data はジェネレーターでもよい（バックアップを読みながら batch_size 件ずつ INSERT）
+    for user_data in users_data:
+        user_id = user_data.get('user_id')
+        identifier = user_data.get('identifier') or user_id
+        # 既存ユーザー（バックアップ内の重複を含む）と識別子のないものはスキップ
+        if not identifier or user_id in existing_user_ids or identifier in existing_identifiers:
+            skipped_count += 1
+            continue
+        existing_user_ids.add(user_id)
+        existing_identifiers.add(identifier)
+        rows.append({
+            'identifier': identifier,
+            'user_id': user_id,
+            'display_name': user_data.get('display_name'),
+            'user_type': user_data.get('user_type', 'user'),
+            'department': user_data.get('department'),
+            'is_anonymous': user_data.get('is_anonymous', False),
+            'is_admin': user_data.get('is_admin', False),
+            'password_hash': password_hash,
+            'created_at': now
+        })
+        restored_count += 1
+        if len(rows) >= batch_size:
+            flush()
+    if rows:
+        flush()
+
+    if restored_count:
+        DailyStats.increment(db.session.connection(), now.date(), new_users=restored_count)
+        db.session.commit()
+        invalidate_cache('stats:get_user_stats')
+
+    logger.info('Restored %d users from backup (%d skipped)', restored_count, skipped_count)
+    return {'restored_count': restored_count, 'skipped_count': skipped_count}
+
+
+def restore_backup_file(path, default_password=DEFAULT_PASSWORD, once=False):
+    """バックアップファイル（JSON / NDJSON / gzip）から復元
+
+    once=True なら同じ内容のファイルは復元せずに None を返す
+    """
+    from app.models import AppMeta
+    from app.utils.backup import restore_backup_stream
+
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+        fingerprint = digest.hexdigest()
+        if once and AppMeta.get(RESTORE_MARKER_KEY) == fingerprint:
+            return None
+
+        f.seek(0)
+        result = restore_backup_stream(f, default_password)
+    if once:
+        AppMeta.set(RESTORE_MARKER_KEY, fingerprint)
+        db.session.commit()
+    return result
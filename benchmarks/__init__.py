@@ -0,0 +1,11 @@
+"""
+ベンチマーク
+- datagen: 乱数シード固定の合成データ生成（ユーザー・会話・メッセージ・FAQ・エスカレーション）
+- run: 主要な処理・APIを計測し、結果をJSONに出力する実行スクリプト
+- schema_upgrade: 古いリビジョンで作成したDBを現在のスキーマに移行できるかの確認
+
+使い方:
+    python -m benchmarks.run --users 500 --conversations 2000 --output bench.json
+    python -m benchmarks.run --compare bench_before.json --output bench_after.json
+    python -m benchmarks.schema_upgrade --rev <移行前のリビジョン>
+"""
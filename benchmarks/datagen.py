@@ -0,0 +1,257 @@
+"""
+合成データ生成
+- 既存のモデルを使い、ユーザー・職員・FAQ・会話・メッセージ・エスカレーションを作成
+- 同じシードとパラメータなら同じデータになる（コミット間の比較用）
+- パスワードのハッシュ化は1回だけ行い、全ユーザーで共有する
+"""
+
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+
+DEFAULT_PASSWORD = 'bench-pass'
+
+SURNAMES = ['佐藤', '鈴木', '高橋', '田中', '伊藤', '渡辺', '山本', '中村', '小林', '加藤', '吉田', '山田', '佐々木', '松本', '井上']
+GIVEN_NAMES = ['太郎', '花子', '健一', '美咲', '翔太', '陽菜', '大輔', '結衣', '拓也', 'さくら', '直樹', '愛', '誠', '由美', '涼']
+DEPARTMENTS = ['総務部', '人事部', '経理部', '情報システム部', '営業部', '企画部', '製造部']
+
+# (カテゴリ, 話題, 担当窓口)
+TOPICS = [
+    ('アカウント', 'パスワード再設定', '情報システム部'),
+    ('アカウント', 'アカウントロック', '情報システム部'),
+    ('IT', 'VPN接続', '情報システム部'),
+    ('IT', 'プリンター設定', '情報システム部'),
+    ('IT', 'メール転送設定', '情報システム部'),
+    ('IT', 'ソフトウェアのインストール', '情報システム部'),
+    ('勤怠', '有給休暇の申請', '人事部'),
+    ('勤怠', '在宅勤務の申請', '人事部'),
+    ('勤怠', '残業申請', '人事部'),
+    ('人事', '給与明細の確認', '人事部'),
+    ('人事', '扶養控除の手続き', '人事部'),
+    ('人事', '住所変更の届出', '人事部'),
+    ('経費', '交通費精算', '経理部'),
+    ('経費', '出張旅費の仮払い', '経理部'),
+    ('総務', '会議室の予約', '総務部'),
+    ('総務', '名刺の発注', '総務部'),
+    ('総務', '郵便物の発送', '総務部'),
+]
+
+QUESTION_TEMPLATES = [
+    '{topic}の方法を教えてください',
+    '{topic}ができません。どうすればいいですか？',
+    '{topic}について質問があります',
+    '{topic}の締め切りはいつですか？',
+    '{topic}はどこに問い合わせればいいですか',
+    '急ぎで{topic}をしたいのですが、今日中に対応できますか？',
+    '先日お願いした{topic}の件、その後どうなっていますか',
+]
+
+ANSWER_TEMPLATES = [
+    '{topic}は社内ポータルの「{category}」メニューから手続きできます。',
+    '{topic}については{department}（内線{extension}）までお問い合わせください。',
+    '{topic}は申請フォームに必要事項を入力し、上長の承認を得てください。通常2営業日以内に処理されます。',
+    '{topic}の手順は社内マニュアル第{chapter}章をご確認ください。不明点は{department}が対応します。',
+]
+
+STAFF_RESPONSES = [
+    'ご連絡ありがとうございます。{topic}の件、こちらで対応いたしました。',
+    '{topic}について確認しました。手続きは完了していますのでご確認ください。',
+    '{topic}の件は担当者から折り返しご連絡します。少々お待ちください。',
+]
+
+
+def _question(rng, topic):
+    return rng.choice(QUESTION_TEMPLATES).format(topic=topic[1])
+
+
+def _answer(rng, topic):
+    return rng.choice(ANSWER_TEMPLATES).format(
+        topic=topic[1], category=topic[0], department=topic[2],
+        extension=rng.randint(1000, 9999), chapter=rng.randint(1, 12))
+
+
+def _name(rng):
+    return rng.choice(SURNAMES) + rng.choice(GIVEN_NAMES)
+
+
+def make_app(db_path=None, **config):
+    """ベンチマーク用のアプリ（一時SQLite・ログ/診断機能は最小限）"""
+    from app import create_app
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'bench.db')
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'TESTING': True,
+        'LOG_LEVEL': 'WARNING',
+        'SLOW_QUERY_THRESHOLD_MS': 0,
+        'QUERY_COUNT_WARN_THRESHOLD': 0,
+    }
+    settings.update(config)
+    return create_app(settings)
+
+
+def generate(seed=42, users=200, conversations=500, messages_per_conversation=10, faqs=100,
+             staff=5, escalation_rate=0.1, days=90, password=DEFAULT_PASSWORD, batch_size=200, admins=0):
+    """合成データを作成（アプリコンテキスト内で呼ぶ）。作成件数を返す
+
+    admins を指定すると、admin とは別に負荷試験の管理者ごとのログイン（admin1, admin2, ...）も作成する
+    """
+    from app import db
+    from app.models import User, StaffMember, FAQ, Conversation, Message, Escalation
+    from app.utils.escalation_clusters import index_escalations
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(password)
+    counts = {'users': 0, 'staff': 0, 'faqs': 0, 'conversations': 0, 'messages': 0, 'escalations': 0}
+
+    def past(max_days=days):
+        return now - timedelta(days=rng.uniform(0, max_days))
+
+    # 管理者
+    admin = User.query.filter_by(user_id='admin').first()
+    if not admin:
+        admin = User(identifier='admin', user_id='admin', display_name='管理者', user_type='admin',
+                     is_anonymous=False, is_admin=True, password_hash=password_hash)
+        db.session.add(admin)
+    for i in range(1, admins + 1):
+        if not User.query.filter_by(user_id=f'admin{i}').first():
+            db.session.add(User(identifier=f'admin{i}', user_id=f'admin{i}', display_name=f'管理者{i}',
+                                user_type='admin', is_anonymous=False, is_admin=True, password_hash=password_hash))
+
+    # 職員
+    staff_members = []
+    for i in range(staff):
+        name = _name(rng)
+        user = User(identifier=f'bench_staff_{i:04d}', user_id=f'bench_staff_{i:04d}', display_name=name,
+                    user_type='staff', is_anonymous=False, password_hash=password_hash,
+                    created_at=past())
+        member = StaffMember(user=user, staff_id=f'S{i:05d}', name=name, department=rng.choice(DEPARTMENTS))
+        db.session.add(member)
+        staff_members.append(member)
+    counts['staff'] = staff
+
+    # FAQ
+    faq_list = []
+    for i in range(faqs):
+        topic = rng.choice(TOPICS)
+        faq = FAQ(
+            title=f'{topic[1]}について（{i + 1}）',
+            question=_question(rng, topic),
+            answer=_answer(rng, topic),
+            keywords=','.join([topic[1], topic[0], topic[2]]),
+            category=topic[0],
+            is_active=rng.random() > 0.1,
+            view_count=rng.randint(0, 500),
+            created_at=past()
+        )
+        db.session.add(faq)
+        faq_list.append((faq, topic))
+    counts['faqs'] = faqs
+
+    # ユーザー
+    user_list = []
+    for i in range(users):
+        created_at = past()
+        user = User(
+            identifier=f'bench_user_{i:06d}', user_id=f'bench_user_{i:06d}',
+            display_name=_name(rng), department=rng.choice(DEPARTMENTS),
+            is_anonymous=False, password_hash=password_hash,
+            created_at=created_at, last_activity=created_at
+        )
+        db.session.add(user)
+        user_list.append(user)
+    counts['users'] = users
+    db.session.commit()
+
+    if not user_list:
+        return counts
+
+    # 会話（各ユーザーの最初の会話はチャット画面で使うメイン会話）
+    has_main = set()
+    for i in range(conversations):
+        user = user_list[i % len(user_list)] if i < len(user_list) else rng.choice(user_list)
+        started_at = past()
+        if user.id in has_main:
+            session_id = f'bench_{seed}_{i:08d}'
+        else:
+            session_id = f'user_{user.id}_main_session'
+            has_main.add(user.id)
+
+        conversation = Conversation(session_id=session_id, user_id=user.id,
+                                    user_display_name=user.display_name,
+                                    started_at=started_at, last_activity=started_at)
+        db.session.add(conversation)
+
+        timestamp = started_at
+        for _ in range(max(messages_per_conversation // 2, 1)):
+            topic = rng.choice(TOPICS)
+            timestamp += timedelta(seconds=rng.randint(5, 600))
+            question = Message(conversation=conversation, message_type='user', content=_question(rng, topic),
+                               timestamp=timestamp, sender_user_id=user.id,
+                               sender_name=user.display_name, sender_type='registered')
+            db.session.add(question)
+            counts['messages'] += 1
+            timestamp += timedelta(seconds=1)
+
+            if rng.random() < escalation_rate or not faq_list:
+                question.is_escalated = True
+                db.session.add(Message(conversation=conversation, message_type='bot', timestamp=timestamp,
+                                       content='担当者に確認します。回答までしばらくお待ちください。'))
+                escalation = Escalation(message=question, created_at=timestamp)
+                db.session.add(escalation)
+                counts['messages'] += 1
+                counts['escalations'] += 1
+
+                if staff_members and rng.random() < 0.7:
+                    member = rng.choice(staff_members)
+                    minutes = rng.uniform(5, 240)
+                    answered_at = timestamp + timedelta(minutes=minutes)
+                    response = rng.choice(STAFF_RESPONSES).format(topic=topic[1])
+                    escalation.status = 'answered'
+                    escalation.staff_response = response
+                    escalation.staff_name = member.name
+                    escalation.answered_at = answered_at
+                    db.session.add(Message(conversation=conversation, message_type='staff', content=response,
+                                           timestamp=answered_at, staff_member=member,
+                                           response_time_minutes=minutes, sender_name=member.name,
+                                           sender_type='staff'))
+                    counts['messages'] += 1
+            else:
+                faq, faq_topic = rng.choice(faq_list)
+                db.session.add(Message(conversation=conversation, message_type='bot', content=faq.answer,
+                                       faq=faq, timestamp=timestamp,
+                                       confidence_score=round(rng.uniform(0.5, 1.0), 2)))
+                counts['messages'] += 1
+
+        conversation.last_activity = timestamp
+        user.last_activity = max(user.last_activity, timestamp)
+        user.question_count = (user.question_count or 0) + max(messages_per_conversation // 2, 1)
+        counts['conversations'] += 1
+
+        if (i + 1) % batch_size == 0:
+            db.session.commit()
+
+    db.session.commit()
+    # 類似質問のクラスタ（本番では send_message で作成時に索引へ追加される）
+    index_escalations()
+    return counts
+
+
+def faq_csv(rows, seed=0):
+    """FAQ一括取り込み用のCSV（bytes）"""
+    import csv
+    import io
+
+    rng = random.Random(seed)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['title', 'question', 'answer', 'category', 'keywords', 'is_active'])
+    for i in range(rows):
+        topic = rng.choice(TOPICS)
+        writer.writerow([f'{topic[1]}（取込{i + 1}）', _question(rng, topic), _answer(rng, topic),
+                         topic[0], f'{topic[1]},{topic[0]}', 'true'])
+    return buffer.getvalue().encode('utf-8-sig')
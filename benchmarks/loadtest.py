@@ -0,0 +1,295 @@
+"""
+負荷試験
+- 合成データ入りのアプリをスレッド型WSGIサーバー（werkzeug）で起動し、同時接続の利用者を模擬
+  - 利用者: /auth/login でログイン → 最新ページを取得し、以降は一定間隔で新着分（after_id）をポーリング → 一定の頻度で質問を送信
+  - 管理者: 管理者ごとのアカウント（admin1, admin2, ...）でログインし、エスカレーション一覧を開き、
+    未解決の質問を担当（/admin/escalations/claim）して回答
+- 段階ごと（--users 20,50,100）にレイテンシ p50/p95/p99・スループット・エラー率・SQLiteロックエラー数を集計
+- --url を指定すると起動済みのサーバー（gunicorn 等のマルチプロセス構成）を対象にする（ロックエラー数はHTTPエラーとして計上）
+
+    python -m benchmarks.loadtest --users 20,50,100 --duration 60 --output load.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from sqlalchemy import event
+
+from benchmarks.datagen import make_app, generate, DEFAULT_PASSWORD
+from benchmarks.run import SEARCH_QUERIES
+
+
+class Recorder:
+    """リクエストごとのレイテンシとエラーをスレッドセーフに記録"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.sqlite_locks = 0
+
+    def record(self, label, seconds, error=None):
+        with self._lock:
+            self.latencies[label].append(seconds)
+            if error:
+                self.errors[label][error] += 1
+
+    def record_lock(self):
+        with self._lock:
+            self.sqlite_locks += 1
+
+    def report(self, duration):
+        with self._lock:
+            latencies = {label: sorted(values) for label, values in self.latencies.items()}
+            errors = {label: dict(kinds) for label, kinds in self.errors.items()}
+            sqlite_locks = self.sqlite_locks
+
+        endpoints = {}
+        total = total_errors = 0
+        for label, values in sorted(latencies.items()):
+            error_count = sum(errors.get(label, {}).values())
+            total += len(values)
+            total_errors += error_count
+            endpoints[label] = {
+                'requests': len(values),
+                'errors': errors.get(label, {}),
+                'error_rate': round(error_count / len(values), 4),
+                'p50_ms': _percentile_ms(values, 50),
+                'p95_ms': _percentile_ms(values, 95),
+                'p99_ms': _percentile_ms(values, 99),
+                'max_ms': round(values[-1] * 1000, 1)
+            }
+        return {
+            'requests': total,
+            'throughput_rps': round(total / duration, 2) if duration else 0,
+            'error_rate': round(total_errors / total, 4) if total else 0,
+            'sqlite_lock_errors': sqlite_locks,
+            'endpoints': endpoints
+        }
+
+
+def _percentile_ms(ordered, percent):
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return round(ordered[index] * 1000, 1)
+
+
+class Client:
+    """クッキーを保持するHTTPクライアント（1利用者 = 1インスタンス）"""
+
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, label, path, form=None, json_body=None):
+        """リクエストを送り (ステータス, 最終URL, 本文) を返す。通信エラー時は None"""
+        data, headers = None, {}
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode('utf-8')
+
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                body = response.read()
+                self.recorder.record(label, time.perf_counter() - start)
+                return response.status, response.geturl(), body
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            self.recorder.record(label, time.perf_counter() - start, f'http_{e.code}')
+            return e.code, e.geturl(), body
+        except (urllib.error.URLError, OSError) as e:
+            reason = getattr(e, 'reason', e)
+            kind = 'timeout' if 'timed out' in str(reason) else 'connection'
+            self.recorder.record(label, time.perf_counter() - start, kind)
+            return None
+
+    def login(self, user_id, password):
+        result = self.request('login', '/auth/login', form={'user_id': user_id, 'password': password})
+        # 失敗するとログイン画面へ戻される
+        return bool(result and result[0] == 200 and '/auth/login' not in result[1])
+
+
+def simulate_user(client, user_id, args, stop_at, rng):
+    if not client.login(user_id, args.password):
+        return
+
+    now = time.time()
+    next_poll = now + rng.uniform(0, args.poll_interval)  # ポーリングの開始をばらけさせる
+    send_rate = args.message_rate / 60.0
+    next_send = now + rng.expovariate(send_rate) if send_rate > 0 else float('inf')
+    last_id = None
+
+    while True:
+        now = time.time()
+        if now >= stop_at:
+            return
+        if now >= next_poll:
+            # チャット画面と同じく、初回は最新ページ・以降は前回より新しい分だけを取得
+            if last_id is None:
+                result = client.request('get_messages', '/api/get_messages')
+            else:
+                result = client.request('get_messages_poll', f'/api/get_messages?after_id={last_id}')
+            last_id = _latest_message_id(result, last_id)
+            next_poll += args.poll_interval
+        if now >= next_send:
+            client.request('send_message', '/api/send_message', json_body={'message': rng.choice(SEARCH_QUERIES)})
+            next_send = time.time() + rng.expovariate(send_rate)
+        time.sleep(max(0.0, min(next_poll, next_send, stop_at) - time.time()))
+
+
+def _latest_message_id(result, default):
+    if not result or result[0] != 200:
+        return default
+    try:
+        messages = json.loads(result[2]).get('messages') or []
+    except ValueError:
+        return default
+    return messages[-1]['id'] if messages else default
+
+
+def simulate_admin(client, args, stop_at, rng, index):
+    # 担当は職員ごと（自分の担当分を優先して延長する）なので、管理者ごとに別のアカウントでログインする
+    if not client.login(f'admin{index + 1}', args.password):
+        return
+
+    while time.time() < stop_at:
+        client.request('admin_escalations', '/admin/escalations')
+        # 管理者同士で同じ質問を取り合わないよう、回答する分だけ担当（リース）してから回答する
+        result = client.request('claim_escalations', '/admin/escalations/claim',
+                                json_body={'limit': args.answers_per_visit})
+        if result and result[0] == 200:
+            for escalation in json.loads(result[2]).get('escalations') or []:
+                escalation_id = escalation['id']
+                client.request('respond_escalation', f'/admin/escalation/{escalation_id}/respond', json_body={
+                    'staff_response': 'お問い合わせありがとうございます。担当部署で対応しました。',
+                    'staff_name': f'負荷試験管理者{index + 1}'
+                })
+        time.sleep(max(0.0, min(args.admin_interval, stop_at - time.time())))
+
+
+def run_stage(base_url, user_ids, args, recorder, seed):
+    """同時利用者数 len(user_ids) で duration 秒間負荷をかける"""
+    stop_at = time.time() + args.duration
+    threads = []
+    for i, user_id in enumerate(user_ids):
+        client = Client(base_url, recorder, args.timeout)
+        threads.append(threading.Thread(target=simulate_user, name=f'load-user-{i}',
+                                        args=(client, user_id, args, stop_at, random.Random(seed + i))))
+    for i in range(args.admins):
+        client = Client(base_url, recorder, args.timeout)
+        threads.append(threading.Thread(target=simulate_admin, name=f'load-admin-{i}',
+                                        args=(client, args, stop_at, random.Random(seed - i - 1), i)))
+
+    started = time.time()
+    for thread in threads:
+        thread.start()
+        time.sleep(args.ramp_up / max(len(threads), 1))  # 接続を少しずつ増やす
+    for thread in threads:
+        thread.join()
+    return time.time() - started
+
+
+def start_server(args):
+    """合成データを作成し、スレッド型WSGIサーバーを別スレッドで起動"""
+    from werkzeug.serving import make_server
+    from app import db
+
+    app = make_app(args.db)
+    with app.app_context():
+        generate(seed=args.seed, users=max(args.users), conversations=max(args.users) * 2,
+                 messages_per_conversation=args.messages, faqs=args.faqs, password=args.password,
+                 admins=args.admins)
+        engine = db.engine
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server(args.host, args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-server', daemon=True).start()
+    return server, engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='チャットボットの負荷試験')
+    parser.add_argument('--users', default='20,50', help='同時利用者数（カンマ区切りで段階実行）')
+    parser.add_argument('--admins', type=int, default=2, help='同時に回答する管理者数')
+    parser.add_argument('--duration', type=float, default=30, help='各段階の秒数')
+    parser.add_argument('--ramp-up', type=float, default=5, help='接続を開始しきるまでの秒数')
+    parser.add_argument('--poll-interval', type=float, default=5, help='get_messages のポーリング間隔（秒）')
+    parser.add_argument('--message-rate', type=float, default=1, help='利用者1人あたりの送信数（件/分）')
+    parser.add_argument('--admin-interval', type=float, default=10, help='管理者が一覧を開く間隔（秒）')
+    parser.add_argument('--answers-per-visit', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--messages', type=int, default=10, help='作成する会話あたりのメッセージ数')
+    parser.add_argument('--faqs', type=int, default=100)
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    parser.add_argument('--db', help='SQLiteファイルのパス（省略時は一時ファイル）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0, help='0 は空いているポートを使用')
+    parser.add_argument('--url', help='起動済みサーバーのURL（指定時はアプリを起動しない。admin1〜adminN のアカウントが必要）')
+    parser.add_argument('--output', help='結果JSONの出力先')
+    args = parser.parse_args(argv)
+    args.users = [int(n) for n in args.users.split(',')]
+
+    server = engine = None
+    if args.url:
+        base_url = args.url
+    else:
+        server, engine = start_server(args)
+        base_url = f'http://{args.host}:{server.server_port}'
+
+    stages = []
+    try:
+        for stage_index, user_count in enumerate(args.users):
+            recorder = Recorder()
+            if engine is not None:
+                def on_error(context, recorder=recorder):
+                    if 'database is locked' in str(context.original_exception):
+                        recorder.record_lock()
+                event.listen(engine, 'handle_error', on_error)
+
+            user_ids = [f'bench_user_{i:06d}' for i in range(user_count)]
+            duration = run_stage(base_url, user_ids, args, recorder, args.seed + stage_index * 10000)
+            if engine is not None:
+                event.remove(engine, 'handle_error', on_error)
+
+            report = dict(users=user_count, admins=args.admins, duration_s=round(duration, 1), **recorder.report(duration))
+            stages.append(report)
+            _print_stage(report)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    result = {'base_url': base_url, 'settings': {k: v for k, v in vars(args).items() if k != 'password'},
+              'stages': stages}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def _print_stage(report):
+    print(f"\n== {report['users']} users / {report['admins']} admins: {report['requests']} req, "
+          f"{report['throughput_rps']} req/s, error rate {report['error_rate']:.2%}, "
+          f"sqlite locks {report['sqlite_lock_errors']}", file=sys.stderr)
+    print(f"{'endpoint':<22} {'req':>6} {'err%':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}", file=sys.stderr)
+    for label, item in report['endpoints'].items():
+        print(f"{label:<22} {item['requests']:>6} {item['error_rate']:>7.2%} {item['p50_ms']:>8} "
+              f"{item['p95_ms']:>8} {item['p99_ms']:>8} {item['max_ms']:>8}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+ベンチマーク実行
+- 合成データを作成した一時DBに対し、Flask テストクライアント経由で主要な処理を計測
+- 各ケースの所要時間（最小・平均・中央値・p95・最大）とクエリ数（Server-Timing）をJSONに出力
+- --compare で以前の結果と中央値を比較
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --only send_message,get_messages --repeat 50
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from importlib import metadata
+
+from benchmarks.datagen import make_app, generate, faq_csv
+
+SEARCH_QUERIES = [
+    'パスワードを忘れました', 'VPNに接続できません', '有給休暇の申請方法', '交通費精算の締め切り',
+    '会議室を予約したい', '給与明細はどこで見られますか', 'プリンターが使えない', '在宅勤務の申請',
+]
+
+_QUERY_COUNT = re.compile(r'desc="(\d+) queries"')
+
+CASES = []
+
+
+def case(name, writes=False):
+    """ベンチマークケースを登録（writes=True はデータを増やすため回数を絞る）"""
+    def decorator(func):
+        CASES.append((name, func, writes))
+        return func
+    return decorator
+
+
+class BenchContext:
+    """ケースから参照する共有状態"""
+
+    def __init__(self, app, seed, import_rows):
+        self.app = app
+        self.rng = random.Random(seed)
+        self.import_rows = import_rows
+        self._clients = {}
+
+        from app.models import User
+        with app.app_context():
+            self.admin_id = User.query.filter_by(user_id='admin').first().id
+            self.user_ids = [row.id for row in User.query.with_entities(User.id)
+                             .filter(User.user_id.like('bench_user_%')).all()]
+
+    def client(self, user_id):
+        """ログイン済みのテストクライアント（ユーザーごとに再利用）"""
+        if user_id not in self._clients:
+            client = self.app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'] = user_id
+            self._clients[user_id] = client
+        return self._clients[user_id]
+
+    def random_user(self):
+        return self.client(self.rng.choice(self.user_ids))
+
+    def admin(self):
+        return self.client(self.admin_id)
+
+
+@case('faq_search')
+def bench_faq_search(ctx):
+    from app.models import FAQ
+
+    def run():
+        with ctx.app.app_context():
+            FAQ.search(ctx.rng.choice(SEARCH_QUERIES))
+    return run
+
+
+@case('send_message', writes=True)
+def bench_send_message(ctx):
+    return lambda: ctx.random_user().post('/api/send_message', json={'message': ctx.rng.choice(SEARCH_QUERIES)})
+
+
+@case('get_messages')
+def bench_get_messages(ctx):
+    return lambda: ctx.random_user().get('/api/get_messages')
+
+
+@case('get_users')
+def bench_get_users(ctx):
+    return lambda: ctx.admin().get('/api/get_users')
+
+
+@case('admin_analytics')
+def bench_admin_analytics(ctx):
+    return lambda: ctx.admin().get('/admin/analytics')
+
+
+@case('faq_import_csv', writes=True)
+def bench_faq_import_csv(ctx):
+    payload = faq_csv(ctx.import_rows, seed=ctx.rng.randint(0, 10 ** 6))
+
+    def run():
+        return ctx.admin().post('/admin/faq/bulk-import', data={
+            'import_type': 'csv',
+            'file': (io.BytesIO(payload), 'faqs.csv')
+        }, content_type='multipart/form-data')
+    return run
+
+
+@case('faq_export_csv')
+def bench_faq_export_csv(ctx):
+    return lambda: ctx.admin().get('/admin/faq/export?format=csv&include_inactive=true')
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(run, repeat, warmup):
+    """run() を warmup 回空打ちしてから repeat 回計測"""
+    for _ in range(warmup):
+        run()
+
+    timings, queries, errors = [], [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = run()
+        if response is not None:
+            response.get_data()  # ストリーミングレスポンスを最後まで読む
+        timings.append((time.perf_counter() - start) * 1000)
+
+        if response is not None:
+            if response.status_code >= 400:
+                errors += 1
+            match = _QUERY_COUNT.search(response.headers.get('Server-Timing', ''))
+            if match:
+                queries.append(int(match.group(1)))
+
+    result = {
+        'runs': repeat,
+        'min_ms': round(min(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'max_ms': round(max(timings), 3),
+        'errors': errors
+    }
+    if queries:
+        result['avg_queries'] = round(statistics.mean(queries), 1)
+    return result
+
+
+def _git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f'{revision}-dirty' if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args):
+    app = make_app(args.db)
+    with app.app_context():
+        started = time.perf_counter()
+        counts = generate(seed=args.seed, users=args.users, conversations=args.conversations,
+                          messages_per_conversation=args.messages, faqs=args.faqs, staff=args.staff,
+                          escalation_rate=args.escalation_rate)
+        generation_seconds = time.perf_counter() - started
+
+    ctx = BenchContext(app, args.seed, args.import_rows)
+    only = set(args.only.split(',')) if args.only else None
+
+    results = {}
+    for name, factory, writes in CASES:
+        if only and name not in only:
+            continue
+        repeat = min(args.repeat, args.write_repeat) if writes else args.repeat
+        results[name] = measure(factory(ctx), repeat, args.warmup)
+        print(f"{name:<20} median {results[name]['median_ms']:>9.2f}ms  p95 {results[name]['p95_ms']:>9.2f}ms"
+              f"  queries {results[name].get('avg_queries', '-')}", file=sys.stderr)
+
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'recorded_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'flask': metadata.version('flask'),
+            'sqlalchemy': metadata.version('sqlalchemy'),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'dataset': counts,
+            'generation_seconds': round(generation_seconds, 2),
+            'repeat': args.repeat,
+            'warmup': args.warmup
+        },
+        'results': results
+    }
+
+
+def compare(baseline, current):
+    """中央値の比較表（ratio < 1 は高速化）"""
+    lines = [f"{'case':<20} {'before':>10} {'after':>10} {'ratio':>7}"]
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            lines.append(f"{name:<20} {'-':>10} {result['median_ms']:>10.2f} {'-':>7}")
+            continue
+        ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else float('inf')
+        lines.append(f"{name:<20} {before['median_ms']:>10.2f} {result['median_ms']:>10.2f} {ratio:>7.2f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='チャットボットのベンチマーク')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--conversations', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=10, help='会話あたりのメッセージ数')
+    parser.add_argument('--faqs', type=int, default=100)
+    parser.add_argument('--staff', type=int, default=5)
+    parser.add_argument('--escalation-rate', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--write-repeat', type=int, default=5, help='データを増やすケースの計測回数上限')
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--import-rows', type=int, default=100, help='CSV取り込み1回あたりの行数')
+    parser.add_argument('--only', help='実行するケース（カンマ区切り）')
+    parser.add_argument('--db', help='SQLiteファイルのパス（省略時は一時ファイル）')
+    parser.add_argument('--output', help='結果JSONの出力先（省略時は標準出力）')
+    parser.add_argument('--compare', help='比較する以前の結果JSON')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print(compare(json.load(f), report), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
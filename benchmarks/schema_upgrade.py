@@ -0,0 +1,98 @@
+"""
+スキーマ移行の確認
+- 指定したリビジョンのコード（git archive で一時ディレクトリに展開）でDBを作成し、少量のデータを入れる
+- そのDBを現在のコードの create_app（ensure_schema）で起動し、SCHEMA_VERSION まで移行できること・
+  モデルに定義した列と索引がすべて揃うこと・既存の行が残っていることを確認する
+- 古いリビジョンは別プロセスで実行する（同じプロセスで2つの app パッケージを読み込まない）
+
+    python -m benchmarks.schema_upgrade --rev <移行前のリビジョン>
+"""
+
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+# 古いリビジョンのコードでDBを作成し、ユーザー・FAQ・会話・メッセージ・エスカレーションを1件ずつ入れる
+SEED_SCRIPT = '''
+import os, sys
+sys.path.insert(0, sys.argv[1])
+os.chdir(sys.argv[1])
+from app import create_app, db
+from app.models import User, FAQ, Conversation, Message, Escalation
+app = create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[2], 'TESTING': True})
+with app.app_context():
+    db.create_all()
+    user = User(identifier='legacy', user_id='legacy', display_name='legacy', is_anonymous=False)
+    user.set_password('legacy')
+    db.session.add(user)
+    db.session.add(FAQ(title='legacy', question='legacy', answer='legacy'))
+    db.session.flush()
+    conversation = Conversation(user_id=user.id)
+    db.session.add(conversation)
+    db.session.flush()
+    message = Message(conversation_id=conversation.id, message_type='user', content='パスワードを忘れました')
+    db.session.add(message)
+    db.session.flush()
+    db.session.add(Escalation(message_id=message.id))
+    db.session.commit()
+'''
+
+
+def extract_revision(rev, directory):
+    """リビジョンのコードを directory に展開"""
+    root = subprocess.run(['git', 'rev-parse', '--show-toplevel'],
+                          capture_output=True, text=True, check=True).stdout.strip()
+    archive = subprocess.run(['git', 'archive', '--format=tar', rev], cwd=root, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory, filter='data')
+
+
+def check_upgrade(rev):
+    """rev で作成したDBを現在のコードで移行し、問題の一覧を返す（空なら成功）"""
+    from sqlalchemy import func, inspect, select
+    from app import create_app, db
+    from app.models import Escalation, User
+    from app.utils.schema import SCHEMA_VERSION, current_version
+
+    workdir = tempfile.mkdtemp(prefix='schema_upgrade_')
+    source = os.path.join(workdir, 'src')
+    uri = f"sqlite:///{os.path.join(workdir, 'legacy.db')}"
+    extract_revision(rev, source)
+    subprocess.run([sys.executable, '-c', SEED_SCRIPT, source, uri], check=True, capture_output=True)
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'LOG_LEVEL': 'WARNING'})
+    problems = []
+    with app.app_context():
+        if current_version() != SCHEMA_VERSION:
+            problems.append(f'schema_version: {current_version()} (expected {SCHEMA_VERSION})')
+        inspector = inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            problems.extend(f'missing column: {table.name}.{column.name}'
+                            for column in table.columns if column.name not in columns)
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            problems.extend(f'missing index: {index.name}' for index in table.indexes if index.name not in indexes)
+        for model in (User, Escalation):
+            if not db.session.execute(select(func.count()).select_from(model)).scalar():
+                problems.append(f'rows lost: {model.__tablename__}')
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='古いリビジョンで作成したDBを現在のスキーマに移行できるか確認')
+    parser.add_argument('--rev', required=True, help='移行前のDBを作成するリビジョン（例: 最初のコミット）')
+    args = parser.parse_args(argv)
+
+    problems = check_upgrade(args.rev)
+    for problem in problems:
+        print(problem)
+    print('OK' if not problems else f'{len(problems)}件の問題があります')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,11 +11,16 @@ def init_database():
         from app.models.faq import FAQ
         from app.models.conversation import Conversation
         from app.models.escalation import Escalation
+        from app.models.stats import DailyStats
+        from app.utils.user_restore import restore_backup_file
 
         try:
-            # データベーステーブルを作成
-            db.create_all()
-            print("データベーステーブルを作成しました")
+            # テーブルの作成・マイグレーションは create_app() で実施済み（スキーマが最新なら何もしない）
+
+            # 日別集計が空の場合は既存データからバックフィル
+            if not DailyStats.query.first():
+                days = DailyStats.rebuild()
+                print(f"日別集計を作成しました: {days}日分")
 
             # 管理者が存在するかチェック
             admin = User.query.filter_by(user_id='admin').first()
@@ -36,42 +41,21 @@ def init_database():
             else:
                 print("管理者アカウントは既に存在します")
             
-            # バックアップからユーザーデータを自動復元
+            # バックアップからユーザーデータを自動復元（同じ内容のファイルは一度だけ適用）
             try:
                 backup_file_path = 'user_backup_latest.json'
                 if os.path.exists(backup_file_path):
-                    print("バックアップファイルを発見しました。ユーザーデータを復元中...")
-                    import json
-                    
-                    with open(backup_file_path, 'r', encoding='utf-8') as f:
-                        backup_data = json.load(f)
-                    
-                    restored_count = 0
-                    for user_data in backup_data.get('users', []):
-                        # 既存ユーザーをチェック
-                        existing_user = User.query.filter_by(user_id=user_data.get('user_id')).first()
-                        if not existing_user:
-                            # 新しいユーザーを作成
-                            new_user = User(
-                                identifier=user_data.get('identifier'),
-                                user_id=user_data.get('user_id'),
-                                display_name=user_data.get('display_name'),
-                                user_type=user_data.get('user_type', 'user'),
-                                department=user_data.get('department'),
-                                is_anonymous=user_data.get('is_anonymous', False),
-                                is_admin=user_data.get('is_admin', False)
-                            )
-                            new_user.set_password('password123')  # デフォルトパスワード
-                            db.session.add(new_user)
-                            restored_count += 1
-                    
-                    if restored_count > 0:
-                        db.session.commit()
-                        print(f"バックアップから{restored_count}件のユーザーを復元しました")
+                    result = restore_backup_file(backup_file_path, once=True)
+                    if result is None:
+                        print("バックアップファイルは適用済みです")
+                    elif result['restored_count'] > 0:
+                        print(f"バックアップから{result['restored_count']}件のユーザーを復元しました"
+                              f"（スキップ: {result['skipped_count']}件）")
                     else:
                         print("復元対象のユーザーはありませんでした")
                         
             except Exception as backup_error:
+                db.session.rollback()
                 print(f"バックアップ復元エラー: {backup_error}")
                 # エラーでも処理を継続
 